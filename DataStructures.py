@@ -1,4 +1,25 @@
+import cPickle
+import functools
+import math
+import mmap
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
 class SinglyLinkedNode(object):
+    __slots__ = ('_item', '_next')
 
     def __init__(self, item=None, next_link=None):
         super(SinglyLinkedNode, self).__init__()
@@ -25,11 +46,45 @@ class SinglyLinkedNode(object):
         return repr(self.item)
 
 
+# A key/value entry, used as the chain node of the hash tables and as the
+# slot record of OpenAddressHashDict. It replaces a SinglyLinkedNode
+# holding a one element {key: value} dictionary, and caches hash(key).
+class DictionaryNode(object):
+    __slots__ = ('key', 'value', 'key_hash', 'next')
+
+    def __init__(self, key=None, value=None, key_hash=None, next_link=None):
+        self.key = key
+        self.value = value
+        self.key_hash = key_hash
+        self.next = next_link
+
+    # The entry as a {key: value} dictionary
+    @property
+    def item(self):
+        """
+        >>> DictionaryNode(10, 'Supraj').item
+        {10: 'Supraj'}
+        """
+        return {self.key: self.value}
+
+    def __repr__(self):
+        return repr(self.item)
+
+
+# Marks a deleted slot in OpenAddressHashDict
+DELETED = DictionaryNode(-1, 'DELETED')
+
+
 class SinglyLinkedList(object):
+    __slots__ = ('head', '_size', 'verbose')
 
-    def __init__(self):
+    def __init__(self, verbose=True):
         super(SinglyLinkedList, self).__init__()
         self.head = None
+        self._size = 0
+        # When verbose is False the methods return plain results and raise
+        # on a miss instead of building a status string
+        self.verbose = verbose
 
     # Gives the number of elements in the list
     def __len__(self):
@@ -41,12 +96,7 @@ class SinglyLinkedList(object):
         >>> sll.__len__()
         3
         """
-        cur_node = self.head
-        i = 0
-        while cur_node is not None:
-            i += 1
-            cur_node = cur_node.next
-        return i
+        return self._size
 
     def __iter__(self):
         cur_node = self.head
@@ -63,32 +113,56 @@ class SinglyLinkedList(object):
         'Item 10 is present in the list'
         >>> sll.__contains__(30)
         'Item 30 is not present in the list'
+        >>> sll = SinglyLinkedList(verbose=False)
+        >>> sll.prepend(10)
+        >>> 10 in sll, 30 in sll
+        (True, False)
         """
         cur_node = self.head
-        return_string = "Item " + str(item) + " is not present in the list"
         while cur_node is not None:
-            if (cur_node.item is item):
-                return_string = "Item " + str(item) + " is present in the list"
+            if (cur_node.item is item or cur_node.item == item):
                 break
-            else:
-                cur_node = cur_node.next
-        return return_string
+            cur_node = cur_node.next
+        if not self.verbose:
+            return cur_node is not None
+        if cur_node is None:
+            return "Item " + str(item) + " is not present in the list"
+        return "Item " + str(item) + " is present in the list"
 
-    # This method can be used when the data in the node is a dictionary
-    def __get__dictionary__node__(self, key):
+    # This method can be used when the data in the node is a dictionary.
+    # key_hash is hash(key); nodes with a different cached hash are skipped
+    # without comparing the keys. With move_to_front the node found is
+    # moved to the head of the list.
+    def __get__dictionary__node__(self, key, key_hash=None, move_to_front=False):
         """
         >>> sll = SinglyLinkedList()
         >>> item = {10: 'Supraj'}
         >>> sll.prepend(item)
         >>> sll.__get__dictionary__node__(10)
         {10: 'Supraj'}
+        >>> sll.prepend_dictionary('a' * 3, 'Rathna')
+        >>> sll.__get__dictionary__node__(''.join(['a', 'a', 'a']), hash('aaa'))
+        {'aaa': 'Rathna'}
+        >>> sll.__get__dictionary__node__(10, move_to_front=True)
+        {10: 'Supraj'}
+        >>> sll
+        List:{10: 'Supraj'}->{'aaa': 'Rathna'}
         """
+        if key_hash is None:
+            key_hash = hash(key)
         cur_node = self.head
+        pre_node = None
         while cur_node is not None:
-            if (cur_node.item.keys()[0] is key):
-                break
-            else:
-                cur_node = cur_node.next
+            if (cur_node.key_hash == key_hash):
+                cur_key = cur_node.key
+                if (cur_key is key or cur_key == key):
+                    break
+            pre_node = cur_node
+            cur_node = cur_node.next
+        if (move_to_front and cur_node is not None and pre_node is not None):
+            pre_node.next = cur_node.next
+            cur_node.next = self.head
+            self.head = cur_node
         return cur_node
 
     # This method is used to remove the value from the data attribute in the node
@@ -100,26 +174,34 @@ class SinglyLinkedList(object):
         'Item 10 has been deleted from the head'
         >>> sll.remove(10)
         "Item 10 is not present in the list, can't be deleted"
+        >>> sll = SinglyLinkedList(verbose=False)
+        >>> sll.prepend(10)
+        >>> sll.remove(10)
+        >>> sll.remove(10)
+        Traceback (most recent call last):
+        ...
+        ValueError: 10
         """
         cur_node = self.head
         pre_node = None
-        return_string = "Item " + str(item) + " is not present in the list, can't be deleted"
         while cur_node is not None:
-            if (cur_node.item is item and pre_node is None):
-                self.head = cur_node.next
-                return_string = "Item " + str(item) + " has been deleted from the head"
+            if (cur_node.item is item or cur_node.item == item):
                 break
-            elif (cur_node.item is item):
-                pre_node.next = cur_node.next
-                return_string = "Item " + str(item) + " has been deleted"
-                break
-            else:
-                pre_node = cur_node
-                cur_node = cur_node.next
-        return return_string
+            pre_node = cur_node
+            cur_node = cur_node.next
+        if cur_node is None:
+            if not self.verbose:
+                raise ValueError(item)
+            return "Item " + str(item) + " is not present in the list, can't be deleted"
+        self._unlink(pre_node, cur_node)
+        if not self.verbose:
+            return None
+        if pre_node is None:
+            return "Item " + str(item) + " has been deleted from the head"
+        return "Item " + str(item) + " has been deleted"
 
     # This method is used to delete a dictionary from the data in the node
-    def remove_dictionary(self, key):
+    def remove_dictionary(self, key, key_hash=None):
         """
         >>> sll = SinglyLinkedList()
         >>> item = {10: 'Supraj'}
@@ -128,33 +210,88 @@ class SinglyLinkedList(object):
         'Item 10 has been deleted from the head'
         >>> sll.remove_dictionary(10)
         "Item 10 is not present in the list, can't be deleted"
+        >>> sll = SinglyLinkedList(verbose=False)
+        >>> sll.prepend({10: 'Supraj'})
+        >>> sll.remove_dictionary(10)
+        >>> sll.remove_dictionary(10)
+        Traceback (most recent call last):
+        ...
+        KeyError: 10
         """
+        if key_hash is None:
+            key_hash = hash(key)
         cur_node = self.head
         pre_node = None
-        return_string = "Item " + str(key) + " is not present in the list, can't be deleted"
         while cur_node is not None:
-            if (cur_node.item.keys()[0] is key and pre_node is None):
-                self.head = cur_node.next
-                return_string = "Item " + str(key) + " has been deleted from the head"
-                break
-            elif (cur_node.item.keys()[0] is key):
-                pre_node.next = cur_node.next
-                return_string = "Item " + str(key) + " has been deleted"
-                break
-            else:
-                pre_node = cur_node
-                cur_node = cur_node.next
-        return return_string
+            if (cur_node.key_hash == key_hash):
+                cur_key = cur_node.key
+                if (cur_key is key or cur_key == key):
+                    break
+            pre_node = cur_node
+            cur_node = cur_node.next
+        if cur_node is None:
+            if not self.verbose:
+                raise KeyError(key)
+            return "Item " + str(key) + " is not present in the list, can't be deleted"
+        self._unlink(pre_node, cur_node)
+        if not self.verbose:
+            return None
+        if pre_node is None:
+            return "Item " + str(key) + " has been deleted from the head"
+        return "Item " + str(key) + " has been deleted"
+
+    # Unlinks cur_node, whose predecessor is pre_node (None for the head)
+    def _unlink(self, pre_node, cur_node):
+        if pre_node is None:
+            self.head = cur_node.next
+        else:
+            pre_node.next = cur_node.next
+        self._size -= 1
 
-    # This method is used for adding an element at the beginning of the list
+    # This method is used for adding an element at the beginning of the list.
+    # A one element dictionary is stored as a DictionaryNode.
     def prepend(self, item):
         """
         >>> sll = SinglyLinkedList()
         >>> sll.prepend(10)
 
         """
+        if (type(item) is dict and len(item) == 1):
+            key, value = next(item.iteritems())
+            self.prepend_dictionary(key, value)
+            return
         cur_node = SinglyLinkedNode(item, self.head)
         self.head = cur_node
+        self._size += 1
+
+    # This method is used for adding a key/value pair at the beginning of the list
+    def prepend_dictionary(self, key, value, key_hash=None):
+        """
+        >>> sll = SinglyLinkedList()
+        >>> sll.prepend_dictionary(10, 'Supraj')
+        >>> sll
+        List:{10: 'Supraj'}
+        """
+        if key_hash is None:
+            key_hash = hash(key)
+        self.head = DictionaryNode(key, value, key_hash, self.head)
+        self._size += 1
+
+    # Links cur_node, a node taken from another list, in at the beginning of
+    # the list without allocating a new one
+    def prepend_node(self, cur_node):
+        """
+        >>> sll = SinglyLinkedList()
+        >>> sll.prepend_dictionary(10, 'Supraj')
+        >>> other = SinglyLinkedList()
+        >>> other.prepend(20)
+        >>> other.prepend_node(sll.head)
+        >>> other, len(other)
+        (List:{10: 'Supraj'}->20, 2)
+        """
+        cur_node.next = self.head
+        self.head = cur_node
+        self._size += 1
 
     def __repr__(self):
         """
@@ -169,14 +306,297 @@ class SinglyLinkedList(object):
         return s
 
 
+# The key a list node is indexed under: the key of a DictionaryNode, the
+# item of any other node
+def node_key(node):
+    if type(node) is DictionaryNode:
+        return node.key
+    return node.item
+
+
+# A SinglyLinkedList with a tail pointer and a side index from each item (or
+# dictionary key) to the node before it, None for the head. append, prepend,
+# __contains__, remove and remove_dictionary take constant time instead of
+# walking the list, and iteration still goes from head to tail. Items must
+# be hashable and unique; adding one that is present already is refused.
+class IndexedSinglyLinkedList(SinglyLinkedList):
+    __slots__ = ('tail', '_index')
+
+    def __init__(self, verbose=True):
+        super(IndexedSinglyLinkedList, self).__init__(verbose)
+        self.tail = None
+        self._index = {}
+
+    # Checks if a given item is present in the list
+    def __contains__(self, item):
+        """
+        >>> isll = IndexedSinglyLinkedList()
+        >>> isll.append(10)
+        >>> isll.__contains__(10)
+        'Item 10 is present in the list'
+        >>> isll.__contains__(30)
+        'Item 30 is not present in the list'
+        >>> isll = IndexedSinglyLinkedList(verbose=False)
+        >>> isll.append(10)
+        >>> 10 in isll, 30 in isll
+        (True, False)
+        """
+        if not self.verbose:
+            return item in self._index
+        if item not in self._index:
+            return "Item " + str(item) + " is not present in the list"
+        return "Item " + str(item) + " is present in the list"
+
+    # Gives the node for 'key' and the node before it, or (None, None)
+    def _find(self, key):
+        if key not in self._index:
+            return None, None
+        pre_node = self._index[key]
+        if pre_node is None:
+            return None, self.head
+        return pre_node, pre_node.next
+
+    # Looks up the dictionary node for 'key' through the index; key_hash is
+    # accepted for the SinglyLinkedList signature
+    def __get__dictionary__node__(self, key, key_hash=None, move_to_front=False):
+        """
+        >>> isll = IndexedSinglyLinkedList()
+        >>> isll.append({10: 'Supraj'})
+        >>> isll.append_dictionary('aaa', 'Rathna')
+        >>> isll.__get__dictionary__node__(10)
+        {10: 'Supraj'}
+        >>> isll.__get__dictionary__node__('aaa', move_to_front=True)
+        {'aaa': 'Rathna'}
+        >>> isll, isll.tail
+        (List:{'aaa': 'Rathna'}->{10: 'Supraj'}, {10: 'Supraj'})
+        """
+        pre_node, cur_node = self._find(key)
+        if (move_to_front and pre_node is not None):
+            self._unlink(pre_node, cur_node)
+            self._link_head(cur_node)
+        return cur_node
+
+    # Removes 'item' from the list
+    def remove(self, item):
+        """
+        >>> isll = IndexedSinglyLinkedList()
+        >>> for item in [10, 20, 30]:
+        ...     isll.append(item)
+        >>> isll.remove(10)
+        'Item 10 has been deleted from the head'
+        >>> isll.remove(30)
+        'Item 30 has been deleted'
+        >>> isll.remove(30)
+        "Item 30 is not present in the list, can't be deleted"
+        >>> isll.append(40)
+        >>> isll, len(isll)
+        (List:20->40, 2)
+        >>> isll = IndexedSinglyLinkedList(verbose=False)
+        >>> isll.remove(10)
+        Traceback (most recent call last):
+        ...
+        ValueError: 10
+        """
+        pre_node, cur_node = self._find(item)
+        if cur_node is None:
+            if not self.verbose:
+                raise ValueError(item)
+            return "Item " + str(item) + " is not present in the list, can't be deleted"
+        self._unlink(pre_node, cur_node)
+        if not self.verbose:
+            return None
+        if pre_node is None:
+            return "Item " + str(item) + " has been deleted from the head"
+        return "Item " + str(item) + " has been deleted"
+
+    # Removes the dictionary node with 'key' from the list
+    def remove_dictionary(self, key, key_hash=None):
+        """
+        >>> isll = IndexedSinglyLinkedList()
+        >>> isll.prepend({10: 'Supraj'})
+        >>> isll.remove_dictionary(10)
+        'Item 10 has been deleted from the head'
+        >>> isll.remove_dictionary(10)
+        "Item 10 is not present in the list, can't be deleted"
+        >>> isll = IndexedSinglyLinkedList(verbose=False)
+        >>> isll.remove_dictionary(10)
+        Traceback (most recent call last):
+        ...
+        KeyError: 10
+        """
+        pre_node, cur_node = self._find(key)
+        if cur_node is None:
+            if not self.verbose:
+                raise KeyError(key)
+            return "Item " + str(key) + " is not present in the list, can't be deleted"
+        self._unlink(pre_node, cur_node)
+        if not self.verbose:
+            return None
+        if pre_node is None:
+            return "Item " + str(key) + " has been deleted from the head"
+        return "Item " + str(key) + " has been deleted"
+
+    # Unlinks cur_node, whose predecessor is pre_node (None for the head),
+    # and moves the index entry of the node after it to pre_node
+    def _unlink(self, pre_node, cur_node):
+        next_node = cur_node.next
+        if next_node is not None:
+            self._index[node_key(next_node)] = pre_node
+        else:
+            self.tail = pre_node
+        del self._index[node_key(cur_node)]
+        super(IndexedSinglyLinkedList, self)._unlink(pre_node, cur_node)
+        cur_node.next = None
+
+    # Links a new node in at the head
+    def _link_head(self, cur_node):
+        if self.head is None:
+            self.tail = cur_node
+        else:
+            self._index[node_key(self.head)] = cur_node
+        cur_node.next = self.head
+        self.head = cur_node
+        self._index[node_key(cur_node)] = None
+        self._size += 1
+
+    # Links a new node in at the tail
+    def _link_tail(self, cur_node):
+        if self.tail is None:
+            self.head = cur_node
+        else:
+            self.tail.next = cur_node
+        self._index[node_key(cur_node)] = self.tail
+        self.tail = cur_node
+        self._size += 1
+
+    # Builds the node for 'item', a DictionaryNode for a one element
+    # dictionary, and gives its key with it
+    def _new_node(self, item):
+        if (type(item) is dict and len(item) == 1):
+            key, value = next(item.iteritems())
+            return key, DictionaryNode(key, value, hash(key))
+        return item, SinglyLinkedNode(item)
+
+    # Will refuse 'key' when it is in the list already
+    def _duplicate(self, key):
+        if not self.verbose:
+            raise ValueError(key)
+        return "Item " + str(key) + " is already present in the list"
+
+    # Adds an element at the beginning of the list
+    def prepend(self, item):
+        """
+        >>> isll = IndexedSinglyLinkedList()
+        >>> isll.prepend(10)
+        >>> isll.prepend(20)
+        >>> isll.prepend(10)
+        'Item 10 is already present in the list'
+        >>> isll, isll.tail
+        (List:20->10, 10)
+        """
+        key, cur_node = self._new_node(item)
+        if key in self._index:
+            return self._duplicate(key)
+        self._link_head(cur_node)
+
+    # Adds an element at the end of the list
+    def append(self, item):
+        """
+        >>> isll = IndexedSinglyLinkedList(verbose=False)
+        >>> isll.append(10)
+        >>> isll.append(20)
+        >>> isll.prepend(5)
+        >>> isll, len(isll)
+        (List:5->10->20, 3)
+        >>> isll.append(20)
+        Traceback (most recent call last):
+        ...
+        ValueError: 20
+        """
+        key, cur_node = self._new_node(item)
+        if key in self._index:
+            return self._duplicate(key)
+        self._link_tail(cur_node)
+
+    # Adds a key/value pair at the beginning of the list
+    def prepend_dictionary(self, key, value, key_hash=None):
+        if key in self._index:
+            return self._duplicate(key)
+        if key_hash is None:
+            key_hash = hash(key)
+        self._link_head(DictionaryNode(key, value, key_hash))
+
+    # Links cur_node, a node taken from another list, in at the beginning of
+    # the list
+    def prepend_node(self, cur_node):
+        """
+        >>> isll = IndexedSinglyLinkedList()
+        >>> isll.prepend_node(DictionaryNode(10, 'Supraj', hash(10)))
+        >>> isll.prepend_node(DictionaryNode(10, 'Sri', hash(10)))
+        'Item 10 is already present in the list'
+        >>> isll, isll.tail
+        (List:{10: 'Supraj'}, {10: 'Supraj'})
+        """
+        key = node_key(cur_node)
+        if key in self._index:
+            return self._duplicate(key)
+        self._link_head(cur_node)
+
+    # Adds a key/value pair at the end of the list
+    def append_dictionary(self, key, value, key_hash=None):
+        if key in self._index:
+            return self._duplicate(key)
+        if key_hash is None:
+            key_hash = hash(key)
+        self._link_tail(DictionaryNode(key, value, key_hash))
+
+
 class ChainedHashDict(object):
 
-    def __init__(self, bin_count=10, max_load=0.7, hashfunc=hash):
+    def __init__(self, bin_count=10, max_load=0.7, hashfunc=hash, verbose=True, rehash_step=None,
+                 move_to_front=False):
         super(ChainedHashDict, self).__init__()
-        self.hash_function = hashfunc
-        self._bin_count = bin_count
+        self.hash_strategy = as_hash_strategy(hashfunc)
+        self._bin_count = self.hash_strategy.table_size(bin_count)
         self.max_load = max_load
-        self.hash_table = [None] * bin_count
+        self.hash_table = [None] * self._bin_count
+        self._size = 0
+        # When verbose is False lookups return the stored value, misses
+        # raise KeyError and no status strings are built
+        self.verbose = verbose
+        # When rehash_step is set, growing the table is done incrementally:
+        # the old table is kept next to the new one and every operation moves
+        # up to rehash_step of its bins. None rebuilds the table in one go.
+        self.rehash_step = rehash_step
+        self._old_table = None
+        self._rehash_index = 0
+        # When move_to_front is set, a key that is read or updated is moved
+        # to the head of its chain
+        self.move_to_front = move_to_front
+        # Growth counters reported by stats(). When metrics is set to a
+        # sink(name, value) callable every rebuild and stats() are also sent to it.
+        self.rebuilds = 0
+        self.rebuild_seconds = 0.0
+        self.metrics = None
+
+    # Will build a table from (key, value) pairs with enough bins for
+    # 'expected_size' keys, so loading it never rebuilds the table. Without
+    # expected_size the pairs are counted first. Other keyword arguments go
+    # to the constructor.
+    @classmethod
+    def from_items(cls, items, expected_size=None, **kwargs):
+        """
+        >>> chc = ChainedHashDict.from_items([(key, key * key) for key in range(100)], verbose=False)
+        >>> chc.bin_count, len(chc), chc[9]
+        (143, 100, 81)
+        """
+        if expected_size is None:
+            items = list(items)
+            expected_size = len(items)
+        table = cls(bin_count=_presized_bin_count(expected_size, kwargs), **kwargs)
+        for key, value in items:
+            table[key] = value
+        return table
 
     @property
     def load_factor(self):
@@ -186,7 +606,7 @@ class ChainedHashDict(object):
         >>> chc.load_factor
         0.1
         """
-        return float(self.__len__()) / float(self.bin_count)
+        return float(self._size) / float(self.bin_count)
 
     # Will return the number of bins
     @property
@@ -198,21 +618,106 @@ class ChainedHashDict(object):
         """
         return self._bin_count
 
-    # Will rebuild the hash table by doubling the number of bins
+    # Will rebuild the hash table by doubling the number of bins. The chain
+    # nodes are relinked into the new bins, not copied.
     def rebuild(self, bincount):
-        self._bin_count *= 2
-        if(self.hash_function.func_name is 'hashfunc'):
-            self.hash_function = terrible_hash(self._bin_count)
-        else:
-            self.hash_function = hash_function(self._bin_count)
-        cur_table = self.hash_table
-        self.hash_table = [None] * self.bin_count
+        """
+        >>> chc = ChainedHashDict(verbose=False)
+        >>> chc[57] = 'Supraj'
+        >>> node = chc._find_node(57)
+        >>> chc.rebuild(chc.bin_count)
+        >>> chc._find_node(57) is node, chc.bin_count, chc[57]
+        (True, 20, 'Supraj')
+        """
+        self._finish_rehash()
+        cur_table = self._grow()
         for cur_list in cur_table:
             if cur_list is not None:
                 cur_node = cur_list.head
                 while cur_node is not None:
-                    self.__setitem__(cur_node.item.keys()[0], cur_node.item.values()[0])
-                    cur_node = cur_node.next
+                    next_node = cur_node.next
+                    index = self.hash_strategy.index(cur_node.key_hash, self._bin_count)
+                    list = self.hash_table[index]
+                    if (list is None):
+                        list = SinglyLinkedList(verbose=False)
+                        self.hash_table[index] = list
+                    list.prepend_node(cur_node)
+                    cur_node = next_node
+
+    # Doubles the number of bins and gives back the old table
+    def _grow(self):
+        self._bin_count *= 2
+        cur_table = self.hash_table
+        self.hash_table = [None] * self.bin_count
+        return cur_table
+
+    # Grows the table, moving the entries over incrementally if rehash_step is set
+    def _resize(self):
+        start = time.time()
+        if self.rehash_step is None:
+            self.rebuild(self.bin_count)
+        else:
+            self._finish_rehash()
+            self._old_table = self._grow()
+            self._rehash_index = 0
+        record_rebuild(self, start)
+
+    # Moves the entries of bin 'index' of the old table into the new table,
+    # keeping their order in the chain and relinking their nodes
+    def _migrate_bin(self, index):
+        cur_list = self._old_table[index]
+        if cur_list is None:
+            return
+        self._old_table[index] = None
+        nodes = []
+        cur_node = cur_list.head
+        while cur_node is not None:
+            nodes.append(cur_node)
+            cur_node = cur_node.next
+        for cur_node in reversed(nodes):
+            new_index = self.hash_strategy.index(cur_node.key_hash, self._bin_count)
+            list = self.hash_table[new_index]
+            if (list is None):
+                list = SinglyLinkedList(verbose=False)
+                self.hash_table[new_index] = list
+            list.prepend_node(cur_node)
+
+    # Moves up to 'bins' bins of the old table into the new table
+    def _migrate(self, bins):
+        end = min(self._rehash_index + bins, len(self._old_table))
+        for index in xrange(self._rehash_index, end):
+            self._migrate_bin(index)
+        self._rehash_index = end
+        if end == len(self._old_table):
+            self._old_table = None
+
+    # Completes a pending incremental rehash
+    def _finish_rehash(self):
+        if self._old_table is not None:
+            self._migrate(len(self._old_table))
+
+    # Will give the chain node holding 'key', or None
+    def _find_node(self, key):
+        key_hash = self.hash_strategy.hash(key)
+        if self._old_table is not None:
+            self._migrate(self.rehash_step)
+            if self._old_table is not None:
+                list = self._old_table[self.hash_strategy.index(key_hash, len(self._old_table))]
+                if (list is not None):
+                    result = list.__get__dictionary__node__(key, key_hash, self.move_to_front)
+                    if result is not None:
+                        return result
+        list = self.hash_table[self.hash_strategy.index(key_hash, self._bin_count)]
+        if (list is None):
+            return None
+        return list.__get__dictionary__node__(key, key_hash, self.move_to_front)
+
+    # Moves the bin holding the key with hash 'key_hash' to the new table
+    # before the key is modified
+    def _migrate_key(self, key_hash):
+        if self._old_table is not None:
+            self._migrate_bin(self.hash_strategy.index(key_hash, len(self._old_table)))
+            self._migrate(self.rehash_step)
 
     # Will get the value for the corresponding key
     def __getitem__(self, key):
@@ -223,15 +728,32 @@ class ChainedHashDict(object):
         'Supraj'
         >>> chc.__getitem__(58)
         'Key 58 is not present in the table'
+        >>> chc = ChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> chc[57] = ['Supraj']
+        >>> chc[57]
+        ['Supraj']
+        >>> chc[58]
+        Traceback (most recent call last):
+        ...
+        KeyError: 58
+
+        With move_to_front a key that is read moves to the head of its chain
+        >>> chc = ChainedHashDict(hashfunc=terrible_hash(10), move_to_front=True)
+        >>> chc.__setitem__(57, 'Supraj')
+        >>> chc.__setitem__(58, 'Sri')
+        >>> chc.__getitem__(57)
+        'Supraj'
+        >>> chc.hash_table[9]
+        List:{57: 'Supraj'}->{58: 'Sri'}
         """
-        return_string = "Key " + str(key) + " is not present in the table"
-        index = self.hash_function(key)
-        list = self.hash_table[index]
-        if (list is not None):
-            result = list.__get__dictionary__node__(key)
-            if result is not None:
-                return_string = str(result.item.values()[0])
-        return return_string
+        result = self._find_node(key)
+        if result is None:
+            if not self.verbose:
+                raise KeyError(key)
+            return "Key " + str(key) + " is not present in the table"
+        if not self.verbose:
+            return result.value
+        return str(result.value)
 
     # Will insert the items in the Hash Table
     def __setitem__(self, key, value):
@@ -239,16 +761,33 @@ class ChainedHashDict(object):
         >>> chc = ChainedHashDict(hashfunc=hash_function(10))
         >>> chc.__setitem__(57, 'Supraj')
 
+        >>> chc = ChainedHashDict(hashfunc=hash_function(10), verbose=False, rehash_step=1)
+        >>> for key in range(8):
+        ...     chc[key] = key * key
+        >>> chc.bin_count, chc[7], len(chc)
+        (20, 49, 8)
+
+        Setting a key that is already present replaces its value in place
+        >>> chc[7] = 'Seven'
+        >>> chc[7], len(chc)
+        ('Seven', 8)
         """
-        index = self.hash_function(key)
-        item = {key: value}
+        key_hash = self.hash_strategy.hash(key)
+        self._migrate_key(key_hash)
+        index = self.hash_strategy.index(key_hash, self._bin_count)
         list = self.hash_table[index]
         if (list is None):
-            list = SinglyLinkedList()
-        list.prepend(item)
-        self.hash_table[index] = list
+            list = SinglyLinkedList(verbose=False)
+            self.hash_table[index] = list
+        else:
+            cur_node = list.__get__dictionary__node__(key, key_hash, self.move_to_front)
+            if (cur_node is not None):
+                cur_node.value = value
+                return
+        list.prepend_dictionary(key, value, key_hash)
+        self._size += 1
         if(self.load_factor > self.max_load):
-            self.rebuild(self.bin_count)
+            self._resize()
 
     # Will delete the item with 'key'
     def __delitem__(self, key):
@@ -259,17 +798,31 @@ class ChainedHashDict(object):
         'Key 57 is deleted successfully'
         >>> chc.__delitem__(58)
         'Key 58 is not present in the table'
+        >>> chc = ChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> chc[57] = 'Supraj'
+        >>> del chc[57]
+        >>> del chc[57]
+        Traceback (most recent call last):
+        ...
+        KeyError: 57
         """
-        return_string = "Key " + str(key) + " is not present in the table"
-        index = self.hash_function(key)
+        key_hash = self.hash_strategy.hash(key)
+        self._migrate_key(key_hash)
+        index = self.hash_strategy.index(key_hash, self._bin_count)
         list = self.hash_table[index]
-        if (list is not None):
-            remove_result = list.remove_dictionary(key)
-            if(list.head is None):
-                self.hash_table[index] = None
-            if("not present" not in remove_result):
-                return_string = "Key " + str(key) + " is deleted successfully"
-        return return_string
+        try:
+            if (list is None):
+                raise KeyError(key)
+            list.remove_dictionary(key, key_hash)
+        except KeyError:
+            if not self.verbose:
+                raise
+            return "Key " + str(key) + " is not present in the table"
+        if(list.head is None):
+            self.hash_table[index] = None
+        self._size -= 1
+        if self.verbose:
+            return "Key " + str(key) + " is deleted successfully"
 
     # Will check if the key is present in the Hash Table
     def __contains__(self, key):
@@ -280,15 +833,17 @@ class ChainedHashDict(object):
         'Key 57 is present in the table'
         >>> chc.__contains__(58)
         'Key 58 is not present in the table'
+        >>> chc = ChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> chc[57] = 'Supraj'
+        >>> 57 in chc, 58 in chc
+        (True, False)
         """
-        return_string = "Key " + str(key) + " is not present in the table"
-        index = self.hash_function(key)
-        list = self.hash_table[index]
-        if (list is not None):
-            result = list.__get__dictionary__node__(key)
-            if result is not None:
-                return_string = "Key " + str(key) + " is present in the table"
-        return return_string
+        found = self._find_node(key) is not None
+        if not self.verbose:
+            return found
+        if found:
+            return "Key " + str(key) + " is present in the table"
+        return "Key " + str(key) + " is not present in the table"
 
     # Will give the number of elements in the table
     def __len__(self):
@@ -299,11 +854,209 @@ class ChainedHashDict(object):
         >>> chc.__len__()
         2
         """
-        i = 0
+        return self._size
+
+    # Will look up a batch of keys, given as a list or a NumPy array. The
+    # bins of all keys are computed in one pass and the chains are searched
+    # bin by bin. Gives the values, with 'default' for missing keys, and a
+    # mask that is True for the keys that were found.
+    def get_many(self, keys, default=None):
+        """
+        >>> chc = ChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> chc.set_many([57, 58, 67], ['Supraj', 'Sri', 'Ram'])
+        >>> values, found = chc.get_many([67, 59, 57])
+        >>> list(values), list(found)
+        (['Ram', None, 'Supraj'], [True, False, True])
+        """
+        self._finish_rehash()
+        keys, key_hashes, bins, order = _batch_bins(self.hash_strategy, keys, self._bin_count)
+        values, found = _batch_results(len(keys), default)
+        table = self.hash_table
+        for i in order:
+            list = table[bins[i]]
+            if (list is not None):
+                cur_node = list.__get__dictionary__node__(keys[i], key_hashes[i], self.move_to_front)
+                if (cur_node is not None):
+                    values[i] = cur_node.value
+                    found[i] = True
+        return values, found
+
+    # Will give a mask that is True for the keys of the batch in the table
+    def contains_many(self, keys):
+        """
+        >>> chc = ChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> chc.set_many([57, 58], ['Supraj', 'Sri'])
+        >>> list(chc.contains_many([57, 59]))
+        [True, False]
+        """
+        return self.get_many(keys)[1]
+
+    # Will insert a batch of keys with their values. The table is grown once
+    # up front to hold every key as if all of them were new, so the bins
+    # computed for the batch stay valid while it is inserted.
+    def set_many(self, keys, values):
+        """
+        >>> chc = ChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> chc.set_many(range(20), range(20))
+        >>> chc.set_many([3, 3], ['Three', 'Drei'])
+        >>> chc.bin_count, len(chc), chc[19], chc[3], chc.stats()['rebuilds']
+        (40, 20, 19, 'Drei', 2)
+        """
+        while float(self._size + len(keys)) / self.bin_count > self.max_load:
+            timed_rebuild(self)
+        self._finish_rehash()
+        keys, key_hashes, bins, order = _batch_bins(self.hash_strategy, keys, self._bin_count)
+        values = _batch_values(keys, values)
+        table = self.hash_table
+        for i in order:
+            key, key_hash = keys[i], key_hashes[i]
+            list = table[bins[i]]
+            if (list is None):
+                list = SinglyLinkedList(verbose=False)
+                table[bins[i]] = list
+            else:
+                cur_node = list.__get__dictionary__node__(key, key_hash, self.move_to_front)
+                if (cur_node is not None):
+                    cur_node.value = values[i]
+                    continue
+            list.prepend_dictionary(key, values[i], key_hash)
+            self._size += 1
+
+    # Will delete a batch of keys, giving a mask that is True for the keys
+    # that were present
+    def delete_many(self, keys):
+        """
+        >>> chc = ChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> chc.set_many([57, 58], ['Supraj', 'Sri'])
+        >>> list(chc.delete_many([57, 59, 57])), len(chc)
+        ([True, False, False], 1)
+        """
+        self._finish_rehash()
+        keys, key_hashes, bins, order = _batch_bins(self.hash_strategy, keys, self._bin_count)
+        found = _batch_results(len(keys))[1]
+        table = self.hash_table
+        for i in order:
+            list = table[bins[i]]
+            if (list is None):
+                continue
+            try:
+                list.remove_dictionary(keys[i], key_hashes[i])
+            except KeyError:
+                continue
+            if(list.head is None):
+                table[bins[i]] = None
+            self._size -= 1
+            found[i] = True
+        return found
+
+    # Will write a snapshot of the table to 'file', a path or a file opened
+    # for writing. The chains are saved bin by bin in their order, with the
+    # cached hash of every key.
+    def save(self, file):
+        """
+        >>> from cStringIO import StringIO
+        >>> chc = ChainedHashDict(hashfunc=terrible_hash(10), verbose=False)
+        >>> for key in [57, 58, 'Supraj']:
+        ...     chc[key] = str(key)
+        >>> snapshot = StringIO()
+        >>> chc.save(snapshot)
+        >>> snapshot.seek(0)
+        >>> chc = ChainedHashDict.load(snapshot, hashfunc=terrible_hash(10))
+        >>> chc.hash_table[9], len(chc), chc['Supraj']
+        (List:{'Supraj': 'Supraj'}->{58: '58'}->{57: '57'}, 3, 'Supraj')
+        """
+        self._finish_rehash()
+        lengths, keys, values, hashes = [], [], [], []
+        for cur_list in self.hash_table:
+            if cur_list is None:
+                lengths.append(0)
+                continue
+            lengths.append(len(cur_list))
+            cur_node = cur_list.head
+            while cur_node is not None:
+                keys.append(cur_node.key)
+                values.append(cur_node.value)
+                hashes.append(cur_node.key_hash)
+                cur_node = cur_node.next
+        write_snapshot(file, SNAPSHOT_CHAINED, snapshot_flags(self.verbose, self.move_to_front), self.max_load,
+                       self._bin_count, self._size, 0, snapshot_setting(self.rehash_step),
+                       [lengths, keys, values, hashes])
+
+    # Will restore a table saved with save(), rebuilding the chains as they
+    # were without hashing any key. 'hashfunc' must be the hash function
+    # the table was saved with.
+    @classmethod
+    def load(cls, file, hashfunc=hash):
+        flags, max_load, bin_count, size, deleted, setting, columns = read_snapshot(file, SNAPSHOT_CHAINED)
+        lengths, keys, values, hashes = columns
+        table = cls(bin_count, max_load, hashfunc, bool(flags & SNAPSHOT_VERBOSE), snapshot_rehash_step(setting),
+                    bool(flags & SNAPSHOT_MODE))
+        check_snapshot_bins(table, bin_count)
+        hash_table = table.hash_table
+        position = 0
+        for index in xrange(bin_count):
+            length = lengths[index]
+            if length:
+                next_node = None
+                for entry in xrange(position + length - 1, position - 1, -1):
+                    next_node = DictionaryNode(keys[entry], values[entry], hashes[entry], next_node)
+                list = SinglyLinkedList(verbose=False)
+                list.head = next_node
+                list._size = length
+                hash_table[index] = list
+                position += length
+        table._size = size
+        return table
+
+    # Will give the length of the chain of every bin
+    def _chain_lengths(self):
         for cur_list in self.hash_table:
-            if(cur_list is not None):
-                i += cur_list.__len__()
-        return i
+            if cur_list is None:
+                yield 0
+            else:
+                yield len(cur_list)
+
+    # Will give the health of the table: how many bins hold chains of each
+    # length, how many chain nodes a lookup of a present key visits on
+    # average and at most, and how often and for how long the table grew.
+    # The bins of a pending incremental rehash are not counted. The numbers
+    # are also exported with export_stats() to 'sink', or to the metrics sink
+    # of the table when it is set.
+    def stats(self, sink=None):
+        """
+        >>> chc = ChainedHashDict(hashfunc=terrible_hash(10))
+        >>> for key in [57, 58, 59]:
+        ...     chc.__setitem__(key, str(key))
+        >>> stats = chc.stats()
+        >>> stats['chain_lengths'], stats['max_probe_length'], stats['mean_probe_length']
+        ({0: 9, 3: 1}, 3, 2.0)
+        >>> chc.stats(sink=lambda name, value: None)['rebuilds']
+        0
+        """
+        chain_lengths = {}
+        probes = 0
+        for length in self._chain_lengths():
+            chain_lengths[length] = chain_lengths.get(length, 0) + 1
+            # The i-th node of a chain is found after i probes
+            probes += length * (length + 1) // 2
+        size = sum(length * bins for length, bins in chain_lengths.iteritems())
+        stats = {
+            'size': self._size,
+            'bin_count': self._bin_count,
+            'load_factor': self.load_factor,
+            'chain_lengths': chain_lengths,
+            'max_probe_length': max(chain_lengths),
+            'mean_probe_length': float(probes) / size if size else 0.0,
+            'tombstone_ratio': 0.0,
+            'rebuilds': self.rebuilds,
+            'rebuild_seconds': self.rebuild_seconds,
+            'rehashing': self._old_table is not None,
+        }
+        if sink is None:
+            sink = self.metrics
+        if sink is not None:
+            export_stats(stats, sink, type(self).__name__)
+        return stats
 
     # Will print all the values in the hash table
     def display(self):
@@ -323,6 +1076,8 @@ class ChainedHashDict(object):
         8- List:{58: 'Sriram'}
         9- None
         """
+        # A pending incremental rehash is completed so the whole table is shown
+        self._finish_rehash()
         i = 0
         for cur_list in self.hash_table:
             print_string = str(i) + "- None"
@@ -332,206 +1087,3241 @@ class ChainedHashDict(object):
             print print_string
 
 
-def hash_function(bin):
-    def h(item):
-        return item % bin
-    return h
-
-
-class OpenAddressHashDict(object):
+# A ChainedHashDict that keeps its entries in one shared arena instead of a
+# linked list object per bin and a node object per entry. The arena is
+# parallel lists of keys, values and cached hash(key), which like in
+# ChainedHashDict may be any integer, and an array of the index of the next
+# entry in the same chain, and every bin holds the index of the head of its
+# chain, or -1. Inserting allocates no object, deleted entries are
+# reused through a free list, and a rebuild only relinks the chains: the
+# entries stay where they are in the arena. The table is always rebuilt in
+# one go.
+class FlatChainedHashDict(ChainedHashDict):
 
-    def __init__(self, bin_count=10, max_load=0.7, hashfunc=hash):
-        super(OpenAddressHashDict, self).__init__()
-        self.hash_table = [None] * bin_count
-        self.hash_function = hashfunc
-        self._bin_count = bin_count
-        self.max_load = max_load
+    def __init__(self, bin_count=10, max_load=0.7, hashfunc=hash, verbose=True):
+        super(FlatChainedHashDict, self).__init__(bin_count, max_load, hashfunc, verbose)
+        self.hash_table = None
+        self._heads = array('l', [-1]) * self._bin_count
+        self._keys = []
+        self._values = []
+        self._hashes = []
+        self._next = array('l')
+        # Index of the first free entry of the arena, the others follow
+        # through _next
+        self._free = -1
 
-    @property
-    def load_factor(self):
+    # Will rebuild the hash table by doubling the number of bins
+    def rebuild(self, bincount):
         """
-        >>> ohd= OpenAddressHashDict()
-        >>> ohd.__setitem__(57, 'Supraj')
-        >>> ohd.load_factor
-        0.1
+        >>> chc = FlatChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> for key in range(8):
+        ...     chc[key] = key * key
+        >>> chc.bin_count, chc[7], len(chc), chc._heads[7]
+        (20, 49, 8, 7)
         """
-        return float(self.__len__()) / float(self.bin_count)
+        old_heads = self._heads
+        self._bin_count *= 2
+        bin_count = self._bin_count
+        self._heads = heads = array('l', [-1]) * bin_count
+        hashes, next_links, index = self._hashes, self._next, self.hash_strategy.index
+        for entry in old_heads:
+            while entry >= 0:
+                next_entry = next_links[entry]
+                new_index = index(hashes[entry], bin_count)
+                next_links[entry] = heads[new_index]
+                heads[new_index] = entry
+                entry = next_entry
 
-    # Will return the number of bins
-    @property
-    def bin_count(self):
-        """
-        >>> ohd= OpenAddressHashDict()
-        >>> ohd.bin_count
-        10
-        """
-        return self._bin_count
+    # Will give the arena index of the entry holding 'key' in bin 'index',
+    # or -1
+    def _find_entry(self, key, key_hash, index):
+        keys, hashes, next_links = self._keys, self._hashes, self._next
+        entry = self._heads[index]
+        while entry >= 0:
+            if hashes[entry] == key_hash:
+                cur_key = keys[entry]
+                if cur_key is key or cur_key == key:
+                    return entry
+            entry = next_links[entry]
+        return -1
 
-    # Will rebuild the hash table by doubling the number of bins
-    def rebuild(self, bincount):
-        self._bin_count *= 2
-        if(self.hash_function == hash):
-            self.hash_function = hash
+    # Adds an entry at the head of the chain of bin 'index'
+    def _insert_entry(self, index, key, value, key_hash):
+        entry = self._free
+        if entry >= 0:
+            self._free = self._next[entry]
+            self._keys[entry] = key
+            self._values[entry] = value
+            self._hashes[entry] = key_hash
+            self._next[entry] = self._heads[index]
         else:
-            self.hash_function = terrible_hash(self._bin_count)
-        cur_table = self.hash_table
-        self.hash_table = [None] * self.bin_count
-        for cur_value in cur_table:
-            if(cur_value is not None):
-                self.__setitem__(cur_value.keys()[0], cur_value.values()[0])
+            entry = len(self._keys)
+            self._keys.append(key)
+            self._values.append(value)
+            self._hashes.append(key_hash)
+            self._next.append(self._heads[index])
+        self._heads[index] = entry
+        self._size += 1
+
+    # Removes the entry holding 'key' from bin 'index', giving False when
+    # the key is not there
+    def _delete_entry(self, key, key_hash, index):
+        keys, hashes, next_links = self._keys, self._hashes, self._next
+        pre_entry = -1
+        entry = self._heads[index]
+        while entry >= 0:
+            if hashes[entry] == key_hash:
+                cur_key = keys[entry]
+                if cur_key is key or cur_key == key:
+                    break
+            pre_entry = entry
+            entry = next_links[entry]
+        if entry < 0:
+            return False
+        if pre_entry < 0:
+            self._heads[index] = next_links[entry]
+        else:
+            next_links[pre_entry] = next_links[entry]
+        keys[entry] = self._values[entry] = None
+        next_links[entry] = self._free
+        self._free = entry
+        self._size -= 1
+        return True
 
     # Will get the value for the corresponding key
     def __getitem__(self, key):
         """
-        >>> ohd= OpenAddressHashDict()
-        >>> ohd.__setitem__(57, 'Supraj')
-        >>> ohd.__getitem__(57)
+        >>> chc = FlatChainedHashDict(hashfunc=hash_function(10))
+        >>> chc.__setitem__(57, 'Supraj')
+        >>> chc.__getitem__(57)
         'Supraj'
-        >>> ohd.__getitem__(58)
+        >>> chc.__getitem__(58)
         'Key 58 is not present in the table'
+        >>> chc = FlatChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> chc[57] = ['Supraj']
+        >>> chc[57]
+        ['Supraj']
+        >>> chc[58]
+        Traceback (most recent call last):
+        ...
+        KeyError: 58
         """
-        return_string = "Key " + str(key) + " is not present in the table"
-        index = self.hash_function(key) % self.bin_count
-        i = 0
-        value_at_index = self.hash_table[index]
-        while (value_at_index is not None):
-            if(value_at_index.keys()[0] == key):
-                return_string = str(value_at_index.values()[0])
-                break
-            else:
-                i += 1
-                index = (self.hash_function(key) + i) % self.bin_count
-                value_at_index = self.hash_table[index]
-        return return_string
+        key_hash = self.hash_strategy.hash(key)
+        entry = self._find_entry(key, key_hash, self.hash_strategy.index(key_hash, self._bin_count))
+        if entry < 0:
+            if not self.verbose:
+                raise KeyError(key)
+            return "Key " + str(key) + " is not present in the table"
+        if not self.verbose:
+            return self._values[entry]
+        return str(self._values[entry])
 
     # Will insert the items in the Hash Table
     def __setitem__(self, key, value):
         """
-        >>> ohd= OpenAddressHashDict()
-        >>> ohd.__setitem__(57, 'Supraj')
+        >>> chc = FlatChainedHashDict(hashfunc=terrible_hash(10))
+        >>> chc.__setitem__(57, 'Supraj')
+        >>> chc.__setitem__(58, 'Sri')
+        >>> chc.__setitem__(57, 'Supraj R')
+        >>> chc._keys, chc._values, len(chc)
+        ([57, 58], ['Supraj R', 'Sri'], 2)
 
+        The hash values do not have to fit a C long
+        >>> chc = FlatChainedHashDict(hashfunc=FunctionHash(lambda key: key), verbose=False)
+        >>> chc[2 ** 70] = 'Big'
+        >>> chc[2 ** 70], 2 ** 70 + 1 in chc
+        ('Big', False)
         """
-        index = self.hash_function(key) % self.bin_count
-        item = {key: value}
-        i = 0
-        value_at_index = self.hash_table[index]
-        while (value_at_index is not None):
-            if(value_at_index.keys()[0] == -1):
-                break
-            i += 1
-            index = (self.hash_function(key) + i) % self.bin_count
-            value_at_index = self.hash_table[index]
-
-        self.hash_table[index] = item
+        key_hash = self.hash_strategy.hash(key)
+        index = self.hash_strategy.index(key_hash, self._bin_count)
+        entry = self._find_entry(key, key_hash, index)
+        if entry >= 0:
+            self._values[entry] = value
+            return
+        self._insert_entry(index, key, value, key_hash)
         if(self.load_factor > self.max_load):
-            self.rebuild(self.bin_count)
+            self._resize()
 
     # Will delete the item with 'key'
     def __delitem__(self, key):
         """
-        >>> ohd= OpenAddressHashDict()
-        >>> ohd.__setitem__(57, 'Supraj')
-        >>> ohd.__delitem__(57)
-        'Key 57 is successfully deleted'
-        >>> ohd.__delitem__(57)
+        >>> chc = FlatChainedHashDict(hashfunc=hash_function(10))
+        >>> chc.__setitem__(57, 'Supraj')
+        >>> chc.__delitem__(57)
+        'Key 57 is deleted successfully'
+        >>> chc.__delitem__(57)
         'Key 57 is not present in the table'
+
+        The entry is reused by the next insert
+        >>> chc.__setitem__(58, 'Sri')
+        >>> chc._keys, chc._free
+        ([58], -1)
         """
-        return_string = "Key " + str(key) + " is not present in the table"
-        index = self.hash_function(key) % self.bin_count
-        i = 0
-        value_at_index = self.hash_table[index]
-        while (value_at_index is not None):
-            if(value_at_index.keys()[0] == key):
-                self.hash_table[index] = {-1: 'DELETED'}
-                return_string = "Key " + str(key) + " is successfully deleted"
-                break
-            else:
-                i += 1
-                index = (self.hash_function(key) + i) % self.bin_count
-                value_at_index = self.hash_table[index]
-        return return_string
+        key_hash = self.hash_strategy.hash(key)
+        if not self._delete_entry(key, key_hash, self.hash_strategy.index(key_hash, self._bin_count)):
+            if not self.verbose:
+                raise KeyError(key)
+            return "Key " + str(key) + " is not present in the table"
+        if self.verbose:
+            return "Key " + str(key) + " is deleted successfully"
 
     # Will check if the key is present in the Hash Table
     def __contains__(self, key):
         """
-        >>> ohd= OpenAddressHashDict()
-        >>> ohd.__setitem__(57, 'Supraj')
-        >>> ohd.__contains__(57)
-        'Key 57 is present in the table with value Supraj'
-        >>> ohd.__contains__(58)
-        'Key 58 is not present in the table'
+        >>> chc = FlatChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> chc[57] = 'Supraj'
+        >>> 57 in chc, 58 in chc
+        (True, False)
         """
-        return_string = "Key " + str(key) + " is not present in the table"
-        index = self.hash_function(key) % self.bin_count
-        i = 0
-        value_at_index = self.hash_table[index]
-        while (value_at_index is not None):
-            if(value_at_index.keys()[0] == key):
-                return_string = "Key " + str(key) + " is present in the table with value " + value_at_index.values()[0]
-                break
-            else:
-                i += 1
-                index = (self.hash_function(key) + i) % self.bin_count
-                value_at_index = self.hash_table[index]
-        return return_string
+        key_hash = self.hash_strategy.hash(key)
+        found = self._find_entry(key, key_hash, self.hash_strategy.index(key_hash, self._bin_count)) >= 0
+        if not self.verbose:
+            return found
+        if found:
+            return "Key " + str(key) + " is present in the table"
+        return "Key " + str(key) + " is not present in the table"
 
-    # Will give the number of elements in the table
-    def __len__(self):
+    def get_many(self, keys, default=None):
         """
-        >>> ohd= OpenAddressHashDict()
-        >>> ohd.__setitem__(57, 'Supraj')
-        >>> ohd.__setitem__(58, 'Sriram')
-        >>> ohd.__len__()
+        >>> chc = FlatChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> chc.set_many([57, 58, 67], ['Supraj', 'Sri', 'Ram'])
+        >>> values, found = chc.get_many([67, 59, 57])
+        >>> list(values), list(found)
+        (['Ram', None, 'Supraj'], [True, False, True])
+        """
+        keys, key_hashes, bins, order = _batch_bins(self.hash_strategy, keys, self._bin_count)
+        values, found = _batch_results(len(keys), default)
+        for i in order:
+            entry = self._find_entry(keys[i], key_hashes[i], bins[i])
+            if entry >= 0:
+                values[i] = self._values[entry]
+                found[i] = True
+        return values, found
+
+    def set_many(self, keys, values):
+        """
+        >>> chc = FlatChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> chc.set_many(range(20), range(20))
+        >>> chc.set_many([3, 3], ['Three', 'Drei'])
+        >>> chc.bin_count, len(chc), chc[19], chc[3], chc.stats()['rebuilds']
+        (40, 20, 19, 'Drei', 2)
+        """
+        while float(self._size + len(keys)) / self.bin_count > self.max_load:
+            timed_rebuild(self)
+        keys, key_hashes, bins, order = _batch_bins(self.hash_strategy, keys, self._bin_count)
+        values = _batch_values(keys, values)
+        for i in order:
+            entry = self._find_entry(keys[i], key_hashes[i], bins[i])
+            if entry >= 0:
+                self._values[entry] = values[i]
+            else:
+                self._insert_entry(bins[i], keys[i], values[i], key_hashes[i])
+
+    def delete_many(self, keys):
+        """
+        >>> chc = FlatChainedHashDict(hashfunc=hash_function(10), verbose=False)
+        >>> chc.set_many([57, 58], ['Supraj', 'Sri'])
+        >>> list(chc.delete_many([57, 59, 57])), len(chc)
+        ([True, False, False], 1)
+        """
+        keys, key_hashes, bins, order = _batch_bins(self.hash_strategy, keys, self._bin_count)
+        found = _batch_results(len(keys))[1]
+        for i in order:
+            if self._delete_entry(keys[i], key_hashes[i], bins[i]):
+                found[i] = True
+        return found
+
+    # Will give the arena indexes of the chain of every bin
+    def _chains(self):
+        next_links = self._next
+        for entry in self._heads:
+            chain = []
+            while entry >= 0:
+                chain.append(entry)
+                entry = next_links[entry]
+            yield chain
+
+    def _chain_lengths(self):
+        for chain in self._chains():
+            yield len(chain)
+
+    # Will write a snapshot in the format of ChainedHashDict.save(), so
+    # either class can load it
+    def save(self, file):
+        """
+        >>> from cStringIO import StringIO
+        >>> chc = FlatChainedHashDict(hashfunc=terrible_hash(10), verbose=False)
+        >>> for key in [57, 58, 'Supraj']:
+        ...     chc[key] = str(key)
+        >>> snapshot = StringIO()
+        >>> chc.save(snapshot)
+        >>> snapshot.seek(0)
+        >>> ChainedHashDict.load(snapshot, hashfunc=terrible_hash(10)).hash_table[9]
+        List:{'Supraj': 'Supraj'}->{58: '58'}->{57: '57'}
+        >>> snapshot.seek(0)
+        >>> chc = FlatChainedHashDict.load(snapshot, hashfunc=terrible_hash(10))
+        >>> chc._keys, len(chc), chc['Supraj']
+        (['Supraj', 58, 57], 3, 'Supraj')
+        """
+        lengths, keys, values, hashes = [], [], [], []
+        for chain in self._chains():
+            lengths.append(len(chain))
+            for entry in chain:
+                keys.append(self._keys[entry])
+                values.append(self._values[entry])
+                hashes.append(self._hashes[entry])
+        write_snapshot(file, SNAPSHOT_CHAINED, snapshot_flags(self.verbose), self.max_load, self._bin_count,
+                       self._size, 0, snapshot_setting(None), [lengths, keys, values, hashes])
+
+    # Will restore a table saved with save(), the arena holding the chains
+    # one after the other
+    @classmethod
+    def load(cls, file, hashfunc=hash):
+        flags, max_load, bin_count, size, deleted, setting, columns = read_snapshot(file, SNAPSHOT_CHAINED)
+        lengths, keys, values, hashes = columns
+        table = cls(bin_count, max_load, hashfunc, bool(flags & SNAPSHOT_VERBOSE))
+        check_snapshot_bins(table, bin_count)
+        table._keys = list(keys)
+        table._values = list(values)
+        table._hashes = list(hashes)
+        table._next = next_links = array('l', xrange(1, size + 1))
+        position = 0
+        for index in xrange(bin_count):
+            length = lengths[index]
+            if length:
+                table._heads[index] = position
+                position += length
+                next_links[position - 1] = -1
+        table._size = size
+        return table
+
+    # Will print all the values in the hash table
+    def display(self):
+        """
+        >>> chc = FlatChainedHashDict(hashfunc=terrible_hash(10))
+        >>> chc.__setitem__(57, 'Supraj')
+        >>> chc.__setitem__(58, 'Sriram')
+        >>> chc.display()
+        0- None
+        1- None
+        2- None
+        3- None
+        4- None
+        5- None
+        6- None
+        7- None
+        8- None
+        9- Chain:{58: 'Sriram'}->{57: 'Supraj'}
+        """
+        index = 0
+        for chain in self._chains():
+            if chain:
+                print str(index) + "- Chain:" + "->".join(repr({self._keys[entry]: self._values[entry]})
+                                                          for entry in chain)
+            else:
+                print str(index) + "- None"
+            index += 1
+
+
+# A ChainedHashDict that can be shared between threads. The keys are split
+# over 'stripes' segments by the low bits of their mixed hash, and every
+# segment is a ChainedHashDict guarded by its own lock. Operations on keys of
+# different segments never wait for each other, and a segment that grows is
+# rebuilt while holding only its own lock.
+class ConcurrentChainedHashDict(object):
+
+    def __init__(self, bin_count=10, max_load=0.7, hashfunc=hash, verbose=True, rehash_step=None,
+                 move_to_front=False, stripes=16):
+        super(ConcurrentChainedHashDict, self).__init__()
+        self.hash_strategy = as_hash_strategy(hashfunc)
+        stripes = MaskHash().table_size(stripes)
+        segment_bins = max(1, (bin_count + stripes - 1) // stripes)
+        self.segments = [ChainedHashDict(segment_bins, max_load, self.hash_strategy, verbose, rehash_step,
+                                         move_to_front) for stripe in xrange(stripes)]
+        self.locks = [threading.Lock() for stripe in xrange(stripes)]
+        self.verbose = verbose
+
+    # Will give the segment holding 'key'. The hash is mixed by the finalizer
+    # of MurmurHash3 and the stripe is its low bits, so the stripe shares no
+    # bits with the bins a segment picks, even by the top bits of FibonacciHash
+    def _stripe(self, key):
+        """
+        >>> chc = ConcurrentChainedHashDict(bin_count=4096, hashfunc=FibonacciHash(), verbose=False, stripes=16)
+        >>> for key in xrange(2000):
+        ...     chc[key] = key
+        >>> occupied = [segment.bin_count - segment.stats()['chain_lengths'].get(0, 0)
+        ...             for segment in chc.segments]
+        >>> min(occupied) > min(len(segment) for segment in chc.segments) // 2
+        True
+        """
+        key_hash = self.hash_strategy.hash(key) & FibonacciHash.MASK
+        key_hash = ((key_hash ^ (key_hash >> 33)) * 0xff51afd7ed558ccd) & FibonacciHash.MASK
+        key_hash = ((key_hash ^ (key_hash >> 33)) * 0xc4ceb9fe1a85ec53) & FibonacciHash.MASK
+        return int(key_hash ^ (key_hash >> 33)) & (len(self.segments) - 1)
+
+    @property
+    def load_factor(self):
+        """
+        >>> chc = ConcurrentChainedHashDict(bin_count=16, stripes=4)
+        >>> chc.__setitem__(57, 'Supraj')
+        >>> chc.load_factor
+        0.0625
+        """
+        return float(len(self)) / float(self.bin_count)
+
+    # Will return the number of bins of all segments
+    @property
+    def bin_count(self):
+        """
+        >>> ConcurrentChainedHashDict(bin_count=100, stripes=16).bin_count
+        112
+        """
+        return sum(segment.bin_count for segment in self.segments)
+
+    # Will get the value for the corresponding key
+    def __getitem__(self, key):
+        """
+        >>> chc = ConcurrentChainedHashDict()
+        >>> chc.__setitem__(57, 'Supraj')
+        >>> chc.__getitem__(57)
+        'Supraj'
+        >>> chc.__getitem__(58)
+        'Key 58 is not present in the table'
+        """
+        stripe = self._stripe(key)
+        with self.locks[stripe]:
+            return self.segments[stripe].__getitem__(key)
+
+    # Will insert the items in the Hash Table
+    def __setitem__(self, key, value):
+        """
+        >>> chc = ConcurrentChainedHashDict(verbose=False, stripes=4)
+        >>> def fill(start):
+        ...     for key in xrange(start, start + 1000):
+        ...         chc[key] = key
+        >>> workers = [threading.Thread(target=fill, args=(start,)) for start in range(0, 4000, 1000)]
+        >>> for worker in workers:
+        ...     worker.start()
+        >>> for worker in workers:
+        ...     worker.join()
+        >>> len(chc), chc[3999], sum(len(segment) for segment in chc.segments)
+        (4000, 3999, 4000)
+        """
+        stripe = self._stripe(key)
+        with self.locks[stripe]:
+            self.segments[stripe].__setitem__(key, value)
+
+    # Will delete the item with 'key'
+    def __delitem__(self, key):
+        """
+        >>> chc = ConcurrentChainedHashDict()
+        >>> chc.__setitem__(57, 'Supraj')
+        >>> chc.__delitem__(57)
+        'Key 57 is deleted successfully'
+        >>> chc.__delitem__(57)
+        'Key 57 is not present in the table'
+        """
+        stripe = self._stripe(key)
+        with self.locks[stripe]:
+            return self.segments[stripe].__delitem__(key)
+
+    # Will check if the key is present in the Hash Table
+    def __contains__(self, key):
+        """
+        >>> chc = ConcurrentChainedHashDict(verbose=False)
+        >>> chc[57] = 'Supraj'
+        >>> 57 in chc, 58 in chc
+        (True, False)
+        """
+        stripe = self._stripe(key)
+        with self.locks[stripe]:
+            return self.segments[stripe].__contains__(key)
+
+    # Will give the number of elements in the table. Inserts and deletes
+    # running at the same time may or may not be counted.
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    # Will print the bins of every segment
+    def display(self):
+        """
+        >>> chc = ConcurrentChainedHashDict(bin_count=4, stripes=2)
+        >>> chc.__setitem__(57, 'Supraj')
+        >>> chc.display()
+        Segment 0
+        0- None
+        1- None
+        Segment 1
+        0- None
+        1- List:{57: 'Supraj'}
+        """
+        for stripe in xrange(len(self.segments)):
+            with self.locks[stripe]:
+                print "Segment " + str(stripe)
+                self.segments[stripe].display()
+
+
+# Will give the shard of a key with hash 'key_hash' out of 'shards', from the
+# top bits of its Fibonacci hash so the shards don't follow the low bits the
+# tables of the shards use for their bins
+def shard_index(key_hash, shards):
+    """
+    >>> [shard_index(key, 3) for key in range(6)]
+    [0, 0, 2, 0, 2, 2]
+    """
+    return int((((key_hash * FibonacciHash.MULTIPLIER) & FibonacciHash.MASK) >> 32) % shards)
+
+
+# Will give the shards of a batch of hashes from hash_many()
+def shard_index_many(key_hashes, shards):
+    if _is_array(key_hashes):
+        product = key_hashes.view(numpy.uint64) * numpy.uint64(FibonacciHash.MULTIPLIER)
+        return ((product >> numpy.uint64(32)) % numpy.uint64(shards)).astype(numpy.int64)
+    return [shard_index(key_hash, shards) for key_hash in key_hashes]
+
+
+# The loop of a worker process of a ShardedHashDict: it builds its table
+# with 'factory' and answers the batches sent over 'connection' until it
+# is told to stop. An error is sent back instead of an answer.
+def shard_worker(connection, factory):
+    table = factory()
+    while True:
+        request = connection.recv()
+        operation = request[0]
+        try:
+            if operation == 'get':
+                answer = table.get_many(request[1])
+            elif operation == 'set':
+                answer = table.set_many(request[1], request[2])
+            elif operation == 'delete':
+                answer = table.delete_many(request[1])
+            elif operation == 'len':
+                answer = len(table)
+            elif operation == 'close':
+                connection.send(('ok', None))
+                break
+            else:
+                raise ValueError("Unknown shard operation " + repr(operation))
+        except Exception as error:
+            connection.send(('error', error))
+            continue
+        connection.send(('ok', answer))
+    connection.close()
+
+
+# A hash table split over 'shards' worker processes, each owning the table
+# made by 'factory' (an OpenAddressHashDict by default) for its share of
+# the keys. A batch is split by shard, every shard is sent its part over a
+# pipe before any answer is read so the shards work on it at the same time,
+# and the answers are put back in the order of the batch. Single key
+# operations are batches of one. Call close() to stop the workers.
+class ShardedHashDict(object):
+
+    def __init__(self, shards=None, factory=None, verbose=True):
+        """
+        >>> shd = ShardedHashDict(shards=2, verbose=False)
+        >>> shd.set_many(range(10), [key * key for key in range(10)])
+        >>> values, found = shd.get_many([3, 11, 9])
+        >>> list(values), list(found), len(shd)
+        ([9, None, 81], [True, False, True], 10)
+        >>> shd.close()
+        """
+        super(ShardedHashDict, self).__init__()
+        if shards is None:
+            shards = multiprocessing.cpu_count()
+        if factory is None:
+            factory = lambda: OpenAddressHashDict(verbose=False)
+        self.hash_strategy = HashStrategy()
+        self.verbose = verbose
+        self.connections = []
+        self.workers = []
+        for shard in xrange(shards):
+            connection, worker_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=shard_worker, args=(worker_connection, factory))
+            worker.daemon = True
+            worker.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.workers.append(worker)
+
+    @property
+    def shards(self):
+        return len(self.connections)
+
+    # Will split a batch of keys by shard. Gives the key hashes, and for
+    # every shard the positions of its keys in the batch and the keys.
+    def _split(self, keys):
+        key_hashes = self.hash_strategy.hash_many(keys)
+        shard_ids = shard_index_many(key_hashes, self.shards)
+        if _is_array(shard_ids):
+            if not _is_array(keys):
+                keys = numpy.array(keys, dtype=object)
+            parts = []
+            for shard in xrange(self.shards):
+                positions = numpy.flatnonzero(shard_ids == shard)
+                parts.append((positions, keys[positions]))
+            return parts
+        parts = [([], []) for shard in xrange(self.shards)]
+        keys = list(keys)
+        for position in xrange(len(keys)):
+            positions, shard_keys = parts[shard_ids[position]]
+            positions.append(position)
+            shard_keys.append(keys[position])
+        return parts
+
+    # Sends every shard its request, then gives their answers in shard order
+    def _call(self, requests):
+        for shard in xrange(self.shards):
+            if requests[shard] is not None:
+                self.connections[shard].send(requests[shard])
+        answers = []
+        error = None
+        for shard in xrange(self.shards):
+            answer = None
+            if requests[shard] is not None:
+                status, answer = self.connections[shard].recv()
+                if status == 'error':
+                    error = answer
+            answers.append(answer)
+        if error is not None:
+            raise error
+        return answers
+
+    # Will look up a batch of keys. Gives the values, with 'default' for
+    # missing keys, and a mask that is True for the keys that were found.
+    def get_many(self, keys, default=None):
+        parts = self._split(keys)
+        answers = self._call([('get', shard_keys) if len(shard_keys) else None for positions, shard_keys in parts])
+        values, found = _batch_results(len(keys), default)
+        for (positions, shard_keys), answer in zip(parts, answers):
+            if answer is None:
+                continue
+            shard_values, shard_found = answer
+            for index in xrange(len(positions)):
+                if shard_found[index]:
+                    values[positions[index]] = shard_values[index]
+                    found[positions[index]] = True
+        return values, found
+
+    # Will give a mask that is True for the keys of the batch in the table
+    def contains_many(self, keys):
+        return self.get_many(keys)[1]
+
+    # Will insert a batch of keys with their values
+    def set_many(self, keys, values):
+        values = _batch_values(keys, values)
+        parts = self._split(keys)
+        requests = []
+        for positions, shard_keys in parts:
+            if len(shard_keys):
+                requests.append(('set', shard_keys, [values[position] for position in positions]))
+            else:
+                requests.append(None)
+        self._call(requests)
+
+    # Will delete a batch of keys, giving a mask that is True for the keys
+    # that were present
+    def delete_many(self, keys):
+        """
+        >>> shd = ShardedHashDict(shards=2, verbose=False)
+        >>> shd.set_many([57, 58], ['Supraj', 'Sri'])
+        >>> list(shd.delete_many([57, 59, 58])), len(shd)
+        ([True, False, True], 0)
+        >>> shd.close()
+        """
+        parts = self._split(keys)
+        answers = self._call([('delete', shard_keys) if len(shard_keys) else None for positions, shard_keys in parts])
+        found = _batch_results(len(keys))[1]
+        for (positions, shard_keys), answer in zip(parts, answers):
+            if answer is None:
+                continue
+            for index in xrange(len(positions)):
+                if answer[index]:
+                    found[positions[index]] = True
+        return found
+
+    # Will get the value for the corresponding key
+    def __getitem__(self, key):
+        """
+        >>> shd = ShardedHashDict(shards=2)
+        >>> shd.__setitem__(57, 'Supraj')
+        >>> shd.__getitem__(57)
+        'Supraj'
+        >>> shd.__getitem__(58)
+        'Key 58 is not present in the table'
+        >>> shd.close()
+        """
+        values, found = self.get_many([key])
+        if not found[0]:
+            if not self.verbose:
+                raise KeyError(key)
+            return "Key " + str(key) + " is not present in the table"
+        if not self.verbose:
+            return values[0]
+        return str(values[0])
+
+    # Will insert the items in the Hash Table
+    def __setitem__(self, key, value):
+        self.set_many([key], [value])
+
+    # Will delete the item with 'key'
+    def __delitem__(self, key):
+        if not self.delete_many([key])[0]:
+            if not self.verbose:
+                raise KeyError(key)
+            return "Key " + str(key) + " is not present in the table"
+        if self.verbose:
+            return "Key " + str(key) + " is deleted successfully"
+
+    # Will check if the key is present in the Hash Table
+    def __contains__(self, key):
+        found = bool(self.contains_many([key])[0])
+        if not self.verbose:
+            return found
+        if found:
+            return "Key " + str(key) + " is present in the table"
+        return "Key " + str(key) + " is not present in the table"
+
+    # Will give the number of elements in all shards
+    def __len__(self):
+        return sum(self._call([('len',)] * self.shards))
+
+    # Stops the worker processes, their tables are lost
+    def close(self):
+        if not self.connections:
+            return
+        self._call([('close',)] * self.shards)
+        for worker in self.workers:
+            worker.join()
+        for connection in self.connections:
+            connection.close()
+        self.connections = []
+        self.workers = []
+
+
+# An entry of LRUCacheDict. It is its own node in the doubly linked
+# recency list of the cache, so moving it to the front takes no allocation.
+class CacheNode(object):
+    __slots__ = ('key', 'value', 'size', 'expires', 'prev', 'next')
+
+    def __init__(self, key=None, value=None, size=0, expires=None):
+        self.key = key
+        self.value = value
+        self.size = size
+        self.expires = expires
+        self.prev = self
+        self.next = self
+
+    def __repr__(self):
+        return repr({self.key: self.value})
+
+
+# Approximate number of bytes held by a cache entry
+def cache_entry_size(key, value):
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+# A bounded cache: a ChainedHashDict maps every key to its CacheNode, and the
+# nodes form a circular doubly linked list from the most to the least
+# recently used entry. Reads and writes move the entry to the front, and
+# when the cache holds more than 'max_entries' entries or more than
+# 'max_bytes' bytes (as measured by 'sizeof') the entries at the back are
+# evicted. An entry stored with a 'ttl' expires that many seconds after it
+# was set; expired entries are only removed when they are looked up or
+# reach the back of the list, so len() may still count them.
+class LRUCacheDict(object):
+
+    def __init__(self, max_entries=None, max_bytes=None, ttl=None, hashfunc=hash, verbose=True,
+                 sizeof=cache_entry_size, clock=time.time):
+        super(LRUCacheDict, self).__init__()
+        self.table = ChainedHashDict(hashfunc=hashfunc, verbose=False)
+        # root.next is the most recently used entry, root.prev the least
+        self.root = CacheNode()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.clock = clock
+        self.verbose = verbose
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    # Moves 'node' to the front of the recency list
+    def _touch(self, node):
+        root = self.root
+        if root.next is node:
+            return
+        node.prev.next = node.next
+        node.next.prev = node.prev
+        node.prev = root
+        node.next = root.next
+        root.next.prev = node
+        root.next = node
+
+    # Removes 'node' from the cache
+    def _remove(self, node):
+        node.prev.next = node.next
+        node.next.prev = node.prev
+        del self.table[node.key]
+        self.bytes -= node.size
+
+    # Will give the live node holding 'key', or None. An expired node is
+    # removed on the way.
+    def _find(self, key):
+        entry = self.table._find_node(key)
+        if entry is None:
+            return None
+        node = entry.value
+        if node.expires is not None and node.expires <= self.clock():
+            self._remove(node)
+            self.expirations += 1
+            return None
+        return node
+
+    # Evicts entries from the back until the cache is within its limits
+    def _evict(self):
+        root = self.root
+        while root.prev is not root and \
+                ((self.max_entries is not None and len(self.table) > self.max_entries) or
+                 (self.max_bytes is not None and self.bytes > self.max_bytes)):
+            node = root.prev
+            self._remove(node)
+            if node.expires is not None and node.expires <= self.clock():
+                self.expirations += 1
+            else:
+                self.evictions += 1
+
+    # Will give the value for 'key', or 'default' when it is missing or
+    # expired, counting a hit or a miss
+    def get(self, key, default=None):
+        """
+        >>> cache = LRUCacheDict(max_entries=2)
+        >>> cache.set(57, 'Supraj')
+        >>> cache.get(57), cache.get(58, 'Missing'), cache.hits, cache.misses
+        ('Supraj', 'Missing', 1, 1)
+        """
+        node = self._find(key)
+        if node is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._touch(node)
+        return node.value
+
+    # Will store 'value' for 'key' as the most recently used entry, expiring
+    # after 'ttl' seconds (the ttl of the cache when not given), and evict
+    # what no longer fits
+    def set(self, key, value, ttl=None):
+        """
+        >>> cache = LRUCacheDict(max_entries=2, verbose=False)
+        >>> cache.set(57, 'Supraj')
+        >>> cache.set(58, 'Sri')
+        >>> cache[57]
+        'Supraj'
+        >>> cache.set(59, 'Ram')
+        >>> 58 in cache, cache.keys(), cache.evictions
+        (False, [59, 57], 1)
+
+        Entries can also be bounded by their approximate size in bytes
+        >>> cache = LRUCacheDict(max_bytes=100, sizeof=lambda key, value: len(value), verbose=False)
+        >>> cache.set(1, 'a' * 60)
+        >>> cache.set(2, 'b' * 60)
+        >>> cache.keys(), cache.bytes
+        ([2], 60)
+        """
+        if ttl is None:
+            ttl = self.ttl
+        expires = None
+        if ttl is not None:
+            expires = self.clock() + ttl
+        size = self.sizeof(key, value)
+        entry = self.table._find_node(key)
+        if entry is not None:
+            node = entry.value
+            self.bytes += size - node.size
+            node.value = value
+            node.size = size
+            node.expires = expires
+            self._touch(node)
+        else:
+            node = CacheNode(key, value, size, expires)
+            self.table[key] = node
+            self.bytes += size
+            node.prev = self.root
+            node.next = self.root.next
+            self.root.next.prev = node
+            self.root.next = node
+        self._evict()
+
+    # Will get the value for the corresponding key
+    def __getitem__(self, key):
+        """
+        >>> cache = LRUCacheDict()
+        >>> cache.__setitem__(57, 'Supraj')
+        >>> cache.__getitem__(57)
+        'Supraj'
+        >>> cache.__getitem__(58)
+        'Key 58 is not present in the cache'
+        >>> cache = LRUCacheDict(verbose=False)
+        >>> cache[58]
+        Traceback (most recent call last):
+        ...
+        KeyError: 58
+        """
+        node = self._find(key)
+        if node is None:
+            self.misses += 1
+            if not self.verbose:
+                raise KeyError(key)
+            return "Key " + str(key) + " is not present in the cache"
+        self.hits += 1
+        self._touch(node)
+        if not self.verbose:
+            return node.value
+        return str(node.value)
+
+    # Will insert the items in the cache
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    # Will delete the item with 'key'
+    def __delitem__(self, key):
+        """
+        >>> cache = LRUCacheDict()
+        >>> cache.__setitem__(57, 'Supraj')
+        >>> cache.__delitem__(57)
+        'Key 57 is deleted successfully'
+        >>> cache.__delitem__(57)
+        'Key 57 is not present in the cache'
+        """
+        node = self._find(key)
+        if node is None:
+            if not self.verbose:
+                raise KeyError(key)
+            return "Key " + str(key) + " is not present in the cache"
+        self._remove(node)
+        if self.verbose:
+            return "Key " + str(key) + " is deleted successfully"
+
+    # Will check if the key is present and not expired, without counting a
+    # hit or a miss or changing its place in the recency order
+    def __contains__(self, key):
+        """
+        >>> now = [0.0]
+        >>> cache = LRUCacheDict(ttl=10, clock=lambda: now[0])
+        >>> cache.__setitem__(57, 'Supraj')
+        >>> cache.set(58, 'Sri', ttl=30)
+        >>> now[0] = 20.0
+        >>> cache.__contains__(57)
+        'Key 57 is not present in the cache'
+        >>> cache.__contains__(58)
+        'Key 58 is present in the cache'
+        >>> len(cache), cache.expirations
+        (1, 1)
+        """
+        found = self._find(key) is not None
+        if not self.verbose:
+            return found
+        if found:
+            return "Key " + str(key) + " is present in the cache"
+        return "Key " + str(key) + " is not present in the cache"
+
+    # Will give the number of entries, counting expired entries that were
+    # not removed yet
+    def __len__(self):
+        return len(self.table)
+
+    # Will give the keys from the most to the least recently used
+    def keys(self):
+        keys = []
+        node = self.root.next
+        while node is not self.root:
+            keys.append(node.key)
+            node = node.next
+        return keys
+
+    # Will remove every entry, keeping the counters
+    def clear(self):
+        self.table = ChainedHashDict(hashfunc=self.table.hash_strategy, verbose=False)
+        self.root.prev = self.root.next = self.root
+        self.bytes = 0
+
+    # Will print the entries from the most to the least recently used
+    def display(self):
+        """
+        >>> cache = LRUCacheDict()
+        >>> cache.__setitem__(57, 'Supraj')
+        >>> cache.__setitem__(58, 'Sri')
+        >>> cache.display()
+        Cache:{58: 'Sri'}->{57: 'Supraj'}
+        """
+        items = []
+        node = self.root.next
+        while node is not self.root:
+            items.append(repr(node))
+            node = node.next
+        print "Cache:" + "->".join(items)
+
+
+# Separates the positional from the keyword arguments in a memoize_key
+MEMOIZE_KWARGS_MARK = object()
+
+
+# Will turn the arguments of a call into a hashable cache key. Lists, tuples,
+# sets and dictionaries are frozen element by element and tagged with their
+# type, and NumPy arrays by their type, shape and contents. The keyword
+# arguments follow MEMOIZE_KWARGS_MARK, so they never match positional ones.
+def memoize_key(args, kwargs):
+    """
+    >>> memoize_key((['In', 'Xanadu'], 80), {})
+    ((<type 'list'>, 'In', 'Xanadu'), 80)
+    >>> memoize_key((1,), {'b': [2], 'a': 3})[2:]
+    (('a', 3), ('b', (<type 'list'>, 2)))
+    >>> memoize_key((1, ('a', 3)), {}) == memoize_key((1,), {'a': 3})
+    False
+    >>> memoize_key(({'a': 3},), {}) == memoize_key(([('a', 3)],), {})
+    False
+    >>> memoize_key(([1, 2],), {}) == memoize_key(((1, 2),), {})
+    False
+    """
+    key = tuple(freeze_argument(arg) for arg in args)
+    if kwargs:
+        key += (MEMOIZE_KWARGS_MARK,)
+        key += tuple((name, freeze_argument(kwargs[name])) for name in sorted(kwargs))
+    return key
+
+
+def freeze_argument(arg):
+    if type(arg) in (list, tuple):
+        return (type(arg),) + tuple(freeze_argument(item) for item in arg)
+    if type(arg) is dict:
+        return (dict,) + tuple((key, freeze_argument(arg[key])) for key in sorted(arg))
+    if type(arg) in (set, frozenset):
+        return (type(arg), frozenset(arg))
+    if numpy is not None and isinstance(arg, numpy.ndarray):
+        return (numpy.ndarray, arg.dtype.str, arg.shape, arg.tostring())
+    return arg
+
+
+# A decorator caching the results of a function in an LRUCacheDict, for
+# expensive pure functions such as print_neatly or find_seam. The cache is
+# reachable as the 'cache' attribute of the decorated function. 'key' turns
+# (args, kwargs) into the cache key.
+def memoize(max_entries=128, max_bytes=None, ttl=None, key=memoize_key, sizeof=cache_entry_size):
+    """
+    >>> calls = []
+    >>> @memoize(max_entries=2)
+    ... def square(x):
+    ...     calls.append(x)
+    ...     return x * x
+    >>> square(3), square(3), square(4), calls
+    (9, 9, 16, [3, 4])
+    >>> square.cache.hits, square.cache.misses
+    (1, 2)
+    >>> @memoize()
+    ... def arguments(*args, **kwargs):
+    ...     return args, kwargs
+    >>> arguments(1, ('a', 3)), arguments(1, a=3)
+    (((1, ('a', 3)), {}), ((1,), {'a': 3}))
+    """
+    missing = object()
+
+    def decorator(function):
+        cache = LRUCacheDict(max_entries, max_bytes, ttl, verbose=False, sizeof=sizeof)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            cache_key = key(args, kwargs)
+            result = cache.get(cache_key, missing)
+            if result is missing:
+                result = function(*args, **kwargs)
+                cache.set(cache_key, result)
+            return result
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
+# Largest value of a counter of CountingBloomFilter. A counter that reaches
+# it stays there, so removing a key never clears a counter another key set.
+BLOOM_COUNTER_MAX = 255
+
+
+# A Bloom filter with a small counter instead of a bit per position, so keys
+# can be removed. It is sized for 'expected_items' keys at the given
+# 'false_positive_rate': a key it says is absent was never added (or was
+# removed), a key it says may be present is absent with about that
+# probability while it holds no more than expected_items keys. The 'hashes'
+# positions of a key are derived from its Fibonacci hash by double hashing.
+class CountingBloomFilter(object):
+
+    def __init__(self, expected_items=1000, false_positive_rate=0.01, hashfunc=hash):
+        """
+        >>> bloom = CountingBloomFilter(1000, 0.01)
+        >>> bloom.size, bloom.hashes
+        (9586, 7)
+        """
+        super(CountingBloomFilter, self).__init__()
+        self.hash_strategy = as_hash_strategy(hashfunc)
+        expected_items = max(1, expected_items)
+        self.size = max(1, int(math.ceil(-expected_items * math.log(false_positive_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(float(self.size) / expected_items * math.log(2))))
+        self.counters = bytearray(self.size)
+        self._items = 0
+
+    # Will give the counter positions of 'key'
+    def _positions(self, key):
+        mixed = (self.hash_strategy.hash(key) * FibonacciHash.MULTIPLIER) & FibonacciHash.MASK
+        first, step = mixed >> 32, (mixed & 0xFFFFFFFF) | 1
+        return [(first + i * step) % self.size for i in xrange(self.hashes)]
+
+    # Will count 'key' in the filter
+    def add(self, key):
+        counters = self.counters
+        for position in self._positions(key):
+            if counters[position] < BLOOM_COUNTER_MAX:
+                counters[position] += 1
+        self._items += 1
+
+    # Will uncount 'key', which must have been added
+    def remove(self, key):
+        """
+        >>> bloom = CountingBloomFilter(100)
+        >>> bloom.add(57)
+        >>> bloom.add(58)
+        >>> bloom.remove(57)
+        >>> 57 in bloom, 58 in bloom, len(bloom)
+        (False, True, 1)
+        """
+        counters = self.counters
+        for position in self._positions(key):
+            if 0 < counters[position] < BLOOM_COUNTER_MAX:
+                counters[position] -= 1
+        self._items -= 1
+
+    # Will check if 'key' may be present, stopping at the first empty counter
+    def __contains__(self, key):
+        mixed = (self.hash_strategy.hash(key) * FibonacciHash.MULTIPLIER) & FibonacciHash.MASK
+        position, step, size = mixed >> 32, (mixed & 0xFFFFFFFF) | 1, self.size
+        counters = self.counters
+        for i in xrange(self.hashes):
+            if not counters[position % size]:
+                return False
+            position += step
+        return True
+
+    # Will give the number of keys counted
+    def __len__(self):
+        return self._items
+
+    # Will give the false positive rate expected for the keys counted now
+    @property
+    def false_positive_rate(self):
+        """
+        >>> bloom = CountingBloomFilter(1000, 0.01)
+        >>> for key in range(1000):
+        ...     bloom.add(key)
+        >>> round(bloom.false_positive_rate, 3)
+        0.01
+        """
+        return (1.0 - math.exp(-float(self.hashes) * self._items / self.size)) ** self.hashes
+
+
+# A container with a CountingBloomFilter in front of it, for workloads where
+# most lookups miss: a key the filter rules out is answered as missing
+# without touching the container. 'container' is an empty hash table or tree
+# built with verbose=False, and every change must go through this wrapper so
+# the filter stays in step. The keys must be hashable, also for a tree.
+class BloomFilterDict(object):
+
+    def __init__(self, container, expected_items=1000, false_positive_rate=0.01, verbose=True, hashfunc=hash):
+        super(BloomFilterDict, self).__init__()
+        if getattr(container, 'verbose', False) or len(container):
+            raise ValueError("The container must be empty and built with verbose=False")
+        self.container = container
+        self.bloom = CountingBloomFilter(expected_items, false_positive_rate, hashfunc)
+        self.verbose = verbose
+        self.metrics = None
+        # Lookups ruled out by the filter, and lookups it let through for
+        # keys that were not in the container
+        self.lookups = 0
+        self.filtered = 0
+        self.false_positives = 0
+
+    # Will get the value for the corresponding key
+    def __getitem__(self, key):
+        """
+        >>> bfd = BloomFilterDict(BinarySearchTreeDict(verbose=False), 100)
+        >>> bfd.__setitem__(57, 'Supraj')
+        >>> bfd.__getitem__(57)
+        'Supraj'
+        >>> bfd.__getitem__(58)
+        'Key 58 is not present'
+        >>> bfd = BloomFilterDict(ChainedHashDict(verbose=False), 100, verbose=False)
+        >>> bfd[58]
+        Traceback (most recent call last):
+        ...
+        KeyError: 58
+        """
+        self.lookups += 1
+        if key in self.bloom:
+            try:
+                value = self.container[key]
+            except KeyError:
+                self.false_positives += 1
+            else:
+                if not self.verbose:
+                    return value
+                return str(value)
+        else:
+            self.filtered += 1
+        if not self.verbose:
+            raise KeyError(key)
+        return "Key " + str(key) + " is not present"
+
+    # Will insert the items in the container, counting new keys in the filter
+    def __setitem__(self, key, value):
+        size = len(self.container)
+        self.container[key] = value
+        if len(self.container) > size:
+            self.bloom.add(key)
+
+    # Will delete the item with 'key'
+    def __delitem__(self, key):
+        """
+        >>> bfd = BloomFilterDict(OpenAddressHashDict(verbose=False), 100)
+        >>> bfd.__setitem__(57, 'Supraj')
+        >>> bfd.__delitem__(57)
+        'Key 57 is deleted successfully'
+        >>> bfd.__delitem__(57)
+        'Key 57 is not present'
+        >>> 57 in bfd.bloom
+        False
+        """
+        found = key in self.bloom
+        if found:
+            try:
+                del self.container[key]
+            except KeyError:
+                found = False
+            else:
+                self.bloom.remove(key)
+        if not found:
+            if not self.verbose:
+                raise KeyError(key)
+            return "Key " + str(key) + " is not present"
+        if self.verbose:
+            return "Key " + str(key) + " is deleted successfully"
+
+    # Will check if the key is present
+    def __contains__(self, key):
+        """
+        >>> bfd = BloomFilterDict(ChainedHashDict(verbose=False), 100, verbose=False)
+        >>> bfd[57] = 'Supraj'
+        >>> 57 in bfd, 58 in bfd
+        (True, False)
+        """
+        self.lookups += 1
+        found = False
+        if key in self.bloom:
+            found = key in self.container
+            if not found:
+                self.false_positives += 1
+        else:
+            self.filtered += 1
+        if not self.verbose:
+            return found
+        if found:
+            return "Key " + str(key) + " is present"
+        return "Key " + str(key) + " is not present"
+
+    # Will give the number of elements in the container
+    def __len__(self):
+        return len(self.container)
+
+    # Will give how well the filter works: the lookups it ruled out, those
+    # it let through for missing keys, the false positive rate seen on
+    # missing keys next to the one expected from its size, and its shape.
+    # The numbers are also exported with export_stats() to 'sink', or to the
+    # metrics sink when it is set.
+    def stats(self, sink=None):
+        """
+        >>> bfd = BloomFilterDict(ChainedHashDict(verbose=False), 1000, verbose=False)
+        >>> for key in range(0, 2000, 2):
+        ...     bfd[key] = key
+        >>> found = [key in bfd for key in range(1, 2000, 2)]
+        >>> stats = bfd.stats()
+        >>> stats['lookups'], stats['filtered'] + stats['false_positives'], stats['false_positive_rate'] < 0.03
+        (1000, 1000, True)
+        """
+        misses = self.filtered + self.false_positives
+        stats = {
+            'lookups': self.lookups,
+            'filtered': self.filtered,
+            'false_positives': self.false_positives,
+            'false_positive_rate': float(self.false_positives) / misses if misses else 0.0,
+            'expected_false_positive_rate': self.bloom.false_positive_rate,
+            'items': len(self.bloom),
+            'counters': self.bloom.size,
+            'hashes': self.bloom.hashes,
+        }
+        if sink is None:
+            sink = self.metrics
+        if sink is not None:
+            export_stats(stats, sink, type(self).__name__)
+        return stats
+
+
+# A hash strategy splits hashing into two steps: hash() turns a key into an
+# integer once per operation, and index() reduces that integer to a bin of a
+# table with 'bin_count' bins. The hash tables cache the result of hash() in
+# their entries, so growing a table only changes the bin_count passed to
+# index(). This base strategy uses Python's hash() reduced modulo bin_count.
+# hash_many() and index_many() do the same for a whole batch of keys, in one
+# NumPy pass when the keys are a NumPy integer array.
+class HashStrategy(object):
+    # True when hash() is Python's hash(), which is the integer itself for
+    # machine integers other than -1
+    python_hash = True
+
+    def __init__(self, bin=None):
+        super(HashStrategy, self).__init__()
+        # Bin count used when the strategy is called as a function
+        self.bin = bin
+
+    def hash(self, key):
+        return hash(key)
+
+    def index(self, key_hash, bin_count):
+        """
+        >>> HashStrategy().index(57, 10)
+        7
+        """
+        return key_hash % bin_count
+
+    # Will give the hashes of a batch of keys, as an int64 array when the
+    # keys are a NumPy integer array and as a list otherwise
+    def hash_many(self, keys):
+        """
+        >>> list(HashStrategy().hash_many([57, -1, 'Supraj'])) == [57, hash(-1), hash('Supraj')]
+        True
+        """
+        if _is_int_array(keys) and self.python_hash:
+            key_hashes = keys.astype(numpy.int64)
+            key_hashes[key_hashes == -1] = -2
+            return key_hashes
+        if _is_array(keys):
+            keys = keys.tolist()
+        return [self.hash(key) for key in keys]
+
+    # Will give the bins of a batch of hashes from hash_many()
+    def index_many(self, key_hashes, bin_count):
+        """
+        >>> list(HashStrategy().index_many([57, 58, -3], 10))
+        [7, 8, 7]
+        """
+        if _is_array(key_hashes):
+            return numpy.mod(key_hashes, bin_count)
+        return [self.index(key_hash, bin_count) for key_hash in key_hashes]
+
+    # Will give the number of bins to use for a requested table size
+    def table_size(self, bin_count):
+        return bin_count
+
+    # Called as a function, gives the bin of 'item' in a table of 'bin' bins
+    def __call__(self, item):
+        """
+        >>> h = hash_function(10)
+        >>> h(57)
+        7
+        """
+        return self.index(self.hash(item), self.bin)
+
+
+# Wraps a plain function such as hash() as a strategy: the function gives
+# the hash and it is reduced modulo the bin count
+class FunctionHash(HashStrategy):
+
+    def __init__(self, function):
+        super(FunctionHash, self).__init__()
+        self.function = function
+        self.python_hash = function is hash
+
+    def hash(self, key):
+        return self.function(key)
+
+
+# Keeps the bin count a power of two so that the reduction is a bit mask
+class MaskHash(HashStrategy):
+
+    def index(self, key_hash, bin_count):
+        """
+        >>> MaskHash().index(57, 16)
+        9
+        """
+        return key_hash & (bin_count - 1)
+
+    def index_many(self, key_hashes, bin_count):
+        if _is_array(key_hashes):
+            return key_hashes & (bin_count - 1)
+        return [key_hash & (bin_count - 1) for key_hash in key_hashes]
+
+    def table_size(self, bin_count):
+        """
+        >>> MaskHash().table_size(10)
+        16
+        """
+        size = 1
+        while size < bin_count:
+            size *= 2
+        return size
+
+
+# Fibonacci (multiplicative) hashing: the hash is multiplied by 2**64 divided
+# by the golden ratio and the bin is taken from the top bits of the product,
+# so keys that only differ in their low bits still spread over the table
+class FibonacciHash(MaskHash):
+    MULTIPLIER = 11400714819323198485
+    MASK = 2 ** 64 - 1
+
+    def index(self, key_hash, bin_count):
+        """
+        >>> h = FibonacciHash()
+        >>> [h.index(key, 16) for key in range(4)]
+        [0, 9, 3, 13]
+        """
+        bits = bin_count.bit_length() - 1
+        if bits == 0:
+            return 0
+        return int(((key_hash * self.MULTIPLIER) & self.MASK) >> (64 - bits))
+
+    def index_many(self, key_hashes, bin_count):
+        """
+        >>> h = FibonacciHash()
+        >>> list(h.index_many(range(4), 16))
+        [0, 9, 3, 13]
+        """
+        if not _is_array(key_hashes):
+            return [self.index(key_hash, bin_count) for key_hash in key_hashes]
+        bits = bin_count.bit_length() - 1
+        if bits == 0:
+            return numpy.zeros(len(key_hashes), numpy.int64)
+        # uint64 arithmetic wraps around, which is the '& MASK' of index()
+        product = key_hashes.view(numpy.uint64) * numpy.uint64(self.MULTIPLIER)
+        return (product >> numpy.uint64(64 - bits)).astype(numpy.int64)
+
+
+# Seeded universal hashing, ((a * hash + b) mod p) mod bin_count with a and b
+# drawn at random for every table, so a set of keys that collides in one
+# table does not collide in another. Pass a seed to get the same bins again.
+class UniversalHash(HashStrategy):
+    PRIME = 2 ** 61 - 1
+    MASK = 2 ** 64 - 1
+
+    def __init__(self, seed=None):
+        super(UniversalHash, self).__init__()
+        rng = random.Random(seed)
+        self.a = rng.randrange(1, self.PRIME)
+        self.b = rng.randrange(0, self.PRIME)
+
+    def index(self, key_hash, bin_count):
+        """
+        >>> h = UniversalHash(seed=1)
+        >>> h.index(57, 10) == UniversalHash(seed=1).index(57, 10)
+        True
+        """
+        return int(((self.a * (key_hash & self.MASK) + self.b) % self.PRIME) % bin_count)
+
+    # The products don't fit in 64 bits, so a batch is reduced key by key
+    def index_many(self, key_hashes, bin_count):
+        if _is_array(key_hashes):
+            key_hashes = key_hashes.tolist()
+        return [self.index(key_hash, bin_count) for key_hash in key_hashes]
+
+
+# Puts every key in the last bin, see terrible_hash()
+class TerribleHash(HashStrategy):
+
+    def index(self, key_hash, bin_count):
+        return bin_count - 1
+
+    def index_many(self, key_hashes, bin_count):
+        return [bin_count - 1] * len(key_hashes)
+
+
+# Gives the strategy for the 'hashfunc' argument of the hash tables
+def as_hash_strategy(hashfunc):
+    if isinstance(hashfunc, HashStrategy):
+        return hashfunc
+    return FunctionHash(hashfunc)
+
+
+def hash_function(bin):
+    return HashStrategy(bin)
+
+
+# Gives the number of bins for a table holding 'expected_size' keys without
+# going over its max_load, taking bin_count and max_load out of the
+# constructor arguments 'kwargs'
+def _presized_bin_count(expected_size, kwargs):
+    bin_count = kwargs.pop('bin_count', 10)
+    max_load = kwargs.get('max_load', 0.7)
+    return max(bin_count, int(expected_size / max_load) + 1)
+
+
+def _is_array(values):
+    return numpy is not None and isinstance(values, numpy.ndarray)
+
+
+def _is_int_array(values):
+    return _is_array(values) and values.dtype.kind == 'i'
+
+
+# Hashes a batch of keys in one pass and gives the keys, their hashes and
+# their bins in a table of 'bin_count' bins as lists, along with the order
+# that visits the keys grouped by bin
+def _batch_bins(strategy, keys, bin_count):
+    key_hashes = strategy.hash_many(keys)
+    bins = strategy.index_many(key_hashes, bin_count)
+    if _is_array(bins):
+        order = numpy.argsort(bins, kind='mergesort').tolist()
+        bins = bins.tolist()
+    else:
+        order = sorted(xrange(len(bins)), key=bins.__getitem__)
+    if _is_array(key_hashes):
+        key_hashes = key_hashes.tolist()
+    if _is_array(keys):
+        keys = keys.tolist()
+    else:
+        keys = list(keys)
+    return keys, key_hashes, bins, order
+
+
+# Gives the values and found mask of a batch lookup of 'count' keys, as
+# NumPy arrays when NumPy is installed and as lists otherwise
+def _batch_results(count, default=None):
+    if numpy is None:
+        return [default] * count, [False] * count
+    values = numpy.empty(count, dtype=object)
+    values.fill(default)
+    return values, numpy.zeros(count, dtype=bool)
+
+
+# Gives the values of a batch insert as a list of the same length as 'keys'
+def _batch_values(keys, values):
+    if _is_array(values):
+        values = values.tolist()
+    else:
+        values = list(values)
+    if len(values) != len(keys):
+        raise ValueError("Got " + str(len(keys)) + " keys and " + str(len(values)) + " values")
+    return values
+
+
+# Counts a growth of 'table' that started at 'start' and sends its
+# duration to the metrics sink of the table, if any
+def record_rebuild(table, start):
+    elapsed = time.time() - start
+    table.rebuilds += 1
+    table.rebuild_seconds += elapsed
+    if table.metrics is not None:
+        table.metrics(type(table).__name__ + '.rebuild_seconds', elapsed)
+
+
+# Grows 'table' in one go with rebuild() and counts the growth
+def timed_rebuild(table):
+    start = time.time()
+    table.rebuild(table.bin_count)
+    record_rebuild(table, start)
+
+
+# Will send every number of a stats() dictionary to 'sink' as
+# sink(name, value), the names prefixed with 'prefix'. Histograms are sent
+# one bucket at a time.
+def export_stats(stats, sink, prefix):
+    """
+    >>> def sink(name, value):
+    ...     print name, value
+    >>> export_stats({'size': 2, 'depths': {0: 1, 1: 1}}, sink, 'tree')
+    tree.depths.0 1
+    tree.depths.1 1
+    tree.size 2
+    """
+    for name in sorted(stats):
+        value = stats[name]
+        if type(value) is dict:
+            for bucket in sorted(value):
+                sink(prefix + '.' + name + '.' + str(bucket), value[bucket])
+        else:
+            sink(prefix + '.' + name, value)
+
+
+class OpenAddressHashDict(object):
+
+    def __init__(self, bin_count=10, max_load=0.7, hashfunc=hash, verbose=True, rehash_step=None,
+                 robin_hood=False):
+        super(OpenAddressHashDict, self).__init__()
+        self.hash_strategy = as_hash_strategy(hashfunc)
+        self._bin_count = self.hash_strategy.table_size(bin_count)
+        self.hash_table = [None] * self._bin_count
+        self.max_load = max_load
+        self._size = 0
+        # Number of slots holding a 'DELETED' marker
+        self._deleted = 0
+        # When verbose is False lookups return the stored value, misses
+        # raise KeyError and no status strings are built
+        self.verbose = verbose
+        # When rehash_step is set, growing the table is done incrementally:
+        # the old table is kept next to the new one and every operation moves
+        # up to rehash_step of its slots. None rebuilds the table in one go.
+        # An operation always moves at least int(1 / max_load) + 1 slots, so
+        # the old table is empty before the table has to grow again.
+        self.rehash_step = rehash_step
+        self._old_table = None
+        # Slots of the old table moved so far, counted from _rehash_start
+        self._rehash_index = 0
+        self._rehash_start = 0
+        # Bound on the distance of any entry from its home slot, in the table
+        # and in the old table
+        self._max_distance = 0
+        self._old_max_distance = 0
+        # When robin_hood is set, an insert takes the slot of any entry that
+        # is closer to its home slot than the new one, and a delete shifts
+        # the rest of the probe run back instead of leaving a 'DELETED' marker
+        self.robin_hood = robin_hood
+        # Growth counters reported by stats(). When metrics is set to a
+        # sink(name, value) callable every rebuild and stats() are also sent to it.
+        self.rebuilds = 0
+        self.rebuild_seconds = 0.0
+        self.metrics = None
+
+    # Will build a table from (key, value) pairs with enough slots for
+    # 'expected_size' keys, so loading it never rebuilds the table. Without
+    # expected_size the pairs are counted first. Other keyword arguments go
+    # to the constructor.
+    @classmethod
+    def from_items(cls, items, expected_size=None, **kwargs):
+        """
+        >>> ohd = OpenAddressHashDict.from_items(((key, -key) for key in range(100)), 100,
+        ...                                      hashfunc=MaskHash(), verbose=False)
+        >>> ohd.bin_count, len(ohd), ohd[9]
+        (256, 100, -9)
+        >>> ohd = ArrayOpenAddressHashDict.from_items([(57, 'Supraj')], int_keys=True)
+        >>> ohd.bin_count, ohd[57]
+        (10, 'Supraj')
+        """
+        if expected_size is None:
+            items = list(items)
+            expected_size = len(items)
+        table = cls(bin_count=_presized_bin_count(expected_size, kwargs), **kwargs)
+        for key, value in items:
+            table[key] = value
+        return table
+
+    @property
+    def load_factor(self):
+        """
+        >>> ohd= OpenAddressHashDict()
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd.load_factor
+        0.1
+        """
+        return float(self._size) / float(self.bin_count)
+
+    # Will return the number of bins
+    @property
+    def bin_count(self):
+        """
+        >>> ohd= OpenAddressHashDict()
+        >>> ohd.bin_count
+        10
+        """
+        return self._bin_count
+
+    # Will write a snapshot of the table to 'file', a path or a file opened
+    # for writing: the state of every slot, then the key, value and cached
+    # hash of the filled slots in slot order, so the probe positions are kept
+    def save(self, file):
+        """
+        >>> from cStringIO import StringIO
+        >>> ohd = OpenAddressHashDict(hashfunc=terrible_hash(10))
+        >>> for key in [57, 58, 59]:
+        ...     ohd.__setitem__(key, str(key))
+        >>> ohd.__delitem__(58)
+        'Key 58 is successfully deleted'
+        >>> snapshot = StringIO()
+        >>> ohd.save(snapshot)
+        >>> snapshot.seek(0)
+        >>> ohd = OpenAddressHashDict.load(snapshot, hashfunc=terrible_hash(10))
+        >>> ohd.hash_table[9], ohd.hash_table[0], ohd.hash_table[1], len(ohd), ohd._deleted
+        ({57: '57'}, {-1: 'DELETED'}, {59: '59'}, 2, 1)
+        """
+        self._finish_rehash()
+        states = bytearray(self._bin_count)
+        keys, values, hashes = [], [], []
+        index = 0
+        for cur_value in self.hash_table:
+            if cur_value is DELETED:
+                states[index] = DELETED_SLOT
+            elif cur_value is not None:
+                states[index] = FULL_SLOT
+                keys.append(cur_value.key)
+                values.append(cur_value.value)
+                hashes.append(cur_value.key_hash)
+            index += 1
+        write_snapshot(file, SNAPSHOT_OPEN_ADDRESS, snapshot_flags(self.verbose, self.robin_hood), self.max_load,
+                       self._bin_count, self._size, self._deleted, snapshot_setting(self.rehash_step),
+                       [states, keys, values, hashes])
+
+    # Will restore a table saved with save() with every entry in the slot it
+    # was saved in, without hashing any key. 'hashfunc' must be the hash
+    # function the table was saved with.
+    @classmethod
+    def load(cls, file, hashfunc=hash):
+        flags, max_load, bin_count, size, deleted, setting, columns = read_snapshot(file, SNAPSHOT_OPEN_ADDRESS)
+        states, keys, values, hashes = columns
+        table = cls(bin_count, max_load, hashfunc, bool(flags & SNAPSHOT_VERBOSE), snapshot_rehash_step(setting),
+                    bool(flags & SNAPSHOT_MODE))
+        check_snapshot_bins(table, bin_count)
+        hash_table = table.hash_table
+        entry = 0
+        for index in xrange(bin_count):
+            state = states[index]
+            if state == FULL_SLOT:
+                hash_table[index] = DictionaryNode(keys[entry], values[entry], hashes[entry])
+                entry += 1
+            elif state == DELETED_SLOT:
+                hash_table[index] = DELETED
+        table._size = size
+        table._deleted = deleted
+        table._max_distance = table.max_probe_length
+        return table
+
+    # Will return the largest distance of any key from its home slot
+    @property
+    def max_probe_length(self):
+        """
+        >>> ohd = OpenAddressHashDict(hashfunc=terrible_hash(10))
+        >>> ohd.max_probe_length
+        0
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd.__setitem__(58, 'Sri')
+        >>> ohd.max_probe_length
+        1
+        """
+        max_probe = 0
+        index = 0
+        for value in self.hash_table:
+            if(value is not None and value is not DELETED):
+                max_probe = max(max_probe, self._distance(value, index))
+            index += 1
+        return max_probe
+
+    # Will give how far the entry in slot 'index' is from its home slot
+    def _distance(self, entry, index):
+        return (index - self.hash_strategy.index(entry.key_hash, self._bin_count)) % self._bin_count
+
+    # Will rebuild the hash table by doubling the number of bins
+    def rebuild(self, bincount):
+        self._finish_rehash()
+        cur_table = self._grow()
+        for cur_value in cur_table:
+            if(cur_value is not None and cur_value is not DELETED):
+                self._insert_entry(cur_value)
+
+    # Doubles the number of bins and gives back the old table
+    def _grow(self):
+        self._bin_count *= 2
+        cur_table = self.hash_table
+        self.hash_table = [None] * self.bin_count
+        self._deleted = 0
+        self._old_max_distance = self._max_distance
+        self._max_distance = 0
+        return cur_table
+
+    # Grows the table, moving the entries over incrementally if rehash_step is set
+    def _resize(self):
+        start = time.time()
+        if self.rehash_step is None:
+            self.rebuild(self.bin_count)
+        else:
+            self._finish_rehash()
+            self._old_table = self._grow()
+            # The move starts at an empty slot, so no probe run of the old
+            # table wraps around from slots not yet moved to moved ones
+            self._rehash_start = self._old_table.index(None)
+            self._rehash_index = 0
+        record_rebuild(self, start)
+
+    # Moves the slots of the old table one operation moves
+    def _migrate_step(self):
+        self._migrate(max(self.rehash_step, int(1 / self.max_load) + 1))
+
+    # Moves the next 'slots' slots of the old table into the new table and
+    # empties them. A probe of the old table skips the moved slots, see
+    # _probe_old().
+    def _migrate(self, slots):
+        old_table = self._old_table
+        bin_count = len(old_table)
+        end = min(self._rehash_index + slots, bin_count)
+        index = (self._rehash_start + self._rehash_index) % bin_count
+        for moved in xrange(self._rehash_index, end):
+            cur_value = old_table[index]
+            if(cur_value is not None):
+                old_table[index] = None
+                if(cur_value is not DELETED):
+                    self._insert_entry(cur_value)
+            index += 1
+            if index == bin_count:
+                index = 0
+        self._rehash_index = end
+        if end == bin_count:
+            self._old_table = None
+
+    # Completes a pending incremental rehash
+    def _finish_rehash(self):
+        if self._old_table is not None:
+            self._migrate(len(self._old_table))
+
+    # Will give the index of the slot of the old table holding 'key', or
+    # None. Moving a slot empties it, so a probe whose home slot has been
+    # moved already starts at the first slot not moved instead. An entry is
+    # never more than _old_max_distance slots past its home slot, so the key
+    # can only be that close to the first slot not moved.
+    def _probe_old(self, key, key_hash):
+        old_table = self._old_table
+        bin_count = len(old_table)
+        index = self.hash_strategy.index(key_hash, bin_count)
+        if((index - self._rehash_start) % bin_count >= self._rehash_index):
+            return self._probe(old_table, key, key_hash, index)
+        index = (self._rehash_start + self._rehash_index) % bin_count
+        for step in xrange(self._old_max_distance):
+            value_at_index = old_table[index]
+            if value_at_index is None:
+                break
+            if(value_at_index.key_hash == key_hash and value_at_index is not DELETED):
+                cur_key = value_at_index.key
+                if(cur_key is key or cur_key == key):
+                    return index
+            index = (index + 1) % bin_count
+        return None
+
+    # Will give the index of the slot of 'table' holding 'key', or None.
+    # 'index' is the home slot of the key when it is already known.
+    def _probe(self, table, key, key_hash, index=None):
+        bin_count = len(table)
+        if index is None:
+            index = self.hash_strategy.index(key_hash, bin_count)
+        value_at_index = table[index]
+        while (value_at_index is not None):
+            if(value_at_index.key_hash == key_hash and value_at_index is not DELETED):
+                cur_key = value_at_index.key
+                if(cur_key is key or cur_key == key):
+                    return index
+            index = (index + 1) % bin_count
+            value_at_index = table[index]
+        return None
+
+    # Will give the index of the slot holding 'key', or None
+    def _find_index(self, key, key_hash, index=None):
+        if self.robin_hood:
+            return self._robin_hood_probe(key, key_hash, index)
+        return self._probe(self.hash_table, key, key_hash, index)
+
+    # Robin Hood lookup: the probe can stop as soon as it reaches an entry
+    # that is closer to its home slot than 'key' would be
+    def _robin_hood_probe(self, key, key_hash, index=None):
+        bin_count = self.bin_count
+        if index is None:
+            index = self.hash_strategy.index(key_hash, bin_count)
+        distance = 0
+        value_at_index = self.hash_table[index]
+        while (value_at_index is not None):
+            if(value_at_index.key_hash == key_hash):
+                cur_key = value_at_index.key
+                if(cur_key is key or cur_key == key):
+                    return index
+            if(self._distance(value_at_index, index) < distance):
+                return None
+            distance += 1
+            index = (index + 1) % bin_count
+            value_at_index = self.hash_table[index]
+        return None
+
+    # Will give the entry holding 'key' in either table, or None
+    def _find_entry(self, key):
+        key_hash = self.hash_strategy.hash(key)
+        if self._old_table is not None:
+            self._migrate_step()
+            if self._old_table is not None:
+                index = self._probe_old(key, key_hash)
+                if index is not None:
+                    return self._old_table[index]
+        index = self._find_index(key, key_hash)
+        if index is None:
+            return None
+        return self.hash_table[index]
+
+    # Removes 'key' from the table being migrated, if it is there
+    def _remove_old(self, key, key_hash):
+        if self._old_table is None:
+            return False
+        index = self._probe_old(key, key_hash)
+        if index is None:
+            return False
+        self._old_table[index] = DELETED
+        self._size -= 1
+        return True
+
+    # Puts 'item' in the first free slot of its probe sequence, starting at
+    # its home slot 'index' when that is already known
+    def _insert_entry(self, item, index=None):
+        if self.robin_hood:
+            self._robin_hood_insert(item, index)
+            return
+        bin_count = self.bin_count
+        if index is None:
+            index = self.hash_strategy.index(item.key_hash, bin_count)
+        distance = 0
+        value_at_index = self.hash_table[index]
+        while (value_at_index is not None):
+            if(value_at_index is DELETED):
+                self._deleted -= 1
+                break
+            distance += 1
+            index = (index + 1) % bin_count
+            value_at_index = self.hash_table[index]
+        self.hash_table[index] = item
+        if distance > self._max_distance:
+            self._max_distance = distance
+
+    # Robin Hood insert: 'item' swaps places with the first entry on its probe
+    # sequence that is closer to its own home slot, which then carries on
+    def _robin_hood_insert(self, item, index=None):
+        bin_count = self.bin_count
+        if index is None:
+            index = self.hash_strategy.index(item.key_hash, bin_count)
+        distance = 0
+        value_at_index = self.hash_table[index]
+        while (value_at_index is not None):
+            cur_distance = self._distance(value_at_index, index)
+            if(cur_distance < distance):
+                self.hash_table[index] = item
+                item = value_at_index
+                if distance > self._max_distance:
+                    self._max_distance = distance
+                distance = cur_distance
+            distance += 1
+            index = (index + 1) % bin_count
+            value_at_index = self.hash_table[index]
+        self.hash_table[index] = item
+        if distance > self._max_distance:
+            self._max_distance = distance
+
+    # Will give the value stored in slot 'index'
+    def _value_at(self, index):
+        return self.hash_table[index].value
+
+    # Sets 'key' in the current table, starting the probe at its home slot
+    # 'index' when that is already known. Gives True if the key was added.
+    def _upsert(self, key, value, key_hash, index=None):
+        found = self._find_index(key, key_hash, index)
+        if found is not None:
+            self.hash_table[found].value = value
+            return False
+        self._insert_entry(DictionaryNode(key, value, key_hash), index)
+        self._size += 1
+        return True
+
+    # Removes the entry in slot 'index' of the current table
+    def _delete_at(self, index):
+        if self.robin_hood:
+            self._backward_shift(index)
+        else:
+            self.hash_table[index] = DELETED
+            self._deleted += 1
+        self._size -= 1
+
+    # Empties slot 'index' by shifting the entries after it back by one slot,
+    # up to the first empty slot or the first entry in its home slot
+    def _backward_shift(self, index):
+        bin_count = self.bin_count
+        next_index = (index + 1) % bin_count
+        value_at_index = self.hash_table[next_index]
+        while (value_at_index is not None and self._distance(value_at_index, next_index) > 0):
+            self.hash_table[index] = value_at_index
+            index = next_index
+            next_index = (index + 1) % bin_count
+            value_at_index = self.hash_table[next_index]
+        self.hash_table[index] = None
+
+    # Will get the value for the corresponding key
+    def __getitem__(self, key):
+        """
+        >>> ohd= OpenAddressHashDict()
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd.__getitem__(57)
+        'Supraj'
+        >>> ohd.__getitem__(58)
+        'Key 58 is not present in the table'
+        >>> ohd = OpenAddressHashDict(verbose=False)
+        >>> ohd[57] = ['Supraj']
+        >>> ohd[57]
+        ['Supraj']
+        >>> ohd[58]
+        Traceback (most recent call last):
+        ...
+        KeyError: 58
+        """
+        result = self._find_entry(key)
+        if result is None:
+            if not self.verbose:
+                raise KeyError(key)
+            return "Key " + str(key) + " is not present in the table"
+        if not self.verbose:
+            return result.value
+        return str(result.value)
+
+    # Will insert the items in the Hash Table
+    def __setitem__(self, key, value):
+        """
+        >>> ohd= OpenAddressHashDict()
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd = OpenAddressHashDict(verbose=False, rehash_step=1)
+        >>> for key in range(8):
+        ...     ohd[key] = key * key
+        >>> ohd.bin_count, ohd[7], len(ohd)
+        (20, 49, 8)
+
+        Setting a key that is already present replaces its value in place
+        >>> ohd[7] = 'Seven'
+        >>> ohd[7], len(ohd)
+        ('Seven', 8)
+
+        Sequential keys fill one long probe run of the old table, which
+        probes of the keys homed in its moved part do not walk. The old
+        table is empty before the table grows again.
+        >>> ohd = OpenAddressHashDict(verbose=False, rehash_step=1)
+        >>> for key in range(7168):
+        ...     ohd[key] = key
+        >>> ohd.bin_count, ohd.stats()['rehashing'], len(ohd), ohd[7167], 7168 in ohd
+        (10240, False, 7168, 7167, False)
+        """
+        key_hash = self.hash_strategy.hash(key)
+        if self._old_table is not None:
+            self._migrate_step()
+            if self._find_index(key, key_hash) is None:
+                self._remove_old(key, key_hash)
+        if not self._upsert(key, value, key_hash):
+            return
+        # 'DELETED' markers still lengthen the probe runs, so they count
+        # towards the resize threshold as well
+        if(self._size + self._deleted > self.max_load * self.bin_count):
+            self._resize()
+
+    # Will delete the item with 'key'
+    def __delitem__(self, key):
+        """
+        >>> ohd= OpenAddressHashDict()
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd.__delitem__(57)
+        'Key 57 is successfully deleted'
+        >>> ohd.__delitem__(57)
+        'Key 57 is not present in the table'
+        >>> ohd = OpenAddressHashDict(verbose=False)
+        >>> ohd[57] = 'Supraj'
+        >>> del ohd[57]
+        >>> del ohd[57]
+        Traceback (most recent call last):
+        ...
+        KeyError: 57
+
+        In Robin Hood mode the entries after a deleted key are shifted back
+        >>> ohd = OpenAddressHashDict(hashfunc=terrible_hash(10), robin_hood=True)
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd.__setitem__(58, 'Sri')
+        >>> ohd.__delitem__(57)
+        'Key 57 is successfully deleted'
+        >>> ohd.hash_table[9], ohd.hash_table[0]
+        ({58: 'Sri'}, None)
+        """
+        key_hash = self.hash_strategy.hash(key)
+        if self._old_table is not None:
+            self._migrate_step()
+        index = self._find_index(key, key_hash)
+        if index is not None:
+            self._delete_at(index)
+        elif not self._remove_old(key, key_hash):
+            if not self.verbose:
+                raise KeyError(key)
+            return "Key " + str(key) + " is not present in the table"
+        if self.verbose:
+            return "Key " + str(key) + " is successfully deleted"
+
+    # Will check if the key is present in the Hash Table
+    def __contains__(self, key):
+        """
+        >>> ohd= OpenAddressHashDict()
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd.__contains__(57)
+        'Key 57 is present in the table with value Supraj'
+        >>> ohd.__contains__(58)
+        'Key 58 is not present in the table'
+        >>> ohd = OpenAddressHashDict(verbose=False)
+        >>> ohd[57] = 'Supraj'
+        >>> 57 in ohd, 58 in ohd
+        (True, False)
+        """
+        result = self._find_entry(key)
+        if not self.verbose:
+            return result is not None
+        if result is None:
+            return "Key " + str(key) + " is not present in the table"
+        return "Key " + str(key) + " is present in the table with value " + result.value
+
+    # Will give the number of elements in the table
+    def __len__(self):
+        """
+        >>> ohd= OpenAddressHashDict()
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd.__setitem__(58, 'Sriram')
+        >>> ohd.__len__()
         2
         """
-        i = 0
-        for value in self.hash_table:
-            if value is not None:
-                if value.keys()[0] is not -1:
-                    i += 1
-        return i
+        return self._size
+
+    # Will look up a batch of keys, given as a list or a NumPy array. The
+    # home slots of all keys are computed in one pass and the table is
+    # probed in slot order. Gives the values, with 'default' for missing
+    # keys, and a mask that is True for the keys that were found.
+    def get_many(self, keys, default=None):
+        """
+        >>> ohd = OpenAddressHashDict(verbose=False, robin_hood=True)
+        >>> ohd.set_many([57, 58, 67], ['Supraj', 'Sri', 'Ram'])
+        >>> values, found = ohd.get_many([67, 59, 57])
+        >>> list(values), list(found)
+        (['Ram', None, 'Supraj'], [True, False, True])
+        """
+        self._finish_rehash()
+        keys, key_hashes, bins, order = _batch_bins(self.hash_strategy, keys, self._bin_count)
+        values, found = _batch_results(len(keys), default)
+        for i in order:
+            index = self._find_index(keys[i], key_hashes[i], bins[i])
+            if index is not None:
+                values[i] = self._value_at(index)
+                found[i] = True
+        return values, found
+
+    # Will give a mask that is True for the keys of the batch in the table
+    def contains_many(self, keys):
+        """
+        >>> ohd = OpenAddressHashDict(verbose=False)
+        >>> ohd.set_many([57, 58], ['Supraj', 'Sri'])
+        >>> list(ohd.contains_many([57, 59]))
+        [True, False]
+        """
+        return self.get_many(keys)[1]
+
+    # Will insert a batch of keys with their values. The table is grown once
+    # up front to hold every key as if all of them were new, so the home
+    # slots computed for the batch stay valid while it is inserted.
+    def set_many(self, keys, values):
+        """
+        >>> ohd = OpenAddressHashDict(verbose=False)
+        >>> ohd.set_many(range(20), range(20))
+        >>> ohd.set_many([3, 3], ['Three', 'Drei'])
+        >>> ohd.bin_count, len(ohd), ohd[19], ohd[3], ohd.stats()['rebuilds']
+        (40, 20, 19, 'Drei', 2)
+        """
+        while self._size + self._deleted + len(keys) > self.max_load * self.bin_count:
+            timed_rebuild(self)
+        self._finish_rehash()
+        keys, key_hashes, bins, order = _batch_bins(self.hash_strategy, keys, self._bin_count)
+        values = _batch_values(keys, values)
+        for i in order:
+            self._upsert(keys[i], values[i], key_hashes[i], bins[i])
+
+    # Will delete a batch of keys, giving a mask that is True for the keys
+    # that were present
+    def delete_many(self, keys):
+        """
+        >>> ohd = OpenAddressHashDict(verbose=False)
+        >>> ohd.set_many([57, 58], ['Supraj', 'Sri'])
+        >>> list(ohd.delete_many([57, 59, 57])), len(ohd)
+        ([True, False, False], 1)
+        """
+        self._finish_rehash()
+        keys, key_hashes, bins, order = _batch_bins(self.hash_strategy, keys, self._bin_count)
+        found = _batch_results(len(keys))[1]
+        for i in order:
+            index = self._find_index(keys[i], key_hashes[i], bins[i])
+            if index is not None:
+                self._delete_at(index)
+                found[i] = True
+        return found
+
+    # Will give how far every entry is from its home slot
+    def _probe_lengths(self):
+        index = 0
+        for value in self.hash_table:
+            if(value is not None and value is not DELETED):
+                yield self._distance(value, index)
+            index += 1
+
+    # Will give the health of the table: how many entries sit at each
+    # distance from their home slot, the mean and largest distance (the
+    # largest is max_probe_length), the share of slots holding a 'DELETED'
+    # marker, and how often and for how long the table grew. The slots of a
+    # pending incremental rehash are not counted. The numbers are also
+    # exported with export_stats() to 'sink', or to the metrics sink of the
+    # table when it is set.
+    def stats(self, sink=None):
+        """
+        >>> ohd = OpenAddressHashDict(hashfunc=terrible_hash(10))
+        >>> for key in [57, 58, 59]:
+        ...     ohd.__setitem__(key, str(key))
+        >>> ohd.__delitem__(58)
+        'Key 58 is successfully deleted'
+        >>> stats = ohd.stats()
+        >>> stats['probe_lengths'], stats['max_probe_length'], stats['mean_probe_length'], stats['tombstone_ratio']
+        ({0: 1, 2: 1}, 2, 1.0, 0.1)
+        >>> stats['max_probe_length'] == ohd.max_probe_length
+        True
+        >>> ohd = ArrayOpenAddressHashDict(verbose=False, int_keys=True)
+        >>> for key in range(8):
+        ...     ohd[key] = key
+        >>> ohd.stats()['rebuilds'], ohd.stats()['probe_lengths']
+        (1, {0: 8})
+        """
+        probe_lengths = {}
+        for distance in self._probe_lengths():
+            probe_lengths[distance] = probe_lengths.get(distance, 0) + 1
+        size = sum(probe_lengths.itervalues())
+        probes = sum(distance * count for distance, count in probe_lengths.iteritems())
+        stats = {
+            'size': self._size,
+            'bin_count': self._bin_count,
+            'load_factor': self.load_factor,
+            'probe_lengths': probe_lengths,
+            'max_probe_length': max(probe_lengths) if probe_lengths else 0,
+            'mean_probe_length': float(probes) / size if size else 0.0,
+            'tombstone_ratio': float(self._deleted) / self._bin_count,
+            'rebuilds': self.rebuilds,
+            'rebuild_seconds': self.rebuild_seconds,
+            'rehashing': self._old_table is not None,
+        }
+        if sink is None:
+            sink = self.metrics
+        if sink is not None:
+            export_stats(stats, sink, type(self).__name__)
+        return stats
+
+    # Will print all the values in the hash table
+    def display(self):
+        """
+        >>> ohd= OpenAddressHashDict()
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd.__setitem__(58, 'Sriram')
+        >>> ohd.display()
+        0- None
+        1- None
+        2- None
+        3- None
+        4- None
+        5- None
+        6- None
+        7- {57: 'Supraj'}
+        8- {58: 'Sriram'}
+        9- None
+        """
+        # A pending incremental rehash is completed so the whole table is shown
+        self._finish_rehash()
+        i = 0
+        for value in self.hash_table:
+            print_string = str(i) + "- " + "None"
+            if(value is not None):
+                print_string = str(i) + "- " + str(value)
+            i += 1
+            print print_string
+
+
+# Slot states of ArrayOpenAddressHashDict
+EMPTY_SLOT = 0
+FULL_SLOT = 1
+DELETED_SLOT = 2
+
+
+# An OpenAddressHashDict that keeps its slots in parallel arrays instead of a
+# list of entry objects: the keys, the values, the cached hash(key) of every
+# key, which like in OpenAddressHashDict may be any integer, and a byte per
+# slot for its state. With int_keys the keys are stored in a typed array of
+# machine integers. The probe compares the cached hashes
+# before the keys and the hash functions are called once per operation.
+# Collisions are resolved with plain linear probing and the table is always
+# rebuilt in one go.
+class ArrayOpenAddressHashDict(OpenAddressHashDict):
+
+    def __init__(self, bin_count=10, max_load=0.7, hashfunc=hash, verbose=True, int_keys=False):
+        super(ArrayOpenAddressHashDict, self).__init__(bin_count, max_load, hashfunc, verbose)
+        self.int_keys = int_keys
+        self.hash_table = None
+        self._allocate(self._bin_count)
+
+    # Creates empty arrays for 'bin_count' slots
+    def _allocate(self, bin_count):
+        if self.int_keys:
+            self._keys = array('l', [0]) * bin_count
+        else:
+            self._keys = [None] * bin_count
+        self._values = [None] * bin_count
+        self._hashes = [0] * bin_count
+        self._states = bytearray(bin_count)
+
+    # Will rebuild the hash table by doubling the number of bins
+    def rebuild(self, bincount):
+        """
+        >>> ohd = ArrayOpenAddressHashDict(verbose=False, int_keys=True)
+        >>> for key in range(8):
+        ...     ohd[key] = key * key
+        >>> ohd.bin_count, ohd[7], len(ohd)
+        (20, 49, 8)
+        """
+        keys, values, hashes, states = self._keys, self._values, self._hashes, self._states
+        self._bin_count *= 2
+        self._allocate(self.bin_count)
+        self._deleted = 0
+        for index in xrange(len(states)):
+            if states[index] == FULL_SLOT:
+                key_hash = hashes[index]
+                self._store(self._free_slot(key_hash), keys[index], values[index], key_hash)
+
+    # Will give the index of the slot holding 'key', or None. 'index' is the
+    # home slot of the key when it is already known.
+    def _find_index(self, key, key_hash, index=None):
+        bin_count = self._bin_count
+        keys, hashes, states = self._keys, self._hashes, self._states
+        if index is None:
+            index = self.hash_strategy.index(key_hash, bin_count)
+        while states[index] != EMPTY_SLOT:
+            if states[index] == FULL_SLOT and hashes[index] == key_hash:
+                cur_key = keys[index]
+                if(cur_key is key or cur_key == key):
+                    return index
+            index += 1
+            if index == bin_count:
+                index = 0
+        return None
+
+    # Will give the first empty or deleted slot on the probe sequence of a
+    # key with hash 'key_hash'
+    def _free_slot(self, key_hash, index=None):
+        bin_count = self._bin_count
+        states = self._states
+        if index is None:
+            index = self.hash_strategy.index(key_hash, bin_count)
+        while states[index] == FULL_SLOT:
+            index += 1
+            if index == bin_count:
+                index = 0
+        return index
+
+    # Fills slot 'index'
+    def _store(self, index, key, value, key_hash):
+        if self._states[index] == DELETED_SLOT:
+            self._deleted -= 1
+        self._keys[index] = key
+        self._values[index] = value
+        self._hashes[index] = key_hash
+        self._states[index] = FULL_SLOT
+
+    def _value_at(self, index):
+        return self._values[index]
+
+    def _upsert(self, key, value, key_hash, index=None):
+        found = self._find_index(key, key_hash, index)
+        if found is not None:
+            self._values[found] = value
+            return False
+        self._store(self._free_slot(key_hash, index), key, value, key_hash)
+        self._size += 1
+        return True
+
+    # Marks slot 'index' as deleted
+    def _delete_at(self, index):
+        self._states[index] = DELETED_SLOT
+        self._values[index] = None
+        if not self.int_keys:
+            self._keys[index] = None
+        self._size -= 1
+        self._deleted += 1
+
+    # Will get the value for the corresponding key
+    def __getitem__(self, key):
+        """
+        >>> ohd = ArrayOpenAddressHashDict()
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd.__getitem__(57)
+        'Supraj'
+        >>> ohd.__getitem__(58)
+        'Key 58 is not present in the table'
+        >>> ohd = ArrayOpenAddressHashDict(verbose=False, int_keys=True)
+        >>> ohd[57] = ['Supraj']
+        >>> ohd[57]
+        ['Supraj']
+        >>> ohd[58]
+        Traceback (most recent call last):
+        ...
+        KeyError: 58
+        """
+        index = self._find_index(key, self.hash_strategy.hash(key))
+        if index is None:
+            if not self.verbose:
+                raise KeyError(key)
+            return "Key " + str(key) + " is not present in the table"
+        if not self.verbose:
+            return self._values[index]
+        return str(self._values[index])
+
+    # Will insert the items in the Hash Table
+    def __setitem__(self, key, value):
+        """
+        >>> ohd = ArrayOpenAddressHashDict(verbose=False)
+        >>> ohd['Supraj'] = 57
+        >>> ohd['Supraj'] = 58
+        >>> ohd['Supraj'], len(ohd)
+        (58, 1)
+
+        The hash values do not have to fit a C long
+        >>> ohd = ArrayOpenAddressHashDict(hashfunc=FunctionHash(lambda key: key), verbose=False)
+        >>> for key in range(2 ** 70, 2 ** 70 + 20):
+        ...     ohd[key] = 'Big'
+        >>> ohd[2 ** 70 + 19], 2 ** 70 + 20 in ohd, len(ohd)
+        ('Big', False, 20)
+        """
+        if not self._upsert(key, value, self.hash_strategy.hash(key)):
+            return
+        if(self._size + self._deleted > self.max_load * self.bin_count):
+            self._resize()
+
+    # Will delete the item with 'key'
+    def __delitem__(self, key):
+        """
+        >>> ohd = ArrayOpenAddressHashDict(hashfunc=terrible_hash(10))
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd.__setitem__(58, 'Sri')
+        >>> ohd.__delitem__(57)
+        'Key 57 is successfully deleted'
+        >>> ohd.__delitem__(57)
+        'Key 57 is not present in the table'
+        >>> ohd.__getitem__(58)
+        'Sri'
+        """
+        index = self._find_index(key, self.hash_strategy.hash(key))
+        if index is None:
+            if not self.verbose:
+                raise KeyError(key)
+            return "Key " + str(key) + " is not present in the table"
+        self._delete_at(index)
+        if self.verbose:
+            return "Key " + str(key) + " is successfully deleted"
+
+    # Will check if the key is present in the Hash Table
+    def __contains__(self, key):
+        """
+        >>> ohd = ArrayOpenAddressHashDict()
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd.__contains__(57)
+        'Key 57 is present in the table with value Supraj'
+        >>> ohd.__contains__(58)
+        'Key 58 is not present in the table'
+        >>> ohd = ArrayOpenAddressHashDict(int_keys=True)
+        >>> ohd.__setitem__(57, 3249)
+        >>> ohd.__contains__(57)
+        'Key 57 is present in the table with value 3249'
+        """
+        index = self._find_index(key, self.hash_strategy.hash(key))
+        if not self.verbose:
+            return index is not None
+        if index is None:
+            return "Key " + str(key) + " is not present in the table"
+        return "Key " + str(key) + " is present in the table with value " + str(self._values[index])
+
+    # Will write a snapshot in the format of OpenAddressHashDict.save(), so
+    # either kind of table can load it
+    def save(self, file):
+        """
+        >>> from cStringIO import StringIO
+        >>> ohd = ArrayOpenAddressHashDict(verbose=False, int_keys=True)
+        >>> for key in range(10):
+        ...     ohd[key] = key * key
+        >>> snapshot = StringIO()
+        >>> ohd.save(snapshot)
+        >>> snapshot.seek(0)
+        >>> ohd = ArrayOpenAddressHashDict.load(snapshot)
+        >>> ohd.bin_count, len(ohd), ohd[7], ohd.int_keys
+        (20, 10, 49, True)
+        """
+        states = self._states
+        if not isinstance(states, bytearray):
+            states = bytearray(states[index] for index in xrange(self._bin_count))
+        keys, values, hashes = [], [], []
+        for index in xrange(self._bin_count):
+            if states[index] == FULL_SLOT:
+                keys.append(self._keys[index])
+                values.append(self._values[index])
+                hashes.append(self._hashes[index])
+        write_snapshot(file, SNAPSHOT_OPEN_ADDRESS, snapshot_flags(self.verbose, int_keys=self.int_keys),
+                       self.max_load, self._bin_count, self._size, self._deleted, -1, [states, keys, values, hashes])
+
+    # Will restore a table saved with save(), keeping the typed key array
+    # if the snapshot was saved with int_keys
+    @classmethod
+    def load(cls, file, hashfunc=hash):
+        flags, max_load, bin_count, size, deleted, setting, columns = read_snapshot(file, SNAPSHOT_OPEN_ADDRESS)
+        if flags & SNAPSHOT_MODE:
+            raise ValueError("A Robin Hood table can't be loaded as an ArrayOpenAddressHashDict")
+        table = cls(bin_count, max_load, hashfunc, bool(flags & SNAPSHOT_VERBOSE), bool(flags & SNAPSHOT_INT_KEYS))
+        check_snapshot_bins(table, bin_count)
+        table._restore_slots(deleted, *columns)
+        return table
+
+    # Fills the slots from the columns of a snapshot
+    def _restore_slots(self, deleted, states, keys, values, hashes):
+        entry = 0
+        for index in xrange(len(states)):
+            state = states[index]
+            if state == FULL_SLOT:
+                self._keys[index] = keys[entry]
+                self._values[index] = values[entry]
+                self._hashes[index] = hashes[entry]
+                entry += 1
+            if state != EMPTY_SLOT:
+                self._states[index] = state
+        self._size = entry
+        self._deleted = deleted
+
+    # Will return the largest distance of any key from its home slot
+    @property
+    def max_probe_length(self):
+        max_probe = 0
+        for index in xrange(self._bin_count):
+            if self._states[index] == FULL_SLOT:
+                home = self.hash_strategy.index(self._hashes[index], self._bin_count)
+                max_probe = max(max_probe, (index - home) % self._bin_count)
+        return max_probe
+
+    def _probe_lengths(self):
+        for index in xrange(self._bin_count):
+            if self._states[index] == FULL_SLOT:
+                home = self.hash_strategy.index(self._hashes[index], self._bin_count)
+                yield (index - home) % self._bin_count
+
+    # Will print all the values in the hash table
+    def display(self):
+        """
+        >>> ohd = ArrayOpenAddressHashDict(int_keys=True)
+        >>> ohd.__setitem__(57, 'Supraj')
+        >>> ohd.__setitem__(58, 'Sriram')
+        >>> ohd.__delitem__(58)
+        'Key 58 is successfully deleted'
+        >>> ohd.display()
+        0- None
+        1- None
+        2- None
+        3- None
+        4- None
+        5- None
+        6- None
+        7- {57: 'Supraj'}
+        8- {-1: 'DELETED'}
+        9- None
+        """
+        for index in xrange(self._bin_count):
+            print_string = str(index) + "- " + "None"
+            if self._states[index] == FULL_SLOT:
+                print_string = str(index) + "- " + repr({self._keys[index]: self._values[index]})
+            elif self._states[index] == DELETED_SLOT:
+                print_string = str(index) + "- " + repr(DELETED)
+            print print_string
+
+
+# Layout of the file of a MappedOpenAddressHashDict: a header holding a
+# magic string, the format version, the number of bins and the entry and
+# 'DELETED' counts, followed by one fixed-size record per slot holding the
+# slot state, the key, the cached hash of the key and the value
+MAPPED_MAGIC = 'OAHD'
+MAPPED_VERSION = 1
+MAPPED_HEADER = struct.Struct('<4sIqqq')
+MAPPED_HEADER_SIZE = 64
+MAPPED_RECORD_SIZE = 32
+MAPPED_STATE_OFFSET = 0
+MAPPED_KEY_OFFSET = 8
+MAPPED_HASH_OFFSET = 16
+MAPPED_VALUE_OFFSET = 24
+# A whole record, and its state, key and hash as read by a probe
+MAPPED_RECORD = struct.Struct('<B7xqqq')
+MAPPED_PROBE = struct.Struct('<B7xqq')
+
+
+# One field of every slot record of a mapped table, indexed by slot like
+# the arrays of an ArrayOpenAddressHashDict
+class MappedColumn(object):
+    __slots__ = ('buffer', 'offset', 'field', 'length')
+
+    def __init__(self, buffer, offset, format, length):
+        super(MappedColumn, self).__init__()
+        self.buffer = buffer
+        self.offset = MAPPED_HEADER_SIZE + offset
+        self.field = struct.Struct('<' + format)
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        return self.field.unpack_from(self.buffer, self.offset + index * MAPPED_RECORD_SIZE)[0]
+
+    def __setitem__(self, index, value):
+        self.field.pack_into(self.buffer, self.offset + index * MAPPED_RECORD_SIZE, value)
+
+
+# An ArrayOpenAddressHashDict whose slots live in a memory-mapped file at
+# 'path', with integer keys and integer values stored inline as 64 bit
+# fields. Opening an existing file only reads its header, the slots are
+# paged in by the OS as they are probed, and the table persists across
+# restarts. Growing the table rebuilds it into a new file that then replaces
+# the old one. A file must be reopened with the hash function it was built
+# with, and with hash() or a seeded strategy so the hashes match.
+class MappedOpenAddressHashDict(ArrayOpenAddressHashDict):
+
+    def __init__(self, path, bin_count=10, max_load=0.7, hashfunc=hash, verbose=True):
+        """
+        >>> import shutil, tempfile
+        >>> directory = tempfile.mkdtemp()
+        >>> path = os.path.join(directory, 'squares.oahd')
+        >>> ohd = MappedOpenAddressHashDict(path, verbose=False)
+        >>> for key in range(10):
+        ...     ohd[key] = key * key
+        >>> del ohd[3]
+        >>> ohd.close()
+        >>> ohd = MappedOpenAddressHashDict(path, verbose=False)
+        >>> ohd.bin_count, len(ohd), ohd[7], 3 in ohd
+        (20, 9, 49, False)
+        >>> ohd.close()
+        >>> ohd = MappedOpenAddressHashDict(path)
+        >>> ohd.__contains__(7)
+        'Key 7 is present in the table with value 49'
+        >>> ohd.close()
+        >>> shutil.rmtree(directory)
+        """
+        super(ArrayOpenAddressHashDict, self).__init__(bin_count, max_load, hashfunc, verbose)
+        self.int_keys = True
+        self.hash_table = None
+        self.path = path
+        self._map = None
+        self._file = None
+        if os.path.exists(path):
+            self._open()
+        else:
+            self._allocate(self._bin_count)
+            self._write_header()
+
+    # Maps the existing file at 'path' and reads the counts from its header
+    def _open(self):
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, version, bin_count, size, deleted = MAPPED_HEADER.unpack_from(self._map, 0)
+        if magic != MAPPED_MAGIC or version != MAPPED_VERSION:
+            self.close()
+            raise ValueError(self.path + " is not a version " + str(MAPPED_VERSION) + " mapped table")
+        self._bin_count, self._size, self._deleted = bin_count, size, deleted
+        self._map_columns(bin_count)
+
+    # Creates a file of empty slots for 'bin_count' bins and maps it. While
+    # a table is already mapped the new file is put next to it, to replace
+    # it when the rebuild is done.
+    def _allocate(self, bin_count):
+        path = self.path
+        if self._map is not None:
+            path += '.resize'
+        self._file = open(path, 'w+b')
+        # The file is extended without writing it, so its slots read as
+        # zero bytes, which is EMPTY_SLOT
+        self._file.truncate(MAPPED_HEADER_SIZE + bin_count * MAPPED_RECORD_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._map_columns(bin_count)
+
+    def _map_columns(self, bin_count):
+        self._states = MappedColumn(self._map, MAPPED_STATE_OFFSET, 'B', bin_count)
+        self._keys = MappedColumn(self._map, MAPPED_KEY_OFFSET, 'q', bin_count)
+        self._hashes = MappedColumn(self._map, MAPPED_HASH_OFFSET, 'q', bin_count)
+        self._values = MappedColumn(self._map, MAPPED_VALUE_OFFSET, 'q', bin_count)
+
+    # Will give the index of the slot holding 'key', or None. Each probe
+    # reads the state, key and hash of a slot in one go.
+    def _find_index(self, key, key_hash, index=None):
+        bin_count = self._bin_count
+        buffer, unpack_from = self._map, MAPPED_PROBE.unpack_from
+        if index is None:
+            index = self.hash_strategy.index(key_hash, bin_count)
+        while True:
+            state, cur_key, cur_hash = unpack_from(buffer, MAPPED_HEADER_SIZE + index * MAPPED_RECORD_SIZE)
+            if state == EMPTY_SLOT:
+                return None
+            if state == FULL_SLOT and cur_hash == key_hash and cur_key == key:
+                return index
+            index += 1
+            if index == bin_count:
+                index = 0
+
+    # Fills slot 'index' with one write of the whole record
+    def _store(self, index, key, value, key_hash):
+        if self._states[index] == DELETED_SLOT:
+            self._deleted -= 1
+        MAPPED_RECORD.pack_into(self._map, MAPPED_HEADER_SIZE + index * MAPPED_RECORD_SIZE,
+                                FULL_SLOT, key, key_hash, value)
+
+    def _write_header(self):
+        MAPPED_HEADER.pack_into(self._map, 0, MAPPED_MAGIC, MAPPED_VERSION, self._bin_count,
+                                self._size, self._deleted)
+
+    # Will rebuild the table into a new file with double the bins, which
+    # then replaces the old file
+    def rebuild(self, bincount):
+        """
+        >>> import shutil, tempfile
+        >>> directory = tempfile.mkdtemp()
+        >>> ohd = MappedOpenAddressHashDict(os.path.join(directory, 'table.oahd'), verbose=False)
+        >>> for key in range(1000):
+        ...     ohd[key] = -key
+        >>> ohd.bin_count, len(ohd), ohd[999], os.listdir(directory)
+        (2560, 1000, -999, ['table.oahd'])
+        >>> ohd.close()
+        >>> shutil.rmtree(directory)
+        """
+        old_map, old_file = self._map, self._file
+        super(MappedOpenAddressHashDict, self).rebuild(bincount)
+        old_map.close()
+        old_file.close()
+        os.rename(self.path + '.resize', self.path)
+        self._write_header()
+
+    def _upsert(self, key, value, key_hash, index=None):
+        added = super(MappedOpenAddressHashDict, self)._upsert(key, value, key_hash, index)
+        if added:
+            self._write_header()
+        return added
+
+    # Marks slot 'index' as deleted, the key and value are left in place
+    def _delete_at(self, index):
+        self._states[index] = DELETED_SLOT
+        self._size -= 1
+        self._deleted += 1
+        self._write_header()
+
+    # Will write the entries of a snapshot saved by one of the open
+    # addressing tables into a new mapped table at 'path'
+    @classmethod
+    def load(cls, file, path, hashfunc=hash):
+        """
+        >>> import shutil, tempfile
+        >>> from cStringIO import StringIO
+        >>> ohd = OpenAddressHashDict(verbose=False)
+        >>> ohd.set_many(range(10), range(10))
+        >>> snapshot = StringIO()
+        >>> ohd.save(snapshot)
+        >>> snapshot.seek(0)
+        >>> directory = tempfile.mkdtemp()
+        >>> ohd = MappedOpenAddressHashDict.load(snapshot, os.path.join(directory, 'table.oahd'))
+        >>> ohd.bin_count, len(ohd), ohd[7]
+        (20, 10, 7)
+        >>> ohd.close()
+        >>> shutil.rmtree(directory)
+        """
+        if os.path.exists(path):
+            raise ValueError(path + " already exists")
+        flags, max_load, bin_count, size, deleted, setting, columns = read_snapshot(file, SNAPSHOT_OPEN_ADDRESS)
+        if flags & SNAPSHOT_MODE:
+            raise ValueError("A Robin Hood table can't be loaded as a MappedOpenAddressHashDict")
+        table = cls(path, bin_count, max_load, hashfunc, bool(flags & SNAPSHOT_VERBOSE))
+        try:
+            check_snapshot_bins(table, bin_count)
+            table._restore_slots(deleted, *columns)
+        except ValueError:
+            table.close()
+            os.remove(path)
+            raise
+        table._write_header()
+        return table
+
+    # Writes the changed pages back to the file
+    def flush(self):
+        self._map.flush()
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._file.close()
+            self._map = None
+            self._file = None
+
+
+# Rebuilds tried with new hash functions before keys are left in the stash
+# past its size
+CUCKOO_REHASHES = 3
+CUCKOO_MASK = 2 ** 64 - 1
+
+
+# A cuckoo hash table. Every key has one candidate bucket of 'bucket_size'
+# slots per hash function, 'ways' functions in all, and is always stored in
+# one of them or in a small stash, so a lookup looks at no more than
+# ways * bucket_size slots and the stash. An insert that finds its buckets
+# full evicts a random key of one of them, which moves to one of its own
+# other buckets, up to 'max_kicks' times; a key still homeless then goes to
+# the stash, and when the stash is full the table is rebuilt with new hash
+# functions, or with more slots if that does not help. The functions
+# multiply hash(key) by random odd 64 bit numbers chosen from 'seed', the
+# index of the hash strategy is not used. Only keys whose hash(key) values
+# are equal can defeat every set of functions: the keys of one hash value
+# beyond the slots of its buckets are kept in the stash past its size, and
+# only the rest of the stash counts towards it.
+class CuckooHashDict(object):
+
+    def __init__(self, bin_count=10, max_load=0.9, hashfunc=hash, verbose=True, ways=2, bucket_size=4,
+                 stash_size=4, max_kicks=100, seed=None):
+        super(CuckooHashDict, self).__init__()
+        self.hash_strategy = as_hash_strategy(hashfunc)
+        self.max_load = max_load
+        self.verbose = verbose
+        self.ways = ways
+        self.bucket_size = bucket_size
+        self.stash_size = stash_size
+        self.max_kicks = max_kicks
+        self._random = random.Random(seed)
+        self._size = 0
+        # Entries that found no slot, as DictionaryNodes
+        self._stash = []
+        self.rebuilds = 0
+        self.rebuild_seconds = 0.0
+        self.metrics = None
+        self._allocate(bin_count)
+
+    # Creates empty slots for at least 'bin_count' keys and new hash functions
+    def _allocate(self, bin_count):
+        self._buckets = max(1, -(-bin_count // self.bucket_size))
+        self._bin_count = self._buckets * self.bucket_size
+        self._keys = [None] * self._bin_count
+        self._values = [None] * self._bin_count
+        self._hashes = [0] * self._bin_count
+        self._states = bytearray(self._bin_count)
+        self._multipliers = [self._random.getrandbits(64) | 1 for way in xrange(self.ways)]
+
+    @classmethod
+    def from_items(cls, items, expected_size=None, **kwargs):
+        """
+        >>> chd = CuckooHashDict.from_items([(key, key * key) for key in range(100)], verbose=False, seed=1)
+        >>> chd.bin_count, len(chd), chd[9], chd.rebuilds
+        (112, 100, 81, 0)
+        """
+        if expected_size is None:
+            items = list(items)
+            expected_size = len(items)
+        kwargs.setdefault('max_load', 0.9)
+        table = cls(bin_count=_presized_bin_count(expected_size, kwargs), **kwargs)
+        for key, value in items:
+            table[key] = value
+        return table
+
+    @property
+    def load_factor(self):
+        """
+        >>> chd = CuckooHashDict(bin_count=8)
+        >>> chd.__setitem__(57, 'Supraj')
+        >>> chd.load_factor
+        0.125
+        """
+        return float(self._size) / float(self._bin_count)
+
+    # Will return the number of slots
+    @property
+    def bin_count(self):
+        """
+        >>> CuckooHashDict().bin_count
+        12
+        """
+        return self._bin_count
+
+    # Will return the most slots and stash entries a lookup looks at
+    @property
+    def max_probe_length(self):
+        return self.ways * self.bucket_size + len(self._stash)
+
+    # Will give the first slot of the bucket of 'key_hash' for the hash
+    # function with 'multiplier'
+    def _bucket(self, key_hash, multiplier):
+        return ((((key_hash * multiplier) & CUCKOO_MASK) >> 32) % self._buckets) * self.bucket_size
+
+    # Will give the slot holding 'key', or -1
+    def _find_slot(self, key, key_hash):
+        keys, hashes, states = self._keys, self._hashes, self._states
+        bucket_size, buckets = self.bucket_size, self._buckets
+        for multiplier in self._multipliers:
+            start = ((((key_hash * multiplier) & CUCKOO_MASK) >> 32) % buckets) * bucket_size
+            for slot in xrange(start, start + bucket_size):
+                if states[slot] == FULL_SLOT and hashes[slot] == key_hash:
+                    cur_key = keys[slot]
+                    if cur_key is key or cur_key == key:
+                        return slot
+        return -1
+
+    # Will give how many stashed entries other hash functions could place:
+    # the stash less, for each hash value in it, the keys with that value
+    # beyond the slots of its buckets. Buckets that the functions give a
+    # hash value more than once (all of them for 0) count once.
+    def _separable_stash(self):
+        stashed = {}
+        for entry in self._stash:
+            stashed[entry.key_hash] = stashed.get(entry.key_hash, 0) + 1
+        separable = len(self._stash)
+        hashes, states = self._hashes, self._states
+        for key_hash, count in stashed.iteritems():
+            starts = set(self._bucket(key_hash, multiplier) for multiplier in self._multipliers)
+            placed = 0
+            for start in starts:
+                for slot in xrange(start, start + self.bucket_size):
+                    if states[slot] == FULL_SLOT and hashes[slot] == key_hash:
+                        placed += 1
+            separable -= max(0, count + placed - len(starts) * self.bucket_size)
+        return separable
+
+    # Will give the stash entry holding 'key', or None
+    def _find_stashed(self, key, key_hash):
+        for entry in self._stash:
+            if entry.key_hash == key_hash and (entry.key is key or entry.key == key):
+                return entry
+        return None
+
+    # Stores a new entry in a free slot of its buckets, evicting other keys
+    # when they are full. Gives the entry that was left without a slot as a
+    # DictionaryNode, or None.
+    def _place(self, key, value, key_hash):
+        keys, values, hashes, states = self._keys, self._values, self._hashes, self._states
+        bucket_size = self.bucket_size
+        for kick in xrange(self.max_kicks):
+            starts = [self._bucket(key_hash, multiplier) for multiplier in self._multipliers]
+            for start in starts:
+                for slot in xrange(start, start + bucket_size):
+                    if states[slot] != FULL_SLOT:
+                        keys[slot], values[slot], hashes[slot] = key, value, key_hash
+                        states[slot] = FULL_SLOT
+                        return None
+            slot = self._random.choice(starts) + self._random.randrange(bucket_size)
+            key, keys[slot] = keys[slot], key
+            value, values[slot] = values[slot], value
+            key_hash, hashes[slot] = hashes[slot], key_hash
+        return DictionaryNode(key, value, key_hash)
+
+    # Will give every entry as (key, value, key_hash)
+    def _entries(self):
+        entries = [(self._keys[slot], self._values[slot], self._hashes[slot])
+                   for slot in xrange(self._bin_count) if self._states[slot] == FULL_SLOT]
+        entries.extend((entry.key, entry.value, entry.key_hash) for entry in self._stash)
+        return entries
+
+    # Places every entry again in a table of 'bin_count' slots, choosing new
+    # hash functions until the separable part of the stash is within its
+    # size. When that fails
+    # CUCKOO_REHASHES times the table is too full for its buckets and is
+    # tried again with twice the slots.
+    def _rehash(self, bin_count):
+        start = time.time()
+        entries = self._entries()
+        attempts = 2 * CUCKOO_REHASHES
+        for attempt in xrange(attempts):
+            if attempt == CUCKOO_REHASHES:
+                bin_count *= 2
+            self._allocate(bin_count)
+            self._stash = []
+            for key, value, key_hash in entries:
+                entry = self._place(key, value, key_hash)
+                if entry is not None:
+                    self._stash.append(entry)
+                    if(attempt < attempts - 1 and len(self._stash) > self.stash_size and
+                       self._separable_stash() > self.stash_size):
+                        break
+            if len(self._stash) <= self.stash_size or self._separable_stash() <= self.stash_size:
+                break
+        record_rebuild(self, start)
+
+    # Will rebuild the hash table by doubling the number of slots
+    def rebuild(self, bincount):
+        self._rehash(self._bin_count * 2)
+
+    # Will get the value for the corresponding key
+    def __getitem__(self, key):
+        """
+        >>> chd = CuckooHashDict()
+        >>> chd.__setitem__(57, 'Supraj')
+        >>> chd.__getitem__(57)
+        'Supraj'
+        >>> chd.__getitem__(58)
+        'Key 58 is not present in the table'
+        >>> chd = CuckooHashDict(verbose=False)
+        >>> chd[57] = ['Supraj']
+        >>> chd[57]
+        ['Supraj']
+        >>> chd[58]
+        Traceback (most recent call last):
+        ...
+        KeyError: 58
+        """
+        key_hash = self.hash_strategy.hash(key)
+        slot = self._find_slot(key, key_hash)
+        if slot >= 0:
+            value = self._values[slot]
+        else:
+            entry = self._find_stashed(key, key_hash) if self._stash else None
+            if entry is None:
+                if not self.verbose:
+                    raise KeyError(key)
+                return "Key " + str(key) + " is not present in the table"
+            value = entry.value
+        if not self.verbose:
+            return value
+        return str(value)
+
+    # Will insert the items in the Hash Table
+    def __setitem__(self, key, value):
+        """
+        >>> chd = CuckooHashDict(verbose=False, seed=1)
+        >>> for key in range(1000):
+        ...     chd[key] = -key
+        >>> chd[999], len(chd), chd.load_factor > 0.45, chd.max_probe_length <= 12
+        (-999, 1000, True, True)
+
+        Keys with equal hashes can only share the buckets and the stash of
+        one key, beyond that the stash grows
+        >>> chd = CuckooHashDict(hashfunc=FunctionHash(lambda key: 0), verbose=False)
+        >>> for key in range(20):
+        ...     chd[key] = key
+        >>> chd[19], len(chd), len(chd._stash) >= 20 - chd.ways * chd.bucket_size
+        (19, 20, True)
+
+        Next to them the other keys still fill no more of the stash than
+        its size: the 20 keys of hash value 0 share one bucket of one slot
+        >>> chd = CuckooHashDict(hashfunc=FunctionHash(lambda key: 0 if key < 20 else hash(key)),
+        ...                      verbose=False, bucket_size=1, seed=1)
+        >>> longest = 0
+        >>> for key in range(20) + range(1000, 3000):
+        ...     chd[key] = key
+        ...     longest = max(longest, len(chd._stash))
+        >>> longest <= 19 + chd.stash_size, len(chd)
+        (True, 2020)
+        """
+        key_hash = self.hash_strategy.hash(key)
+        slot = self._find_slot(key, key_hash)
+        if slot >= 0:
+            self._values[slot] = value
+            return
+        if self._stash:
+            entry = self._find_stashed(key, key_hash)
+            if entry is not None:
+                entry.value = value
+                return
+        entry = self._place(key, value, key_hash)
+        self._size += 1
+        if entry is not None:
+            self._stash.append(entry)
+            if len(self._stash) > self.stash_size and self._separable_stash() > self.stash_size:
+                self._rehash(self._bin_count)
+        if(self.load_factor > self.max_load):
+            self._resize()
+
+    def _resize(self):
+        self.rebuild(self._bin_count)
+
+    # Will delete the item with 'key'
+    def __delitem__(self, key):
+        """
+        >>> chd = CuckooHashDict()
+        >>> chd.__setitem__(57, 'Supraj')
+        >>> chd.__delitem__(57)
+        'Key 57 is successfully deleted'
+        >>> chd.__delitem__(57)
+        'Key 57 is not present in the table'
+        """
+        key_hash = self.hash_strategy.hash(key)
+        slot = self._find_slot(key, key_hash)
+        if slot >= 0:
+            self._keys[slot] = self._values[slot] = None
+            self._states[slot] = EMPTY_SLOT
+        else:
+            entry = self._find_stashed(key, key_hash) if self._stash else None
+            if entry is None:
+                if not self.verbose:
+                    raise KeyError(key)
+                return "Key " + str(key) + " is not present in the table"
+            self._stash.remove(entry)
+        self._size -= 1
+        if self.verbose:
+            return "Key " + str(key) + " is successfully deleted"
+
+    # Will check if the key is present in the Hash Table
+    def __contains__(self, key):
+        """
+        >>> chd = CuckooHashDict()
+        >>> chd.__setitem__(57, 'Supraj')
+        >>> chd.__contains__(57)
+        'Key 57 is present in the table with value Supraj'
+        >>> chd.__contains__(58)
+        'Key 58 is not present in the table'
+        """
+        key_hash = self.hash_strategy.hash(key)
+        slot = self._find_slot(key, key_hash)
+        if slot >= 0:
+            value = self._values[slot]
+        else:
+            entry = self._find_stashed(key, key_hash) if self._stash else None
+            if entry is None:
+                if not self.verbose:
+                    return False
+                return "Key " + str(key) + " is not present in the table"
+            value = entry.value
+        if not self.verbose:
+            return True
+        return "Key " + str(key) + " is present in the table with value " + str(value)
+
+    # Will give the number of elements in the table
+    def __len__(self):
+        return self._size
+
+    # Will give the health of the table like OpenAddressHashDict.stats():
+    # how many keys sit in the bucket of each hash function and in the stash
+    def stats(self, sink=None):
+        """
+        >>> chd = CuckooHashDict(bin_count=100, verbose=False, seed=1)
+        >>> for key in range(50):
+        ...     chd[key] = key
+        >>> stats = chd.stats()
+        >>> sum(stats['ways'].values()), stats['stash'], stats['max_probe_length']
+        (50, 0, 8)
+        """
+        ways = dict((way, 0) for way in xrange(self.ways))
+        for slot in xrange(self._bin_count):
+            if self._states[slot] == FULL_SLOT:
+                key_hash = self._hashes[slot]
+                start = slot - slot % self.bucket_size
+                for way in xrange(self.ways):
+                    if self._bucket(key_hash, self._multipliers[way]) == start:
+                        ways[way] += 1
+                        break
+        stats = {
+            'size': self._size,
+            'bin_count': self._bin_count,
+            'load_factor': self.load_factor,
+            'ways': ways,
+            'stash': len(self._stash),
+            'max_probe_length': self.max_probe_length,
+            'rebuilds': self.rebuilds,
+            'rebuild_seconds': self.rebuild_seconds,
+        }
+        if sink is None:
+            sink = self.metrics
+        if sink is not None:
+            export_stats(stats, sink, type(self).__name__)
+        return stats
 
-    # Will print all the values in the hash table
+    # Will print the buckets, then the stash
     def display(self):
         """
-        >>> ohd= OpenAddressHashDict()
-        >>> ohd.__setitem__(57, 'Supraj')
-        >>> ohd.__setitem__(58, 'Sriram')
-        >>> ohd.display()
-        0- None
-        1- None
-        2- None
-        3- None
-        4- None
-        5- None
-        6- None
-        7- {57: 'Supraj'}
-        8- {58: 'Sriram'}
-        9- None
+        >>> chd = CuckooHashDict(bin_count=4, bucket_size=2, seed=1)
+        >>> chd.__setitem__(57, 'Supraj')
+        >>> chd.display()
+        0- [None, None]
+        1- [{57: 'Supraj'}, None]
+        Stash: []
         """
-        i = 0
-        for value in self.hash_table:
-            print_string = str(i) + "- " + "None"
-            if(value is not None):
-                print_string = str(i) + "- " + str(value)
-            i += 1
-            print print_string
+        for bucket in xrange(self._buckets):
+            items = []
+            for slot in xrange(bucket * self.bucket_size, (bucket + 1) * self.bucket_size):
+                if self._states[slot] == FULL_SLOT:
+                    items.append({self._keys[slot]: self._values[slot]})
+                else:
+                    items.append(None)
+            print str(bucket) + "- " + repr(items)
+        print "Stash: " + repr(self._stash)
 
 
 class BinaryTreeNode(object):
-    def __init__(self, data=None, left=None, right=None, parent=None):
+    __slots__ = ('key', 'value', 'left', 'right', 'parent', 'height', 'size')
+
+    def __init__(self, key=None, value=None, left=None, right=None, parent=None):
         super(BinaryTreeNode, self).__init__()
-        self.data = data
+        self.key = key
+        self.value = value
         self.left = left
         self.right = right
         self.parent = parent
+        # Height of the subtree under the node, kept up to date by the
+        # balanced (AVL) mode of BinarySearchTreeDict
+        self.height = 0
+        # Number of nodes in the subtree under the node
+        self.size = 1
+
+    # The node's entry as a {key: value} dictionary
+    @property
+    def data(self):
+        """
+        >>> BinaryTreeNode(57, 'Supraj').data
+        {57: 'Supraj'}
+        """
+        return {self.key: self.value}
+
+    def __repr__(self):
+        return repr(self.data)
 
 
 class BinarySearchTreeDict(object):
 
-    def __init__(self):
+    def __init__(self, verbose=True, balanced=False):
         super(BinarySearchTreeDict, self).__init__()
         self.root = None
+        self._size = 0
+        # When verbose is False lookups return the stored value, misses
+        # raise KeyError and no status strings are built
+        self.verbose = verbose
+        # When balanced is set the tree is kept as an AVL tree: after every
+        # insert and delete the nodes on the path to the root are rotated so
+        # that the heights of their subtrees differ by at most one
+        self.balanced = balanced
+        # A sink(name, value) callable stats() also exports to when set
+        self.metrics = None
+
+    # Will build a perfectly balanced tree from (key, value) pairs in O(N)
+    # when they are sorted by key, sorting them first otherwise. When a key
+    # is given more than once its last value is kept. 'expected_size' is
+    # accepted to match the hash tables, a tree has nothing to presize.
+    @classmethod
+    def from_items(cls, items, expected_size=None, **kwargs):
+        """
+        >>> bst = BinarySearchTreeDict.from_items([(key, str(key)) for key in range(7)])
+        >>> bst.preorder_keys()
+        Pre order tree traversal:3->1->0->2->5->4->6
+        >>> bst = BinarySearchTreeDict.from_items([(58, 'Sri'), (46, 'Rathna'), (58, 'Sriram')])
+        >>> bst.items()
+        Items:{46: 'Rathna'}->{58: 'Sriram'}
+        >>> len(bst), bst.height
+        (2, 1)
+        """
+        items = sorted_unique_items(items)
+        tree = cls(**kwargs)
+        tree.root = tree_build(items, 0, len(items))
+        tree._size = len(items)
+        return tree
 
     # Gives the height of the tree
     @property
@@ -547,6 +4337,8 @@ class BinarySearchTreeDict(object):
         >>> print bst.height
         1
         """
+        if self.balanced:
+            return node_height(self.root)
         return tree_height(self.root)
 
     def inorder_keys(self):
@@ -558,7 +4350,7 @@ class BinarySearchTreeDict(object):
         >>> bst.inorder_keys()
         In order tree traversal:46->57->58
         """
-        print "In order tree traversal:" + "->".join([str(item.keys()[0]) for item in self.tree_in_order(self.root)])
+        print "In order tree traversal:" + "->".join([str(node.key) for node in self.tree_in_order(self.root)])
 
     def postorder_keys(self):
         """
@@ -603,12 +4395,23 @@ class BinarySearchTreeDict(object):
         'Supraj'
         >>> bst.__getitem__(58)
         'No item with key 58 in the tree'
+        >>> bst = BinarySearchTreeDict(verbose=False)
+        >>> bst[57] = ['Supraj']
+        >>> bst[57]
+        ['Supraj']
+        >>> bst[58]
+        Traceback (most recent call last):
+        ...
+        KeyError: 58
         """
-        return_string = "No item with key " + str(key) + " in the tree"
         cur_node = tree_search(self.root, key)
-        if (cur_node is not None):
-            return_string = str(cur_node.data.get(cur_node.data.keys()[0]))
-        return return_string
+        if (cur_node is None):
+            if not self.verbose:
+                raise KeyError(key)
+            return "No item with key " + str(key) + " in the tree"
+        if not self.verbose:
+            return cur_node.value
+        return str(cur_node.value)
 
     # Adding the element in the tree
     def __setitem__(self, key, value):
@@ -616,13 +4419,23 @@ class BinarySearchTreeDict(object):
         >>> bst = BinarySearchTreeDict()
         >>> bst.__setitem__(57, 'Supraj')
 
+        Keys inserted in order still give a tree of logarithmic height
+        >>> bst = BinarySearchTreeDict(balanced=True)
+        >>> for key in range(7):
+        ...     bst[key] = str(key)
+        >>> bst.preorder_keys()
+        Pre order tree traversal:3->1->0->2->5->4->6
+        >>> bst.height
+        2
         """
-        cur_data = {key: value}
-        cur_node = BinaryTreeNode(data=cur_data)
+        cur_node = BinaryTreeNode(key, value)
         if (self.root is None):
             self.root = cur_node
         else:
             tree_insert(self.root, cur_node)
+            if self.balanced:
+                tree_rebalance(self, cur_node.parent)
+        self._size += 1
 
     # Deleting the element from the tree
     def __delitem__(self, key):
@@ -633,25 +4446,62 @@ class BinarySearchTreeDict(object):
         'Item 57 deleted successfully'
         >>> bst.__delitem__(57)
         'No item with key 57 in the tree'
+        >>> bst = BinarySearchTreeDict(verbose=False)
+        >>> bst[57] = 'Supraj'
+        >>> del bst[57]
+        >>> del bst[57]
+        Traceback (most recent call last):
+        ...
+        KeyError: 57
+
+        >>> bst = BinarySearchTreeDict(verbose=False, balanced=True)
+        >>> for key in range(7):
+        ...     bst[key] = str(key)
+        >>> del bst[0]
+        >>> del bst[2]
+        >>> bst.preorder_keys()
+        Pre order tree traversal:3->1->5->4->6
+        >>> del bst[1]
+        >>> bst.preorder_keys()
+        Pre order tree traversal:5->3->4->6
+        >>> del bst[6]
+        >>> bst.preorder_keys()
+        Pre order tree traversal:4->3->5
         """
-        return_string = "No item with key " + str(key) + " in the tree"
         cur_node = tree_search(self.root, key)
-        if(cur_node is not None):
-            if(cur_node.left is None):
-                transplant(self, cur_node, cur_node.right)
-            elif(cur_node.right is None):
-                transplant(self, cur_node, cur_node.left)
-            else:
-                successor_node = tree_minimum(cur_node.right)
-                if(successor_node.parent.data.keys()[0] is not cur_node.data.keys()[0]):
-                    transplant(self, successor_node, successor_node.right)
-                    successor_node.right = cur_node.right
-                    successor_node.right.parent = successor_node
-                transplant(self, cur_node, successor_node)
-                successor_node.left = cur_node.left
-                successor_node.left.parent = successor_node
-            return_string = "Item " + str(key) + " deleted successfully"
-        return return_string
+        if(cur_node is None):
+            if not self.verbose:
+                raise KeyError(key)
+            return "No item with key " + str(key) + " in the tree"
+        # Lowest node whose subtree lost a node, where rebalancing starts
+        changed_node = cur_node.parent
+        if(cur_node.left is None):
+            transplant(self, cur_node, cur_node.right)
+        elif(cur_node.right is None):
+            transplant(self, cur_node, cur_node.left)
+        else:
+            successor_node = tree_minimum(cur_node.right)
+            changed_node = successor_node
+            if(successor_node.parent is not cur_node):
+                changed_node = successor_node.parent
+                transplant(self, successor_node, successor_node.right)
+                successor_node.right = cur_node.right
+                successor_node.right.parent = successor_node
+            transplant(self, cur_node, successor_node)
+            successor_node.left = cur_node.left
+            successor_node.left.parent = successor_node
+            successor_node.height = cur_node.height
+            successor_node.size = cur_node.size
+        # Every node from changed_node up to the root lost one node
+        ancestor = changed_node
+        while(ancestor is not None):
+            ancestor.size -= 1
+            ancestor = ancestor.parent
+        if self.balanced:
+            tree_rebalance(self, changed_node)
+        self._size -= 1
+        if self.verbose:
+            return "Item " + str(key) + " deleted successfully"
 
     # Checks if an element with 'key' is present in the tree
     def __contains__(self, key):
@@ -662,12 +4512,17 @@ class BinarySearchTreeDict(object):
         'Item with key 57 is found and its value is Supraj'
         >>> bst.__contains__(58)
         'No item with key 58 in the tree'
+        >>> bst = BinarySearchTreeDict(verbose=False)
+        >>> bst[57] = 'Supraj'
+        >>> 57 in bst, 58 in bst
+        (True, False)
         """
-        return_string = "No item with key " + str(key) + " in the tree"
         cur_node = tree_search(self.root, key)
-        if (cur_node is not None):
-            return_string = "Item with key " + str(key) + " is found and its value is " + str(cur_node.data.get(cur_node.data.keys()[0]))
-        return return_string
+        if not self.verbose:
+            return cur_node is not None
+        if (cur_node is None):
+            return "No item with key " + str(key) + " in the tree"
+        return "Item with key " + str(key) + " is found and its value is " + str(cur_node.value)
 
     # Gives the number of elements in the tree
     def __len__(self):
@@ -679,7 +4534,201 @@ class BinarySearchTreeDict(object):
         >>> bst.__len__()
         3
         """
-        return tree_length(self.root)
+        return self._size
+
+    # Gives the number of keys smaller than 'key'
+    def rank(self, key):
+        """
+        >>> bst = BinarySearchTreeDict.from_items([(key, str(key)) for key in range(0, 100, 10)])
+        >>> bst.rank(30), bst.rank(35), bst.rank(-5), bst.rank(500)
+        (3, 4, 0, 10)
+        """
+        return tree_rank(self.root, key)
+
+    # Gives the key with 'index' smaller keys, counting from the end of the
+    # tree for a negative index like a list does
+    def select(self, index):
+        """
+        >>> bst = BinarySearchTreeDict(balanced=True)
+        >>> for key in [57, 58, 46, 12, 99]:
+        ...     bst[key] = str(key)
+        >>> bst.select(0), bst.select(2), bst.select(-1)
+        (12, 57, 99)
+        >>> bst.select(5)
+        Traceback (most recent call last):
+        ...
+        IndexError: Index 5 is out of range for a tree of 5 keys
+        """
+        if(index < 0):
+            index += self._size
+        cur_node = None
+        if(index >= 0):
+            cur_node = tree_select(self.root, index)
+        if(cur_node is None):
+            raise IndexError("Index " + str(index) + " is out of range for a tree of " + str(self._size) + " keys")
+        return cur_node.key
+
+    # Gives the number of keys with low <= key < high
+    def count_range(self, low, high):
+        """
+        >>> bst = BinarySearchTreeDict.from_items([(key, str(key)) for key in range(0, 100, 10)])
+        >>> bst.count_range(25, 60), bst.count_range(60, 25)
+        (3, 0)
+        """
+        return max(0, tree_rank(self.root, high) - tree_rank(self.root, low))
+
+    # Yields the (key, value) pairs with low <= key < high in key order,
+    # visiting only the nodes on the way to 'low' and the ones in range. A
+    # bound of None leaves that side open.
+    def range_items(self, low=None, high=None):
+        """
+        >>> bst = BinarySearchTreeDict.from_items([(key, str(key)) for key in range(0, 100, 10)])
+        >>> list(bst.range_items(25, 60))
+        [(30, '30'), (40, '40'), (50, '50')]
+        >>> list(bst.range_items(high=10)), list(bst.range_items(85))
+        ([(0, '0')], [(90, '90')])
+        """
+        if(self.root is None):
+            return
+        if(low is None):
+            cur_node = tree_minimum(self.root)
+        else:
+            cur_node = tree_ceiling(self.root, low)
+        while(cur_node is not None and (high is None or cur_node.key < high)):
+            yield cur_node.key, cur_node.value
+            cur_node = tree_successor(cur_node)
+
+    # Gives the largest key that is at most 'key', or None
+    def floor(self, key):
+        """
+        >>> bst = BinarySearchTreeDict.from_items([(key, str(key)) for key in range(0, 100, 10)])
+        >>> bst.floor(35), bst.floor(30), bst.floor(-1)
+        (30, 30, None)
+        """
+        cur_node = tree_floor(self.root, key)
+        if(cur_node is None):
+            return None
+        return cur_node.key
+
+    # Gives the smallest key that is at least 'key', or None
+    def ceiling(self, key):
+        """
+        >>> bst = BinarySearchTreeDict.from_items([(key, str(key)) for key in range(0, 100, 10)])
+        >>> bst.ceiling(35), bst.ceiling(30), bst.ceiling(91)
+        (40, 30, None)
+        """
+        cur_node = tree_ceiling(self.root, key)
+        if(cur_node is None):
+            return None
+        return cur_node.key
+
+    # Will write a snapshot of the tree to 'file', a path or a file opened
+    # for writing: the keys and values in pre-order, with a byte per node
+    # telling which children it has, so the shape of the tree is kept
+    def save(self, file):
+        """
+        >>> from cStringIO import StringIO
+        >>> bst = BinarySearchTreeDict(balanced=True)
+        >>> for key in [57, 58, 46, 12]:
+        ...     bst[key] = str(key)
+        >>> snapshot = StringIO()
+        >>> bst.save(snapshot)
+        >>> snapshot.seek(0)
+        >>> bst = BinarySearchTreeDict.load(snapshot)
+        >>> bst.preorder_keys()
+        Pre order tree traversal:57->46->12->58
+        >>> bst.balanced, bst.height, bst.root.size, bst.rank(57)
+        (True, 2, 4, 2)
+        """
+        shape = bytearray()
+        keys, values = [], []
+        stack = []
+        if(self.root is not None):
+            stack.append(self.root)
+        while stack:
+            cur_node = stack.pop()
+            shape.append((cur_node.left is not None) | (cur_node.right is not None) << 1)
+            keys.append(cur_node.key)
+            values.append(cur_node.value)
+            if(cur_node.right is not None):
+                stack.append(cur_node.right)
+            if(cur_node.left is not None):
+                stack.append(cur_node.left)
+        write_snapshot(file, SNAPSHOT_TREE, snapshot_flags(self.verbose, self.balanced), 0.0, 0, self._size, 0,
+                       -1, [shape, keys, values])
+
+    # Will restore a tree saved with save() in the same shape, without
+    # comparing any keys or rotating any nodes
+    @classmethod
+    def load(cls, file):
+        flags, max_load, shape_count, size, deleted, setting, columns = read_snapshot(file, SNAPSHOT_TREE)
+        shape, keys, values = columns
+        tree = cls(bool(flags & SNAPSHOT_VERBOSE), bool(flags & SNAPSHOT_MODE))
+        nodes = [BinaryTreeNode(keys[index], values[index]) for index in xrange(len(shape))]
+        # Nodes still waiting for a left (True) or right (False) child
+        stack = []
+        for index in xrange(len(nodes)):
+            cur_node = nodes[index]
+            if stack:
+                parent, is_left = stack.pop()
+                cur_node.parent = parent
+                if is_left:
+                    parent.left = cur_node
+                else:
+                    parent.right = cur_node
+            if shape[index] & 2:
+                stack.append((cur_node, False))
+            if shape[index] & 1:
+                stack.append((cur_node, True))
+        # Children come after their parent in pre-order, so going backwards
+        # every subtree is complete when its root is reached
+        for cur_node in reversed(nodes):
+            update_height(cur_node)
+            cur_node.size = tree_size(cur_node.left) + tree_size(cur_node.right) + 1
+        if nodes:
+            tree.root = nodes[0]
+        tree._size = size
+        return tree
+
+    # Will give the shape of the tree: its height next to the height of a
+    # perfectly balanced tree with as many nodes, and how many nodes sit at
+    # each depth. The numbers are also exported with export_stats() to
+    # 'sink', or to the metrics sink of the tree when it is set.
+    def stats(self, sink=None):
+        """
+        >>> bst = BinarySearchTreeDict()
+        >>> for key in [1, 2, 3, 4]:
+        ...     bst.__setitem__(key, str(key))
+        >>> stats = bst.stats()
+        >>> stats['height'], stats['optimal_height'], stats['depths'], stats['mean_depth']
+        (3, 2, {0: 1, 1: 1, 2: 1, 3: 1}, 1.5)
+        >>> BinarySearchTreeDict.from_items((key, key) for key in range(4)).stats()['height']
+        2
+        """
+        depths = {}
+        stack = []
+        if(self.root is not None):
+            stack.append((self.root, 0))
+        while stack:
+            cur_node, depth = stack.pop()
+            depths[depth] = depths.get(depth, 0) + 1
+            if(cur_node.right is not None):
+                stack.append((cur_node.right, depth + 1))
+            if(cur_node.left is not None):
+                stack.append((cur_node.left, depth + 1))
+        size = sum(depths.itervalues())
+        stats = {
+            'size': self._size,
+            'height': max(depths) if depths else -1,
+            'optimal_height': size.bit_length() - 1,
+            'depths': depths,
+            'mean_depth': float(sum(depth * count for depth, count in depths.iteritems())) / size if size else 0.0,
+        }
+        if sink is None:
+            sink = self.metrics
+        if sink is not None:
+            export_stats(stats, sink, type(self).__name__)
+        return stats
 
     # Displays the keys in in-oder and pre-order
     def display(self):
@@ -695,79 +4744,196 @@ class BinarySearchTreeDict(object):
         self.inorder_keys()
         self.preorder_keys()
 
+    # Yields the nodes under 'cur_root' in key order, following the parent
+    # pointers from each node to the next so no stack is needed
     def tree_in_order(self, cur_root):
-        if cur_root is not None:
-            for item in self.tree_in_order(cur_root.left):
-                yield item
-            yield cur_root.data
-            for item in self.tree_in_order(cur_root.right):
-                yield item
-        else:
-            StopIteration()
+        """
+        >>> bst = BinarySearchTreeDict()
+        >>> for key in range(5000):
+        ...     bst[key] = key
+        >>> sum(1 for node in bst.tree_in_order(bst.root)), bst.height, tree_length(bst.root)
+        (5000, 4999, 5000)
+        """
+        if cur_root is None:
+            return
+        cur_node = tree_minimum(cur_root)
+        while cur_node is not None:
+            yield cur_node
+            cur_node = tree_successor(cur_node, cur_root)
 
+    # Yields the keys under 'cur_root' in pre-order, keeping the right
+    # subtrees still to visit on a stack
     def tree_pre_order(self, cur_root):
-        if cur_root is not None:
-            yield cur_root.data.keys()[0]
-            for item in self.tree_pre_order(cur_root.left):
-                yield item
-            for item in self.tree_pre_order(cur_root.right):
-                yield item
-        else:
-            StopIteration()
+        if cur_root is None:
+            return
+        stack = [cur_root]
+        while stack:
+            cur_node = stack.pop()
+            yield cur_node.key
+            if cur_node.right is not None:
+                stack.append(cur_node.right)
+            if cur_node.left is not None:
+                stack.append(cur_node.left)
 
+    # Yields the keys under 'cur_root' in post-order, keeping the path from
+    # 'cur_root' on a stack
     def tree_post_order(self, cur_root):
-        if cur_root is not None:
-            for item in self.tree_post_order(cur_root.left):
-                yield item
-            for item in self.tree_post_order(cur_root.right):
-                yield item
-            yield cur_root.data.keys()[0]
-        else:
-            StopIteration()
+        stack = []
+        last_node = None
+        cur_node = cur_root
+        while stack or cur_node is not None:
+            if cur_node is not None:
+                stack.append(cur_node)
+                cur_node = cur_node.left
+            else:
+                top_node = stack[-1]
+                if top_node.right is not None and top_node.right is not last_node:
+                    cur_node = top_node.right
+                else:
+                    yield top_node.key
+                    last_node = stack.pop()
 
 
 # Will insert cur_node in the tree
 def tree_insert(cur_root, cur_node):
-    cur_node_key = cur_node.data.keys()[0]
-    cur_root_key = cur_root.data.keys()[0]
-    if(cur_node_key < cur_root_key):
-        if(cur_root.left is None):
-            cur_node.parent = cur_root
-            cur_root.left = cur_node
-        else:
-            tree_insert(cur_root.left, cur_node)
-    elif(cur_node_key >= cur_root_key):
-        if(cur_root.right is None):
-            cur_node.parent = cur_root
-            cur_root.right = cur_node
+    cur_node_key = cur_node.key
+    while True:
+        cur_root.size += 1
+        if(cur_node_key < cur_root.key):
+            if(cur_root.left is None):
+                cur_node.parent = cur_root
+                cur_root.left = cur_node
+                return
+            cur_root = cur_root.left
         else:
-            tree_insert(cur_root.right, cur_node)
+            if(cur_root.right is None):
+                cur_node.parent = cur_root
+                cur_root.right = cur_node
+                return
+            cur_root = cur_root.right
+
+
+# Will build a balanced tree from items[low:high], which are sorted by key
+# and have no repeated keys, and give its root
+def tree_build(items, low, high, parent=None):
+    if(low >= high):
+        return None
+    middle = (low + high) // 2
+    key, value = items[middle]
+    cur_node = BinaryTreeNode(key, value, parent=parent)
+    cur_node.left = tree_build(items, low, middle, cur_node)
+    cur_node.right = tree_build(items, middle + 1, high, cur_node)
+    update_height(cur_node)
+    cur_node.size = high - low
+    return cur_node
+
+
+# Will give the number of nodes under 'cur_node'
+def tree_size(cur_node):
+    if(cur_node is None):
+        return 0
+    return cur_node.size
+
+
+# Will give the height kept in 'cur_node', -1 for an empty subtree
+def node_height(cur_node):
+    if(cur_node is None):
+        return -1
+    return cur_node.height
+
+
+def update_height(cur_node):
+    left = node_height(cur_node.left)
+    right = node_height(cur_node.right)
+    if(left > right):
+        cur_node.height = left + 1
+    else:
+        cur_node.height = right + 1
+
+
+# Will rotate the right child of 'cur_node' up into its place and give it
+def rotate_left(self, cur_node):
+    child = cur_node.right
+    cur_node.right = child.left
+    if(child.left is not None):
+        child.left.parent = cur_node
+    transplant(self, cur_node, child)
+    child.left = cur_node
+    cur_node.parent = child
+    update_height(cur_node)
+    update_height(child)
+    child.size = cur_node.size
+    cur_node.size = tree_size(cur_node.left) + tree_size(cur_node.right) + 1
+    return child
+
+
+# Will rotate the left child of 'cur_node' up into its place and give it
+def rotate_right(self, cur_node):
+    child = cur_node.left
+    cur_node.left = child.right
+    if(child.right is not None):
+        child.right.parent = cur_node
+    transplant(self, cur_node, child)
+    child.right = cur_node
+    cur_node.parent = child
+    update_height(cur_node)
+    update_height(child)
+    child.size = cur_node.size
+    cur_node.size = tree_size(cur_node.left) + tree_size(cur_node.right) + 1
+    return child
+
+
+# Will update the heights from 'cur_node' up to the root, rotating every
+# node whose subtrees differ in height by more than one. Stops at the first
+# balanced node whose height did not change, as nothing above it changes.
+def tree_rebalance(self, cur_node):
+    while(cur_node is not None):
+        old_height = cur_node.height
+        update_height(cur_node)
+        balance = node_height(cur_node.left) - node_height(cur_node.right)
+        if(balance > 1):
+            if(node_height(cur_node.left.left) < node_height(cur_node.left.right)):
+                rotate_left(self, cur_node.left)
+            cur_node = rotate_right(self, cur_node)
+        elif(balance < -1):
+            if(node_height(cur_node.right.right) < node_height(cur_node.right.left)):
+                rotate_right(self, cur_node.right)
+            cur_node = rotate_left(self, cur_node)
+        elif(cur_node.height == old_height):
+            break
+        cur_node = cur_node.parent
 
 
 # Will search for the a node with key equal to 'key'
 def tree_search(cur_root, key):
     return_node = None
     while(cur_root is not None):
-        if(cur_root.data.keys()[0] == key):
+        cur_key = cur_root.key
+        if(cur_key is key or cur_key == key):
             return_node = cur_root
             break
-        elif(key < cur_root.data.keys()[0]):
+        elif(key < cur_key):
             cur_root = cur_root.left
-        elif(key > cur_root.data.keys()[0]):
+        else:
             cur_root = cur_root.right
     return return_node
 
 
-# Will give the height of the tree
+# Will give the height of the tree, walking it with a stack of the
+# subtrees still to visit and their depths
 def tree_height(cur_root):
     return_int = -1
+    stack = []
     if(cur_root is not None):
-        left = tree_height(cur_root.left)
-        right = tree_height(cur_root.right)
-        if(left > right):
-            return_int = left + 1
-        else:
-            return_int = right + 1
+        stack.append((cur_root, 0))
+    while stack:
+        cur_node, depth = stack.pop()
+        if(depth > return_int):
+            return_int = depth
+        if(cur_node.right is not None):
+            stack.append((cur_node.right, depth + 1))
+        if(cur_node.left is not None):
+            stack.append((cur_node.left, depth + 1))
     return return_int
 
 
@@ -775,9 +4941,10 @@ def tree_height(cur_root):
 def tree_length(cur_root):
     return_int = 0
     if(cur_root is not None):
-        left = tree_length(cur_root.left)
-        right = tree_length(cur_root.right)
-        return_int = left + right + 1
+        cur_node = tree_minimum(cur_root)
+        while(cur_node is not None):
+            return_int += 1
+            cur_node = tree_successor(cur_node, cur_root)
     return return_int
 
 
@@ -785,7 +4952,7 @@ def tree_length(cur_root):
 def transplant(self, u, v):
     if(u.parent is None):
         self.root = v
-    elif(u.data.keys()[0] is u.parent.left.data.keys()[0]):
+    elif(u is u.parent.left):
         u.parent.left = v
     else:
         u.parent.right = v
@@ -800,6 +4967,691 @@ def tree_minimum(cur_root):
     return cur_root
 
 
+# Will give the number of keys in the tree smaller than 'key'
+def tree_rank(cur_root, key):
+    return_int = 0
+    while(cur_root is not None):
+        if(cur_root.key < key):
+            return_int += tree_size(cur_root.left) + 1
+            cur_root = cur_root.right
+        else:
+            cur_root = cur_root.left
+    return return_int
+
+
+# Will give the node with 'index' smaller keys in the tree, or None
+def tree_select(cur_root, index):
+    while(cur_root is not None):
+        left = tree_size(cur_root.left)
+        if(index < left):
+            cur_root = cur_root.left
+        elif(index == left):
+            return cur_root
+        else:
+            index -= left + 1
+            cur_root = cur_root.right
+    return None
+
+
+# Will give the first node in key order with a key of at least 'key', or None
+def tree_ceiling(cur_root, key):
+    return_node = None
+    while(cur_root is not None):
+        if(cur_root.key < key):
+            cur_root = cur_root.right
+        else:
+            return_node = cur_root
+            cur_root = cur_root.left
+    return return_node
+
+
+# Will give the last node in key order with a key of at most 'key', or None
+def tree_floor(cur_root, key):
+    return_node = None
+    while(cur_root is not None):
+        if(key < cur_root.key):
+            cur_root = cur_root.left
+        else:
+            return_node = cur_root
+            cur_root = cur_root.right
+    return return_node
+
+
+# Will give the node after 'cur_node' in key order within the subtree under
+# 'stop_node' (the whole tree when None), or None after the last node
+def tree_successor(cur_node, stop_node=None):
+    if(cur_node.right is not None):
+        return tree_minimum(cur_node.right)
+    while(cur_node is not stop_node and cur_node.parent is not None and cur_node is cur_node.parent.right):
+        cur_node = cur_node.parent
+    if(cur_node is stop_node):
+        return None
+    return cur_node.parent
+
+
+# Will give (key, value) pairs sorted by key with only the last value of a
+# repeated key kept. Input that is already sorted is not sorted again.
+def sorted_unique_items(items):
+    items = list(items)
+    if any(items[i][0] >= items[i + 1][0] for i in xrange(len(items) - 1)):
+        # A stable sort keeps repeated keys in the order they were given
+        items.sort(key=lambda item: item[0])
+        unique = []
+        for item in items:
+            if unique and unique[-1][0] == item[0]:
+                unique[-1] = item
+            else:
+                unique.append(item)
+        items = unique
+    return items
+
+
+# A node of a BTreeDict. A leaf holds sorted 'keys' with their 'values' and
+# links to the next leaf. An inner node holds 'children' and, between every
+# two children, the smallest key of the right one in 'keys'.
+class BTreeNode(object):
+    __slots__ = ('keys', 'values', 'children', 'next')
+
+    def __init__(self, keys=None, values=None, children=None, next_link=None):
+        super(BTreeNode, self).__init__()
+        self.keys = keys if keys is not None else []
+        self.values = values
+        self.children = children
+        self.next = next_link
+
+    @property
+    def is_leaf(self):
+        return self.children is None
+
+    def __repr__(self):
+        return repr(self.keys)
+
+
+# An ordered map kept as a B+ tree: every node holds up to 'fanout' sorted
+# keys (a leaf) or children (an inner node) in plain lists searched with
+# bisect, and the leaves are linked in key order for range scans. A lookup
+# visits about log(n) / log(fanout) nodes instead of log2(n) binary nodes.
+# Setting a key that is already present replaces its value.
+class BTreeDict(object):
+
+    def __init__(self, fanout=64, verbose=True):
+        super(BTreeDict, self).__init__()
+        if fanout < 4:
+            raise ValueError("The fanout of a BTreeDict must be at least 4")
+        self.fanout = fanout
+        self.root = BTreeNode(values=[])
+        self._size = 0
+        # When verbose is False lookups return the stored value, misses
+        # raise KeyError and no status strings are built
+        self.verbose = verbose
+
+    # Will build a tree from (key, value) pairs bottom up, with the leaves
+    # and inner nodes filled evenly. When a key is given more than once its
+    # last value is kept. 'expected_size' is accepted to match the hash
+    # tables.
+    @classmethod
+    def from_items(cls, items, expected_size=None, **kwargs):
+        """
+        >>> btd = BTreeDict.from_items([(key, str(key)) for key in range(20)], fanout=4)
+        >>> btd.display()
+        Level 0: [8]
+        Level 1: [4] [12, 16]
+        Level 2: [0, 1, 2, 3] [4, 5, 6, 7] [8, 9, 10, 11] [12, 13, 14, 15] [16, 17, 18, 19]
+        """
+        tree = cls(**kwargs)
+        items = sorted_unique_items(items)
+        if not items:
+            return tree
+        nodes = []
+        for low, high in btree_chunks(len(items), tree.fanout):
+            nodes.append(BTreeNode([item[0] for item in items[low:high]], [item[1] for item in items[low:high]]))
+        for index in xrange(len(nodes) - 1):
+            nodes[index].next = nodes[index + 1]
+        # Smallest key under every node of the level being grouped
+        low_keys = [node.keys[0] for node in nodes]
+        while len(nodes) > 1:
+            parents, parent_keys = [], []
+            for low, high in btree_chunks(len(nodes), tree.fanout):
+                parents.append(BTreeNode(low_keys[low + 1:high], children=nodes[low:high]))
+                parent_keys.append(low_keys[low])
+            nodes, low_keys = parents, parent_keys
+        tree.root = nodes[0]
+        tree._size = len(items)
+        return tree
+
+    # Gives the number of levels below the root
+    @property
+    def height(self):
+        """
+        >>> btd = BTreeDict(fanout=4)
+        >>> btd.height
+        0
+        >>> for key in range(5):
+        ...     btd[key] = key
+        >>> btd.height
+        1
+        """
+        return_int = 0
+        cur_node = self.root
+        while not cur_node.is_leaf:
+            cur_node = cur_node.children[0]
+            return_int += 1
+        return return_int
+
+    # Will give the leaf where 'key' is or would be
+    def _find_leaf(self, key):
+        cur_node = self.root
+        while cur_node.children is not None:
+            cur_node = cur_node.children[bisect_right(cur_node.keys, key)]
+        return cur_node
+
+    # Will return the value for the corresponding key
+    def __getitem__(self, key):
+        """
+        >>> btd = BTreeDict()
+        >>> btd.__setitem__(57, 'Supraj')
+        >>> btd.__getitem__(57)
+        'Supraj'
+        >>> btd.__getitem__(58)
+        'No item with key 58 in the tree'
+        >>> btd = BTreeDict(verbose=False)
+        >>> btd[57] = ['Supraj']
+        >>> btd[57]
+        ['Supraj']
+        >>> btd[58]
+        Traceback (most recent call last):
+        ...
+        KeyError: 58
+        """
+        cur_node = self._find_leaf(key)
+        index = bisect_left(cur_node.keys, key)
+        if index == len(cur_node.keys) or cur_node.keys[index] != key:
+            if not self.verbose:
+                raise KeyError(key)
+            return "No item with key " + str(key) + " in the tree"
+        if not self.verbose:
+            return cur_node.values[index]
+        return str(cur_node.values[index])
+
+    # Adding the element in the tree, splitting every node on the way back
+    # up that holds more than 'fanout' keys or children
+    def __setitem__(self, key, value):
+        """
+        >>> btd = BTreeDict(fanout=4, verbose=False)
+        >>> for key in range(10):
+        ...     btd[key] = str(key)
+        >>> btd[3] = 'Three'
+        >>> btd.display()
+        Level 0: [2, 4, 6]
+        Level 1: [0, 1] [2, 3] [4, 5] [6, 7, 8, 9]
+        >>> btd[3], len(btd)
+        ('Three', 10)
+        """
+        path = []
+        cur_node = self.root
+        while cur_node.children is not None:
+            index = bisect_right(cur_node.keys, key)
+            path.append((cur_node, index))
+            cur_node = cur_node.children[index]
+        keys = cur_node.keys
+        index = bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            cur_node.values[index] = value
+            return
+        keys.insert(index, key)
+        cur_node.values.insert(index, value)
+        self._size += 1
+        if len(keys) <= self.fanout:
+            return
+        # The leaf is split in two halves
+        middle = len(keys) // 2
+        new_node = BTreeNode(keys[middle:], cur_node.values[middle:], next_link=cur_node.next)
+        del keys[middle:]
+        del cur_node.values[middle:]
+        cur_node.next = new_node
+        separator = new_node.keys[0]
+        while path:
+            parent, index = path.pop()
+            parent.keys.insert(index, separator)
+            parent.children.insert(index + 1, new_node)
+            if len(parent.children) <= self.fanout:
+                return
+            # The inner node is split, and the key between the halves moves up
+            middle = len(parent.keys) // 2
+            separator = parent.keys[middle]
+            new_node = BTreeNode(parent.keys[middle + 1:], children=parent.children[middle + 1:])
+            del parent.keys[middle:]
+            del parent.children[middle + 1:]
+        self.root = BTreeNode([separator], children=[self.root, new_node])
+
+    # Deleting the element from the tree. A node left with fewer than half
+    # of 'fanout' keys or children takes one from a sibling, or is merged
+    # with it when the sibling has none to spare.
+    def __delitem__(self, key):
+        """
+        >>> btd = BTreeDict(fanout=4)
+        >>> btd.__setitem__(57, 'Supraj')
+        >>> btd.__delitem__(57)
+        'Item 57 deleted successfully'
+        >>> btd.__delitem__(57)
+        'No item with key 57 in the tree'
+        >>> btd = BTreeDict(fanout=4, verbose=False)
+        >>> for key in range(10):
+        ...     btd[key] = str(key)
+        >>> for key in [4, 5, 6]:
+        ...     del btd[key]
+        >>> btd.display()
+        Level 0: [2, 8]
+        Level 1: [0, 1] [2, 3, 7] [8, 9]
+        >>> del btd[4]
+        Traceback (most recent call last):
+        ...
+        KeyError: 4
+        """
+        path = []
+        cur_node = self.root
+        while cur_node.children is not None:
+            index = bisect_right(cur_node.keys, key)
+            path.append((cur_node, index))
+            cur_node = cur_node.children[index]
+        index = bisect_left(cur_node.keys, key)
+        if index == len(cur_node.keys) or cur_node.keys[index] != key:
+            if not self.verbose:
+                raise KeyError(key)
+            return "No item with key " + str(key) + " in the tree"
+        del cur_node.keys[index]
+        del cur_node.values[index]
+        self._size -= 1
+        min_fill = self.fanout // 2
+        while path:
+            if btree_fill(cur_node) >= min_fill:
+                break
+            parent, index = path.pop()
+            if index > 0 and btree_fill(parent.children[index - 1]) > min_fill:
+                btree_borrow_left(parent, index)
+            elif index + 1 < len(parent.children) and btree_fill(parent.children[index + 1]) > min_fill:
+                btree_borrow_right(parent, index)
+            elif index > 0:
+                btree_merge(parent, index - 1)
+            else:
+                btree_merge(parent, index)
+            cur_node = parent
+        if not self.root.is_leaf and len(self.root.children) == 1:
+            self.root = self.root.children[0]
+        if self.verbose:
+            return "Item " + str(key) + " deleted successfully"
+
+    # Checks if an element with 'key' is present in the tree
+    def __contains__(self, key):
+        """
+        >>> btd = BTreeDict()
+        >>> btd.__setitem__(57, 'Supraj')
+        >>> btd.__contains__(57)
+        'Item with key 57 is found and its value is Supraj'
+        >>> btd.__contains__(58)
+        'No item with key 58 in the tree'
+        >>> btd = BTreeDict(verbose=False)
+        >>> btd[57] = 'Supraj'
+        >>> 57 in btd, 58 in btd
+        (True, False)
+        """
+        cur_node = self._find_leaf(key)
+        index = bisect_left(cur_node.keys, key)
+        found = index < len(cur_node.keys) and cur_node.keys[index] == key
+        if not self.verbose:
+            return found
+        if not found:
+            return "No item with key " + str(key) + " in the tree"
+        return "Item with key " + str(key) + " is found and its value is " + str(cur_node.values[index])
+
+    # Gives the number of elements in the tree
+    def __len__(self):
+        """
+        >>> btd = BTreeDict()
+        >>> btd.__setitem__(57, 'Supraj')
+        >>> btd.__setitem__(57, 'Sriram')
+        >>> btd.__len__()
+        1
+        """
+        return self._size
+
+    # Iterates over the keys in order
+    def __iter__(self):
+        """
+        >>> list(BTreeDict.from_items([(58, 'Sriram'), (46, 'Rathna'), (57, 'Supraj')]))
+        [46, 57, 58]
+        """
+        for key, value in self.range_items():
+            yield key
+
+    # Yields the (key, value) pairs with low <= key < high in key order,
+    # walking the linked leaves from the one holding 'low'. A bound of None
+    # leaves that side open.
+    def range_items(self, low=None, high=None):
+        """
+        >>> btd = BTreeDict.from_items([(key, str(key)) for key in range(0, 100, 10)], fanout=4)
+        >>> list(btd.range_items(25, 60))
+        [(30, '30'), (40, '40'), (50, '50')]
+        >>> list(btd.range_items(high=10)), list(btd.range_items(85))
+        ([(0, '0')], [(90, '90')])
+        """
+        if low is None:
+            cur_node = self.root
+            while cur_node.children is not None:
+                cur_node = cur_node.children[0]
+            index = 0
+        else:
+            cur_node = self._find_leaf(low)
+            index = bisect_left(cur_node.keys, low)
+        while cur_node is not None:
+            keys, values = cur_node.keys, cur_node.values
+            end = len(keys)
+            if high is not None and end and not keys[-1] < high:
+                end = bisect_left(keys, high)
+                for position in xrange(index, end):
+                    yield keys[position], values[position]
+                return
+            for position in xrange(index, end):
+                yield keys[position], values[position]
+            cur_node = cur_node.next
+            index = 0
+
+    # Prints the key value pair items in the tree
+    def items(self):
+        """
+        >>> btd = BTreeDict()
+        >>> btd.__setitem__(57, 'Supraj')
+        >>> btd.__setitem__(58, 'Sriram')
+        >>> btd.__setitem__(46, 'Rathna')
+        >>> btd.items()
+        Items:{46: 'Rathna'}->{57: 'Supraj'}->{58: 'Sriram'}
+        """
+        print "Items:" + "->".join([str({key: value}) for key, value in self.range_items()])
+
+    # Will write a snapshot of the tree to 'file', a path or a file opened
+    # for writing: the number of keys of every node and the keys level by
+    # level, then the values of the leaves
+    def save(self, file):
+        """
+        >>> from cStringIO import StringIO
+        >>> btd = BTreeDict(fanout=4)
+        >>> for key in range(10):
+        ...     btd.__setitem__(key, str(key))
+        >>> snapshot = StringIO()
+        >>> btd.save(snapshot)
+        >>> snapshot.seek(0)
+        >>> btd = BTreeDict.load(snapshot)
+        >>> btd.display()
+        Level 0: [2, 4, 6]
+        Level 1: [0, 1] [2, 3] [4, 5] [6, 7, 8, 9]
+        >>> btd.fanout, list(btd.range_items(7))
+        (4, [(7, '7'), (8, '8'), (9, '9')])
+        """
+        counts, keys, values = [], [], []
+        level = [self.root]
+        levels = 0
+        while level:
+            for cur_node in level:
+                counts.append(len(cur_node.keys))
+                keys.extend(cur_node.keys)
+                if cur_node.is_leaf:
+                    values.extend(cur_node.values)
+            level = [child for cur_node in level if not cur_node.is_leaf for child in cur_node.children]
+            levels += 1
+        write_snapshot(file, SNAPSHOT_BTREE, snapshot_flags(self.verbose), 0.0, levels, self._size, 0, self.fanout,
+                       [counts, keys, values])
+
+    # Will restore a tree saved with save() with the same nodes
+    @classmethod
+    def load(cls, file):
+        flags, max_load, levels, size, deleted, fanout, columns = read_snapshot(file, SNAPSHOT_BTREE)
+        counts, keys, values = columns
+        tree = cls(fanout, bool(flags & SNAPSHOT_VERBOSE))
+        node_index, key_index, value_index = 0, 0, 0
+        level_size = 1
+        parents = []
+        for depth in xrange(levels):
+            is_leaf = depth == levels - 1
+            level = []
+            for index in xrange(level_size):
+                count = counts[node_index]
+                cur_node = BTreeNode(list(keys[key_index:key_index + count]))
+                if is_leaf:
+                    cur_node.values = list(values[value_index:value_index + count])
+                    value_index += count
+                    if level:
+                        level[-1].next = cur_node
+                else:
+                    cur_node.children = []
+                level.append(cur_node)
+                node_index += 1
+                key_index += count
+            # The nodes of a level are the children of the level above, in order
+            children = iter(level)
+            for parent in parents:
+                parent.children.extend(next(children) for index in xrange(len(parent.keys) + 1))
+            if depth == 0:
+                tree.root = level[0]
+            parents = level
+            level_size = sum(len(cur_node.keys) + 1 for cur_node in level)
+        tree._size = size
+        return tree
+
+    # Displays the keys of the nodes level by level
+    def display(self):
+        """
+        >>> btd = BTreeDict()
+        >>> btd.__setitem__(57, 'Supraj')
+        >>> btd.__setitem__(58, 'Sriram')
+        >>> btd.display()
+        Level 0: [57, 58]
+        """
+        level = [self.root]
+        depth = 0
+        while level:
+            print "Level " + str(depth) + ": " + " ".join([repr(node) for node in level])
+            level = [child for node in level if not node.is_leaf for child in node.children]
+            depth += 1
+
+
+# Will give the (low, high) bounds of the fewest groups of at most 'fanout'
+# of 'count' things, with the sizes of the groups differing by at most one
+def btree_chunks(count, fanout):
+    """
+    >>> btree_chunks(10, 4)
+    [(0, 3), (3, 6), (6, 10)]
+    """
+    chunks = (count + fanout - 1) // fanout
+    return [(count * index // chunks, count * (index + 1) // chunks) for index in xrange(chunks)]
+
+
+# Will give the number of keys of a leaf or children of an inner node
+def btree_fill(cur_node):
+    if cur_node.children is None:
+        return len(cur_node.keys)
+    return len(cur_node.children)
+
+
+# Moves the last key or child of the left sibling of parent.children[index]
+# to the front of it
+def btree_borrow_left(parent, index):
+    cur_node, left = parent.children[index], parent.children[index - 1]
+    if cur_node.children is None:
+        cur_node.keys.insert(0, left.keys.pop())
+        cur_node.values.insert(0, left.values.pop())
+        parent.keys[index - 1] = cur_node.keys[0]
+    else:
+        cur_node.keys.insert(0, parent.keys[index - 1])
+        cur_node.children.insert(0, left.children.pop())
+        parent.keys[index - 1] = left.keys.pop()
+
+
+# Moves the first key or child of the right sibling of parent.children[index]
+# to the end of it
+def btree_borrow_right(parent, index):
+    cur_node, right = parent.children[index], parent.children[index + 1]
+    if cur_node.children is None:
+        cur_node.keys.append(right.keys.pop(0))
+        cur_node.values.append(right.values.pop(0))
+        parent.keys[index] = right.keys[0]
+    else:
+        cur_node.keys.append(parent.keys[index])
+        cur_node.children.append(right.children.pop(0))
+        parent.keys[index] = right.keys.pop(0)
+
+
+# Merges parent.children[index + 1] into parent.children[index]
+def btree_merge(parent, index):
+    left, right = parent.children[index], parent.children[index + 1]
+    if left.children is None:
+        left.keys.extend(right.keys)
+        left.values.extend(right.values)
+        left.next = right.next
+    else:
+        left.keys.append(parent.keys[index])
+        left.keys.extend(right.keys)
+        left.children.extend(right.children)
+    del parent.keys[index]
+    del parent.children[index + 1]
+
+
+# A snapshot is a header, a list of columns and a CRC32 of everything before
+# it. The header holds a magic string, the format version, the kind of
+# container, its flags, max_load, its shape (bins, or levels of a B-tree),
+# its size, its 'DELETED' count and one more setting (rehash_step or
+# fanout). Each column is a type code and a length followed by the values:
+# 'q' 64 bit integers, 'u' bytes, 's' byte strings as their lengths and
+# their concatenation, or 'p' a pickled list.
+SNAPSHOT_MAGIC = 'DSNP'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<4sHBBdqqqq')
+SNAPSHOT_COLUMN = struct.Struct('<cQ')
+SNAPSHOT_CHECKSUM = struct.Struct('<I')
+SNAPSHOT_CHAINED = 1
+SNAPSHOT_OPEN_ADDRESS = 2
+SNAPSHOT_TREE = 3
+SNAPSHOT_BTREE = 4
+# Flags: verbose, the mode of the container (move_to_front, robin_hood or
+# balanced) and int_keys
+SNAPSHOT_VERBOSE = 1
+SNAPSHOT_MODE = 2
+SNAPSHOT_INT_KEYS = 4
+# Integer columns are read straight into an array when the machine long is
+# 64 bit little endian, and unpacked otherwise
+SNAPSHOT_NATIVE_INTS = array('l').itemsize == 8 and struct.pack('=l', 1) == struct.pack('<q', 1)
+
+
+def snapshot_flags(verbose, mode=False, int_keys=False):
+    return (verbose and SNAPSHOT_VERBOSE) | (mode and SNAPSHOT_MODE) | (int_keys and SNAPSHOT_INT_KEYS)
+
+
+# Will give the type code and the bytes of a column of values
+def encode_column(values):
+    if isinstance(values, bytearray):
+        return 'u', str(values)
+    if isinstance(values, array) and values.typecode == 'l' and SNAPSHOT_NATIVE_INTS:
+        return 'q', values.tostring()
+    if all(type(value) is int for value in values):
+        if SNAPSHOT_NATIVE_INTS:
+            return 'q', array('l', values).tostring()
+        return 'q', struct.pack('<' + str(len(values)) + 'q', *values)
+    if all(type(value) is str for value in values):
+        lengths = encode_column([len(value) for value in values])[1]
+        return 's', struct.pack('<Q', len(values)) + lengths + ''.join(values)
+    return 'p', cPickle.dumps(list(values), 2)
+
+
+# Will give the values of the column of type 'code' stored in
+# data[offset:offset + length]. Integer columns come back as arrays and byte
+# columns as bytearrays, read from the buffer without parsing every value.
+def decode_column(code, data, offset, length):
+    if code == 'u':
+        return bytearray(buffer(data, offset, length))
+    if code == 'q':
+        if SNAPSHOT_NATIVE_INTS:
+            values = array('l')
+            values.fromstring(buffer(data, offset, length))
+            return values
+        return list(struct.unpack_from('<' + str(length // 8) + 'q', data, offset))
+    if code == 's':
+        count = struct.unpack_from('<Q', data, offset)[0]
+        lengths = decode_column('q', data, offset + 8, count * 8)
+        position = offset + 8 + count * 8
+        values = []
+        for value_length in lengths:
+            values.append(data[position:position + value_length])
+            position += value_length
+        return values
+    if code == 'p':
+        return cPickle.loads(data[offset:offset + length])
+    raise ValueError("Unknown snapshot column type " + repr(code))
+
+
+# Will write a snapshot to 'file', a path or a file opened for writing
+def write_snapshot(file, kind, flags, max_load, shape, size, deleted, setting, columns):
+    parts = [SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, kind, flags, max_load, shape, size,
+                                  deleted, setting)]
+    for column in columns:
+        code, payload = encode_column(column)
+        parts.append(SNAPSHOT_COLUMN.pack(code, len(payload)))
+        parts.append(payload)
+    data = ''.join(parts)
+    data += SNAPSHOT_CHECKSUM.pack(zlib.crc32(data) & 0xffffffff)
+    if isinstance(file, basestring):
+        with open(file, 'wb') as snapshot_file:
+            snapshot_file.write(data)
+    else:
+        file.write(data)
+
+
+# Will read a snapshot of a container of type 'kind' from 'file', a path or
+# a file opened for reading, in one read. Gives the header fields and the
+# columns.
+def read_snapshot(file, kind):
+    if isinstance(file, basestring):
+        with open(file, 'rb') as snapshot_file:
+            data = snapshot_file.read()
+    else:
+        data = file.read()
+    end = len(data) - SNAPSHOT_CHECKSUM.size
+    if end < SNAPSHOT_HEADER.size:
+        raise ValueError("The snapshot is truncated")
+    if SNAPSHOT_CHECKSUM.unpack_from(data, end)[0] != zlib.crc32(buffer(data, 0, end)) & 0xffffffff:
+        raise ValueError("The snapshot checksum does not match, it is corrupt")
+    magic, version, saved_kind, flags, max_load, shape, size, deleted, setting = SNAPSHOT_HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError("Not a version " + str(SNAPSHOT_VERSION) + " snapshot")
+    if saved_kind != kind:
+        raise ValueError("The snapshot holds a different kind of container")
+    columns = []
+    offset = SNAPSHOT_HEADER.size
+    while offset < end:
+        code, length = SNAPSHOT_COLUMN.unpack_from(data, offset)
+        offset += SNAPSHOT_COLUMN.size
+        columns.append(decode_column(code, data, offset, length))
+        offset += length
+    return flags, max_load, shape, size, deleted, setting, columns
+
+
+def snapshot_setting(rehash_step):
+    if rehash_step is None:
+        return -1
+    return rehash_step
+
+
+def snapshot_rehash_step(setting):
+    if setting < 0:
+        return None
+    return setting
+
+
+# Checks that a table created for a snapshot got the bins it was saved with
+def check_snapshot_bins(table, bin_count):
+    if table.bin_count != bin_count:
+        raise ValueError("The snapshot has " + str(bin_count) + " bins but the hash function gives tables of " +
+                         str(table.bin_count) + ", it was saved with a different hash function")
+
+
 def terrible_hash(bin):
     """A terrible hash function that can be used for testing.
 
@@ -814,8 +5666,9 @@ def terrible_hash(bin):
         item is used.
 
     :return:
-        A python function that can be passes into the constructor
-        of a hash table to use for hashing objects.
+        A hash strategy that can be passes into the constructor
+        of a hash table to use for hashing objects. It can also be
+        called as a function.
 
     Doc test for chained
     >>> chd = ChainedHashDict(hashfunc=terrible_hash(10))
@@ -851,9 +5704,7 @@ def terrible_hash(bin):
 
     """
 
-    def hashfunc(item):
-        return bin - 1
-    return hashfunc
+    return TerribleHash(bin)
 
 
 def main():
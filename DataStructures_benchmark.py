@@ -0,0 +1,1236 @@
+__author__ = 'Supraj'
+
+import argparse
+import ctypes
+import ctypes.util
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import timeit
+import types
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from DataStructures import SinglyLinkedList
+from DataStructures import IndexedSinglyLinkedList
+from DataStructures import ChainedHashDict
+from DataStructures import FlatChainedHashDict
+from DataStructures import ConcurrentChainedHashDict
+from DataStructures import ShardedHashDict
+from DataStructures import LRUCacheDict
+from DataStructures import OpenAddressHashDict
+from DataStructures import ArrayOpenAddressHashDict
+from DataStructures import CuckooHashDict
+from DataStructures import MappedOpenAddressHashDict
+from DataStructures import BinarySearchTreeDict
+from DataStructures import BTreeDict
+from DataStructures import BloomFilterDict
+from DataStructures import tree_height
+from DataStructures import tree_length
+from DataStructures import hash_function
+from DataStructures import HashStrategy
+from DataStructures import MaskHash
+from DataStructures import FibonacciHash
+from DataStructures import UniversalHash
+from DataStructures import terrible_hash
+
+'''
+Timing runs for the containers in DataStructures.py.
+Each benchmark is run for growing input sizes and the time per operation
+is printed, so a cost that grows with the size of the container shows up
+as a growing per-operation time.
+
+"python DataStructures_benchmark.py suite" runs the benchmark suite instead
+and writes a JSON report that can be diffed between commits and checked
+against a baseline report, see suite_main().
+'''
+
+SIZES = [1000, 10000, 100000]
+
+
+def make_keys(n, seed=0):
+    keys = range(n)
+    random.Random(seed).shuffle(keys)
+    return keys
+
+
+def make_random_keys(n, seed=0):
+    return random.Random(seed).sample(xrange(2 ** 40), n)
+
+
+# Total size of every object reachable from obj, not counting classes,
+# functions and modules
+def deep_sizeof(obj):
+    skip = (type, types.ClassType, types.ModuleType, types.FunctionType,
+            types.BuiltinFunctionType, types.MethodType)
+    seen = set()
+    total = 0
+    pending = [obj]
+    while pending:
+        cur = pending.pop()
+        if id(cur) in seen or isinstance(cur, skip):
+            continue
+        seen.add(id(cur))
+        total += sys.getsizeof(cur)
+        pending.extend(gc.get_referents(cur))
+    return total
+
+
+def bulk_insert(factory, keys):
+    container = factory()
+    for key in keys:
+        container.__setitem__(key, key)
+    return container
+
+
+# Looks up every key, half of which are missing from a non verbose container
+def get_each(container, keys):
+    values = []
+    for key in keys:
+        try:
+            values.append(container[key])
+        except KeyError:
+            values.append(None)
+    return values
+
+
+def bulk_prepend(keys):
+    sll = SinglyLinkedList()
+    for key in keys:
+        sll.prepend(key)
+    return sll
+
+
+def bench_bulk_insert():
+    """
+    Bulk insert of N keys.  Since the element count is kept up to date on
+    every insert, the time per insert should stay flat as N grows.
+    """
+    factories = [
+        ('SinglyLinkedList', None),
+        ('ChainedHashDict', lambda: ChainedHashDict(hashfunc=hash_function(10))),
+        ('OpenAddressHashDict', OpenAddressHashDict),
+        ('BinarySearchTreeDict', BinarySearchTreeDict),
+    ]
+    print "-----Bulk insert (microseconds per insert)-----"
+    for name, factory in factories:
+        line = name.ljust(24)
+        for n in SIZES:
+            keys = make_keys(n)
+            if factory is None:
+                elapsed = min(timeit.repeat(lambda: bulk_prepend(keys), number=1, repeat=3))
+            else:
+                elapsed = min(timeit.repeat(lambda: bulk_insert(factory, keys), number=1, repeat=3))
+            line += ("n=" + str(n) + ": " + "%.2f" % (elapsed * 1e6 / n)).ljust(22)
+        print line
+
+
+def bench_len():
+    """
+    len() and load_factor on a filled container, which should not depend on N.
+    """
+    print "-----len() and load_factor (microseconds per call)-----"
+    for n in SIZES:
+        keys = make_keys(n)
+        chd = bulk_insert(lambda: ChainedHashDict(hashfunc=hash_function(10)), keys)
+        ohd = bulk_insert(OpenAddressHashDict, keys)
+        bst = bulk_insert(BinarySearchTreeDict, keys)
+        line = ("n=" + str(n)).ljust(10)
+        for name, container in [('chd', chd), ('ohd', ohd), ('bst', bst)]:
+            elapsed = min(timeit.repeat(container.__len__, number=1000, repeat=3))
+            line += (name + " len: " + "%.3f" % (elapsed * 1e3)).ljust(20)
+        for name, container in [('chd', chd), ('ohd', ohd)]:
+            elapsed = min(timeit.repeat(lambda: container.load_factor, number=1000, repeat=3))
+            line += (name + " load: " + "%.3f" % (elapsed * 1e3)).ljust(20)
+        print line
+
+
+def bench_memory(n=1000000):
+    """
+    Bytes per entry for n random integer keys, with the keys used as values.
+    The keys themselves are included, so a built-in dict is shown as reference.
+    """
+    print "-----Memory (bytes per entry, n=" + str(n) + ")-----"
+    keys = make_random_keys(n)
+    factories = [
+        ('dict', dict),
+        ('ChainedHashDict', lambda: ChainedHashDict(hashfunc=hash_function(10))),
+        ('OpenAddressHashDict', OpenAddressHashDict),
+        ('ArrayOpenAddressHashDict', lambda: ArrayOpenAddressHashDict(int_keys=True)),
+        ('BinarySearchTreeDict', BinarySearchTreeDict),
+    ]
+    for name, factory in factories:
+        container = bulk_insert(factory, keys)
+        print name.ljust(26) + "%.1f" % (float(deep_sizeof(container)) / n)
+        del container
+
+
+def bench_insert_latency(n=200000):
+    """
+    Worst single insert while loading n keys, with the table rebuilt in one go
+    and with incremental rehashing at a few rehash_step settings.
+    The garbage collector is disabled so its pauses don't hide the rebuilds.
+    With rehash_step=1 the next resize can come due before the previous one
+    is done, and the rest of that migration is then done in one go.
+    """
+    print "-----Worst insert latency (milliseconds, n=" + str(n) + ")-----"
+    keys = make_random_keys(n)
+    timer = timeit.default_timer
+    gc.disable()
+    for step in [None, 1, 16, 256]:
+        line = ("rehash_step=" + str(step)).ljust(18)
+        factories = [
+            ('chd', lambda: ChainedHashDict(hashfunc=hash_function(10), verbose=False, rehash_step=step)),
+            ('ohd', lambda: OpenAddressHashDict(verbose=False, rehash_step=step)),
+        ]
+        for name, factory in factories:
+            container = factory()
+            worst = 0.0
+            start = timer()
+            for key in keys:
+                before = timer()
+                container[key] = key
+                worst = max(worst, timer() - before)
+            total = timer() - start
+            line += (name + " worst: " + "%.3f" % (worst * 1e3)).ljust(20)
+            line += (name + " total: " + "%.0f" % (total * 1e3)).ljust(20)
+        print line
+    gc.enable()
+
+
+def bench_probe_length(n=20000, rounds=10):
+    """
+    Delete heavy churn on an OpenAddressHashDict: n keys are loaded, then in
+    every round half of them are deleted and replaced by new keys. Prints the
+    max probe length and the lookup time after each round.
+    """
+    print "-----Probe length under churn (n=" + str(n) + ")-----"
+    for robin_hood in [False, True]:
+        rng = random.Random(1)
+        ohd = OpenAddressHashDict(verbose=False, robin_hood=robin_hood)
+        live = make_random_keys(n)
+        for key in live:
+            ohd[key] = key
+        line = ("robin_hood=" + str(robin_hood)).ljust(18)
+        for i in range(rounds):
+            rng.shuffle(live)
+            for key in live[:n / 2]:
+                del ohd[key]
+            live[:n / 2] = [rng.randrange(2 ** 40) for j in range(n / 2)]
+            for key in live[:n / 2]:
+                ohd[key] = key
+        elapsed = min(timeit.repeat(lambda: [ohd[key] for key in live], number=1, repeat=3))
+        line += "bins: " + str(ohd.bin_count).ljust(10)
+        line += "max probe: " + str(ohd.max_probe_length).ljust(8)
+        line += "lookup: " + "%.2f" % (elapsed * 1e6 / n) + " us"
+        print line
+
+
+def bench_lookup(n=100000):
+    """
+    Hit and miss lookups on the open addressing tables with n random
+    integer keys (microseconds per lookup).
+    """
+    print "-----Open addressing lookups (microseconds per lookup, n=" + str(n) + ")-----"
+    keys = make_random_keys(2 * n)
+    hits, misses = keys[:n], keys[n:]
+    factories = [
+        ('OpenAddressHashDict', lambda: OpenAddressHashDict(verbose=False)),
+        ('robin_hood', lambda: OpenAddressHashDict(verbose=False, robin_hood=True)),
+        ('ArrayOpenAddressHashDict', lambda: ArrayOpenAddressHashDict(verbose=False, int_keys=True)),
+    ]
+    for name, factory in factories:
+        container = bulk_insert(factory, hits)
+        contains = container.__contains__
+        hit = min(timeit.repeat(lambda: [contains(key) for key in hits], number=1, repeat=3))
+        miss = min(timeit.repeat(lambda: [contains(key) for key in misses], number=1, repeat=3))
+        print name.ljust(26) + ("hit: " + "%.2f" % (hit * 1e6 / n)).ljust(14) + "miss: " + "%.2f" % (miss * 1e6 / n)
+
+
+def bench_hash_strategies(n=20000):
+    """
+    Loads n keys that are all multiples of 1024 into an OpenAddressHashDict
+    with each hash strategy. Such keys all share their low bits, which is
+    the worst case for modulo and mask reduction.
+    """
+    print "-----Hash strategies, keys = i * 1024 (n=" + str(n) + ")-----"
+    keys = [i * 1024 for i in make_keys(n)]
+    strategies = [
+        ('HashStrategy', HashStrategy),
+        ('MaskHash', MaskHash),
+        ('FibonacciHash', FibonacciHash),
+        ('UniversalHash', UniversalHash),
+    ]
+    for name, strategy in strategies:
+        factory = lambda: OpenAddressHashDict(hashfunc=strategy(), verbose=False)
+        elapsed = min(timeit.repeat(lambda: bulk_insert(factory, keys), number=1, repeat=1))
+        ohd = bulk_insert(factory, keys)
+        print name.ljust(18) + ("insert: " + "%.2f" % (elapsed * 1e6 / n) + " us").ljust(22) + \
+            "max probe: " + str(ohd.max_probe_length)
+
+
+def bench_batch(n=200000):
+    """
+    Per-key calls against the batch calls for n random integer keys, given
+    as a NumPy int64 array when NumPy is installed (microseconds per key).
+    """
+    print "-----Per-key / batch calls (microseconds per key, n=" + str(n) + ")-----"
+    keys = make_random_keys(2 * n)
+    hits, lookups = keys[:n], keys[n / 2:n / 2 + n]
+    if numpy is not None:
+        hit_batch, lookup_batch = numpy.array(hits, dtype=numpy.int64), numpy.array(lookups, dtype=numpy.int64)
+    else:
+        hit_batch, lookup_batch = hits, lookups
+    factories = [
+        ('ChainedHashDict', lambda: ChainedHashDict(verbose=False)),
+        ('OpenAddressHashDict', lambda: OpenAddressHashDict(verbose=False)),
+        ('ArrayOpenAddressHashDict', lambda: ArrayOpenAddressHashDict(verbose=False, int_keys=True)),
+        ('FibonacciHash', lambda: OpenAddressHashDict(hashfunc=FibonacciHash(), verbose=False)),
+    ]
+    for name, factory in factories:
+        line = name.ljust(26)
+        per_key = min(timeit.repeat(lambda: bulk_insert(factory, hits), number=1, repeat=3))
+        batch = min(timeit.repeat(lambda: factory().set_many(hit_batch, hits), number=1, repeat=3))
+        line += ("set: " + "%.2f" % (per_key * 1e6 / n) + " / " + "%.2f" % (batch * 1e6 / n)).ljust(22)
+        container = bulk_insert(factory, hits)
+        contains = container.__contains__
+        per_key = min(timeit.repeat(lambda: [contains(key) for key in lookups], number=1, repeat=3))
+        batch = min(timeit.repeat(lambda: container.contains_many(lookup_batch), number=1, repeat=3))
+        line += ("contains: " + "%.2f" % (per_key * 1e6 / n) + " / " + "%.2f" % (batch * 1e6 / n)).ljust(26)
+        per_key = min(timeit.repeat(lambda: get_each(container, lookups), number=1, repeat=3))
+        batch = min(timeit.repeat(lambda: container.get_many(lookup_batch), number=1, repeat=3))
+        line += "get: " + "%.2f" % (per_key * 1e6 / n) + " / " + "%.2f" % (batch * 1e6 / n)
+        print line
+
+
+def bench_from_items(n=200000):
+    """
+    Cold-start load of n random integer keys: inserting them one by one into
+    a table that starts at 10 bins against from_items(), which sizes the
+    table once. The tree is loaded from sorted keys with from_items() and
+    from shuffled keys one by one (sorted keys one by one would give a tree
+    as deep as n).
+    """
+    print "-----Cold-start load (microseconds per key, n=" + str(n) + ")-----"
+    keys = make_random_keys(n)
+    items = [(key, key) for key in keys]
+    factories = [
+        ('ChainedHashDict', ChainedHashDict),
+        ('OpenAddressHashDict', OpenAddressHashDict),
+        ('ArrayOpenAddressHashDict', ArrayOpenAddressHashDict),
+    ]
+    for name, cls in factories:
+        per_key = min(timeit.repeat(lambda: bulk_insert(lambda: cls(verbose=False), keys), number=1, repeat=3))
+        presized = min(timeit.repeat(lambda: cls.from_items(items, verbose=False), number=1, repeat=3))
+        print name.ljust(26) + ("one by one: " + "%.2f" % (per_key * 1e6 / n)).ljust(22) + \
+            "from_items: " + "%.2f" % (presized * 1e6 / n)
+    sorted_items = sorted(items)
+    per_key = min(timeit.repeat(lambda: bulk_insert(BinarySearchTreeDict, keys), number=1, repeat=3))
+    presized = min(timeit.repeat(lambda: BinarySearchTreeDict.from_items(sorted_items), number=1, repeat=3))
+    print "BinarySearchTreeDict".ljust(26) + ("one by one: " + "%.2f" % (per_key * 1e6 / n)).ljust(22) + \
+        ("from_items: " + "%.2f" % (presized * 1e6 / n)).ljust(22) + \
+        "height: " + str(bulk_insert(BinarySearchTreeDict, keys).height) + " / " + \
+        str(BinarySearchTreeDict.from_items(sorted_items).height)
+
+
+def bench_tree_orders(sizes=(900, 5000, 100000)):
+    """
+    Inserting sorted, reverse sorted and shuffled keys into the plain and
+    the balanced tree, then looking all of them up (microseconds per key).
+    Sorted input makes the plain tree a chain with quadratic load time, so
+    that case is skipped for the larger sizes.
+    """
+    print "-----Tree insert orders (microseconds per insert / lookup, height)-----"
+    for n in sizes:
+        orders = [('sorted', range(n)), ('reversed', range(n - 1, -1, -1)), ('random', make_keys(n))]
+        for order, keys in orders:
+            line = ("n=" + str(n) + " " + order).ljust(18)
+            for balanced in [False, True]:
+                name = 'avl' if balanced else 'plain'
+                factory = lambda: BinarySearchTreeDict(verbose=False, balanced=balanced)
+                if not balanced and order != 'random' and n > 5000:
+                    line += (name + ": skipped").ljust(36)
+                    continue
+                elapsed = min(timeit.repeat(lambda: bulk_insert(factory, keys), number=1, repeat=1))
+                bst = bulk_insert(factory, keys)
+                lookup = min(timeit.repeat(lambda: [bst[key] for key in keys], number=1, repeat=1))
+                line += (name + ": " + "%.2f" % (elapsed * 1e6 / n) + " / " + "%.2f" % (lookup * 1e6 / n) +
+                         " h=" + str(bst.height)).ljust(36)
+            print line
+
+
+def bench_traversal(n=200000):
+    """
+    Full traversals and structural queries on a tree of n shuffled keys
+    (microseconds per node).
+    """
+    print "-----Tree traversals (microseconds per node, n=" + str(n) + ")-----"
+    bst = bulk_insert(lambda: BinarySearchTreeDict(verbose=False), make_keys(n))
+    runs = [
+        ('in order', lambda: sum(1 for node in bst.tree_in_order(bst.root))),
+        ('pre order', lambda: sum(1 for key in bst.tree_pre_order(bst.root))),
+        ('post order', lambda: sum(1 for key in bst.tree_post_order(bst.root))),
+        ('tree_height', lambda: tree_height(bst.root)),
+        ('tree_length', lambda: tree_length(bst.root)),
+    ]
+    for name, run in runs:
+        elapsed = min(timeit.repeat(run, number=1, repeat=3))
+        print name.ljust(18) + "%.2f" % (elapsed * 1e6 / n)
+
+
+def bench_order_statistics(n=200000, queries=1000):
+    """
+    Order statistics on a balanced tree of n shuffled keys, against a full
+    in-order scan for the range query (microseconds per query).
+    """
+    print "-----Order statistics (microseconds per query, n=" + str(n) + ")-----"
+    bst = bulk_insert(lambda: BinarySearchTreeDict(verbose=False, balanced=True), make_keys(n))
+    rng = random.Random(1)
+    bounds = [sorted([rng.randrange(n), rng.randrange(n)]) for i in range(queries)]
+    narrow = [(low, low + 100) for low, high in bounds]
+    runs = [
+        ('rank', lambda: [bst.rank(low) for low, high in bounds]),
+        ('select', lambda: [bst.select(low) for low, high in bounds]),
+        ('count_range', lambda: [bst.count_range(low, high) for low, high in bounds]),
+        ('floor', lambda: [bst.floor(low) for low, high in bounds]),
+        ('range_items 100', lambda: [list(bst.range_items(low, high)) for low, high in narrow]),
+    ]
+    for name, run in runs:
+        elapsed = min(timeit.repeat(run, number=1, repeat=3))
+        print name.ljust(18) + "%.2f" % (elapsed * 1e6 / queries)
+    scan = lambda: [[node for node in bst.tree_in_order(bst.root) if low <= node.key < high]
+                    for low, high in narrow[:10]]
+    elapsed = min(timeit.repeat(scan, number=1, repeat=1))
+    print "scan 100".ljust(18) + "%.2f" % (elapsed * 1e6 / 10)
+
+
+def bench_ordered_maps(n=1000000, queries=100000, scans=1000):
+    """
+    The binary trees against BTreeDict at a few fanouts, all loaded with
+    from_items() from n random integer keys: bytes per entry, random
+    lookups (microseconds per lookup) and scans of 100 keys from a random
+    start (microseconds per key).
+    """
+    print "-----Ordered maps (n=" + str(n) + ")-----"
+    keys = make_random_keys(n)
+    items = [(key, key) for key in keys]
+    rng = random.Random(1)
+    lookups = [rng.choice(keys) for i in range(queries)]
+    starts = sorted(keys)
+    starts = [(starts[i], starts[i + 100]) for i in [rng.randrange(n - 100) for j in range(scans)]]
+    factories = [
+        ('BinarySearchTreeDict', lambda: BinarySearchTreeDict.from_items(items, verbose=False)),
+        ('avl', lambda: BinarySearchTreeDict.from_items(items, verbose=False, balanced=True)),
+        ('BTreeDict fanout=16', lambda: BTreeDict.from_items(items, verbose=False, fanout=16)),
+        ('BTreeDict fanout=64', lambda: BTreeDict.from_items(items, verbose=False, fanout=64)),
+        ('BTreeDict fanout=256', lambda: BTreeDict.from_items(items, verbose=False, fanout=256)),
+    ]
+    for name, factory in factories:
+        container = factory()
+        size = float(deep_sizeof(container)) / n
+        get = container.__getitem__
+        lookup = min(timeit.repeat(lambda: [get(key) for key in lookups], number=1, repeat=3))
+        scan = min(timeit.repeat(lambda: [list(container.range_items(low, high)) for low, high in starts],
+                                 number=1, repeat=3))
+        print name.ljust(24) + ("bytes: " + "%.1f" % size).ljust(16) + \
+            ("lookup: " + "%.2f" % (lookup * 1e6 / queries)).ljust(16) + "scan: " + "%.3f" % (scan * 1e6 / (scans * 100))
+        container = None
+
+
+def bench_mapped(n=1000000, queries=100000):
+    """
+    Startup of an integer lookup table of n keys: building an
+    ArrayOpenAddressHashDict against reopening a MappedOpenAddressHashDict
+    file built earlier, then the first lookups on each (milliseconds, and
+    microseconds per lookup).
+    """
+    print "-----Mapped table startup (n=" + str(n) + ")-----"
+    keys = make_random_keys(n)
+    items = [(key, key) for key in keys]
+    rng = random.Random(1)
+    lookups = [rng.choice(keys) for i in range(queries)]
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'table.oahd')
+    timer = timeit.default_timer
+    start = timer()
+    MappedOpenAddressHashDict.from_items(items, path=path, verbose=False).close()
+    print "MappedOpenAddressHashDict".ljust(26) + "build: " + "%.0f" % ((timer() - start) * 1e3)
+    runs = [
+        ('ArrayOpenAddressHashDict', lambda: ArrayOpenAddressHashDict.from_items(items, verbose=False, int_keys=True)),
+        ('MappedOpenAddressHashDict', lambda: MappedOpenAddressHashDict(path, verbose=False)),
+    ]
+    for name, factory in runs:
+        start = timer()
+        container = factory()
+        opened = timer() - start
+        get = container.__getitem__
+        start = timer()
+        for key in lookups:
+            get(key)
+        lookup = timer() - start
+        print name.ljust(26) + ("startup: " + "%.2f" % (opened * 1e3)).ljust(22) + \
+            "lookup: " + "%.2f" % (lookup * 1e6 / queries)
+    container.close()
+    shutil.rmtree(directory)
+
+
+def bench_snapshot(n=1000000):
+    """
+    Restarting with n random integer keys: replaying the inserts one by one
+    against loading a snapshot written with save() (milliseconds, and the
+    snapshot size in bytes per entry).
+    """
+    print "-----Snapshot restore (milliseconds, n=" + str(n) + ")-----"
+    keys = make_random_keys(n)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'snapshot')
+    timer = timeit.default_timer
+    factories = [
+        ('ChainedHashDict', lambda: ChainedHashDict(verbose=False)),
+        ('OpenAddressHashDict', lambda: OpenAddressHashDict(verbose=False)),
+        ('ArrayOpenAddressHashDict', lambda: ArrayOpenAddressHashDict(verbose=False, int_keys=True)),
+        ('BinarySearchTreeDict', lambda: BinarySearchTreeDict(verbose=False, balanced=True)),
+        ('BTreeDict', lambda: BTreeDict(verbose=False)),
+    ]
+    for name, factory in factories:
+        start = timer()
+        container = bulk_insert(factory, keys)
+        replay = timer() - start
+        start = timer()
+        container.save(path)
+        save = timer() - start
+        container = None
+        start = timer()
+        container = type(factory()).load(path)
+        load = timer() - start
+        container = None
+        print name.ljust(26) + ("replay: " + "%.0f" % (replay * 1e3)).ljust(16) + \
+            ("save: " + "%.0f" % (save * 1e3)).ljust(14) + ("load: " + "%.0f" % (load * 1e3)).ljust(14) + \
+            "bytes: " + "%.1f" % (float(os.path.getsize(path)) / n)
+    shutil.rmtree(directory)
+
+
+# A ChainedHashDict behind one lock, the way it is shared without
+# ConcurrentChainedHashDict
+class GlobalLockHashDict(object):
+
+    def __init__(self):
+        self.table = ChainedHashDict(verbose=False)
+        self.lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self.lock:
+            return self.table[key]
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.table[key] = value
+
+
+def bench_concurrent(n=100000, ops=50000):
+    """
+    Threads doing a mix of reads and writes on a table of n keys shared
+    through one global lock and through ConcurrentChainedHashDict, for
+    read shares of 95% and 50% (thousands of operations per second, all
+    threads together). Each thread does 'ops' operations.
+    """
+    print "-----Concurrent reads / writes (thousand ops per second, n=" + str(n) + ")-----"
+    keys = make_random_keys(n)
+    factories = [
+        ('global lock', GlobalLockHashDict),
+        ('striped', lambda: ConcurrentChainedHashDict(verbose=False)),
+    ]
+    for reads in [0.95, 0.5]:
+        for name, factory in factories:
+            container = bulk_insert(factory, keys)
+            line = (str(int(reads * 100)) + "% reads " + name).ljust(24)
+            for thread_count in [1, 2, 4, 8]:
+                plans = []
+                for seed in range(thread_count):
+                    rng = random.Random(seed)
+                    plans.append([(rng.random() < reads, rng.choice(keys)) for i in range(ops)])
+
+                def work(plan):
+                    for is_read, key in plan:
+                        if is_read:
+                            container[key]
+                        else:
+                            container[key] = key
+                workers = [threading.Thread(target=work, args=(plan,)) for plan in plans]
+                start = timeit.default_timer()
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join()
+                elapsed = timeit.default_timer() - start
+                line += ("threads=" + str(thread_count) + ": " + "%.0f" % (thread_count * ops / elapsed / 1e3)).ljust(18)
+            print line
+
+
+def bench_sharded(n=1000000, batch_size=100000):
+    """
+    Batched set_many / get_many through ShardedHashDict with 1 to 8 worker
+    processes against the same batches on one table in this process
+    (thousand keys per second). The shards can only run side by side on as
+    many cores as the machine has.
+    """
+    print "-----Sharded batches (thousand keys per second, n=" + str(n) + ", " + str(multiprocessing.cpu_count()) + " cores)-----"
+    keys = make_random_keys(n)
+    if numpy is not None:
+        key_batch = numpy.array(keys, dtype=numpy.int64)
+    else:
+        key_batch = keys
+    batches = [(key_batch[start:start + batch_size], keys[start:start + batch_size])
+               for start in xrange(0, n, batch_size)]
+
+    def run(container):
+        start = timeit.default_timer()
+        for batch, values in batches:
+            container.set_many(batch, values)
+        set_time = timeit.default_timer() - start
+        start = timeit.default_timer()
+        for batch, values in batches:
+            container.get_many(batch)
+        get_time = timeit.default_timer() - start
+        return "set: " + "%.0f" % (n / set_time / 1e3) + "  get: " + "%.0f" % (n / get_time / 1e3)
+    print "local".ljust(12) + run(OpenAddressHashDict(verbose=False))
+    for shards in [1, 2, 4, 8]:
+        container = ShardedHashDict(shards=shards, verbose=False)
+        try:
+            print ("shards=" + str(shards)).ljust(12) + run(container)
+        finally:
+            container.close()
+
+
+def bench_cache(n=200000, universe=100000):
+    """
+    A read-through cache in front of a skewed (Zipf-like) stream of n keys
+    drawn from 'universe' keys: every miss stores the key. Compares an
+    unbounded ChainedHashDict with LRUCacheDict holding 1% and 10% of the
+    keys (microseconds per request, hit rate, entries and memory kept).
+    """
+    print "-----LRU cache (n=" + str(n) + ", " + str(universe) + " distinct keys)-----"
+    rng = random.Random(0)
+    stream = [min(int(rng.paretovariate(0.3)) - 1, universe - 1) for i in range(n)]
+    missing = object()
+
+    def run_table():
+        table = ChainedHashDict(verbose=False)
+        hits = 0
+        for key in stream:
+            if key in table:
+                hits += 1
+            else:
+                table[key] = key
+        return table, hits
+
+    def run_cache(limit):
+        cache = LRUCacheDict(max_entries=limit, verbose=False)
+        get, set = cache.get, cache.set
+        for key in stream:
+            if get(key, missing) is missing:
+                set(key, key)
+        return cache, cache.hits
+    runs = [('ChainedHashDict', run_table),
+            ('LRU 1%', lambda: run_cache(universe // 100)),
+            ('LRU 10%', lambda: run_cache(universe // 10))]
+    for name, run in runs:
+        elapsed = min(timeit.repeat(run, number=1, repeat=3))
+        container, hits = run()
+        print (name.ljust(18) + ("%.2f" % (elapsed * 1e6 / n) + " us").ljust(12) +
+               ("hit rate " + "%.3f" % (float(hits) / n)).ljust(18) +
+               ("entries " + str(len(container))).ljust(18) + "%.1f MB" % (deep_sizeof(container) / 1e6))
+
+
+def bench_flat_chaining(n=200000):
+    """
+    ChainedHashDict against FlatChainedHashDict for n random keys: inserting
+    them with the rebuilds on the way, hits, misses, one rebuild of the
+    full table (microseconds per key) and the memory held.
+    """
+    print "-----Linked / flat chaining (microseconds per key, n=" + str(n) + ")-----"
+    keys = make_random_keys(2 * n)
+    hits, misses = keys[:n], keys[n:]
+    for name, factory in [('ChainedHashDict', lambda: ChainedHashDict(verbose=False)),
+                          ('FlatChainedHashDict', lambda: FlatChainedHashDict(verbose=False))]:
+        line = name.ljust(22)
+        insert = min(timeit.repeat(lambda: bulk_insert(factory, hits), number=1, repeat=3))
+        container = bulk_insert(factory, hits)
+        contains = container.__contains__
+        hit = min(timeit.repeat(lambda: [contains(key) for key in hits], number=1, repeat=3))
+        miss = min(timeit.repeat(lambda: [contains(key) for key in misses], number=1, repeat=3))
+        line += ("insert: " + "%.2f" % (insert * 1e6 / n)).ljust(16)
+        line += ("hit: " + "%.2f" % (hit * 1e6 / n)).ljust(13)
+        line += ("miss: " + "%.2f" % (miss * 1e6 / n)).ljust(14)
+        line += ("%.1f MB" % (deep_sizeof(container) / 1e6)).ljust(10)
+        rebuilds = []
+        for run in range(3):
+            container = bulk_insert(factory, hits)
+            start = timeit.default_timer()
+            container.rebuild(container.bin_count)
+            rebuilds.append(timeit.default_timer() - start)
+        line += "rebuild: " + "%.2f" % (min(rebuilds) * 1e6 / n)
+        print line
+
+
+def main():
+    bench_bulk_insert()
+    bench_len()
+    bench_memory()
+    bench_insert_latency()
+    bench_probe_length()
+    bench_lookup()
+    bench_hash_strategies()
+    bench_batch()
+    bench_from_items()
+    bench_tree_orders()
+    bench_traversal()
+    bench_order_statistics()
+    bench_ordered_maps()
+    bench_mapped()
+    bench_snapshot()
+    bench_concurrent()
+    bench_sharded()
+    bench_cache()
+    bench_flat_chaining()
+    bench_cuckoo()
+    bench_bloom()
+    bench_indexed_list()
+
+
+def bench_cuckoo(n=100000, samples=20000):
+    """
+    Hit and miss latency percentiles (microseconds, timer cost removed) of
+    linear probing, Robin Hood probing and cuckoo hashing for n random keys,
+    n keys that are multiples of 1024 (which cluster under hash(key) %
+    bin_count) and, for 2000 keys, terrible_hash. Also the max_probe_length
+    of each table.
+    """
+    print "-----Cuckoo hashing (latency in microseconds, p50 / p99 / p99.9)-----"
+    workloads = [
+        ('random', make_random_keys(2 * n), hash),
+        ('clustered', [key * 1024 for key in make_keys(2 * n)], hash),
+        ('terrible_hash', make_random_keys(4000), terrible_hash(10)),
+    ]
+    for workload, keys, hashfunc in workloads:
+        half = len(keys) // 2
+        hits, misses = keys[:half], keys[half:]
+        factories = [
+            ('linear probing', lambda: OpenAddressHashDict(hashfunc=hashfunc, verbose=False)),
+            ('Robin Hood', lambda: OpenAddressHashDict(hashfunc=hashfunc, verbose=False, robin_hood=True)),
+            ('cuckoo', lambda: CuckooHashDict(hashfunc=hashfunc, verbose=False, seed=0)),
+        ]
+        for name, factory in factories:
+            container = bulk_insert(factory, hits)
+            line = (workload + " " + name).ljust(30)
+            for label, queries in [('hit', hits), ('miss', misses)]:
+                sample = random.Random(0).sample(queries, min(samples, half))
+                latencies = suite_latencies(container.__contains__, sample)
+                line += (label + ": " + " / ".join("%.2f" % percentile(latencies, percent)
+                                                   for tag, percent in SUITE_PERCENTILES)).ljust(34)
+            line += "max probe: " + str(container.stats()['max_probe_length'])
+            print line
+
+
+def bench_bloom(n=100000, queries=100000, rate=0.01):
+    """
+    Lookups where 90% of the keys are missing, on each container alone and
+    behind a BloomFilterDict sized for n keys at the given false positive
+    rate (microseconds per lookup), and the false positive rate seen.
+    """
+    print "-----Bloom filter front (microseconds per lookup, 90% misses, n=" + str(n) + ")-----"
+    keys = make_random_keys(2 * n)
+    hits, misses = keys[:n], keys[n:]
+    rng = random.Random(0)
+    lookups = [rng.choice(hits) if rng.random() < 0.1 else rng.choice(misses) for i in xrange(queries)]
+    factories = [
+        ('ChainedHashDict', lambda: ChainedHashDict(verbose=False)),
+        ('FlatChainedHashDict', lambda: FlatChainedHashDict(verbose=False)),
+        ('OpenAddressHashDict', lambda: OpenAddressHashDict(verbose=False)),
+        ('BinarySearchTreeDict', lambda: BinarySearchTreeDict(verbose=False, balanced=True)),
+    ]
+    for name, factory in factories:
+        container = bulk_insert(factory, hits)
+        filtered = bulk_insert(lambda: BloomFilterDict(factory(), n, rate, verbose=False), hits)
+        line = name.ljust(24)
+        for label, target in [('alone', container), ('filtered', filtered)]:
+            contains = target.__contains__
+            seconds = min(timeit.repeat(lambda: [contains(key) for key in lookups], number=1, repeat=3))
+            line += (label + ": " + "%.2f" % (seconds * 1e6 / queries)).ljust(18)
+        print line + "false positives: " + "%.4f" % filtered.stats()['false_positive_rate']
+
+
+def bench_indexed_list(sizes=(1000, 10000, 100000), cancels=1000):
+    """
+    A work queue of n item IDs where 'cancels' random IDs are looked up and
+    removed: SinglyLinkedList against IndexedSinglyLinkedList
+    (microseconds per operation).
+    """
+    print "-----Indexed linked list (microseconds per operation)-----"
+    for n in sizes:
+        ids = make_random_keys(n)
+        cancelled = random.Random(0).sample(ids, cancels)
+        line = ("n=" + str(n)).ljust(10)
+        for name, factory in [('SinglyLinkedList', SinglyLinkedList), ('Indexed', IndexedSinglyLinkedList)]:
+            queue = factory(verbose=False)
+            for item in ids:
+                queue.prepend(item)
+            timer = timeit.default_timer
+            start = timer()
+            for item in cancelled:
+                item in queue
+                queue.remove(item)
+            line += (name + ": " + "%.2f" % ((timer() - start) * 1e6 / (2 * cancels))).ljust(28)
+        print line
+
+
+# -----Benchmark suite-----
+# Every structure is run for every key distribution and size in a process
+# of its own. A case measures insert, hit, miss and delete throughput, the
+# latency percentiles of single hits and the peak memory of building the
+# structure, and its results are one JSON record. Against a baseline
+# report, results too fast to time are not compared and a case found worse
+# is run again before it counts as a regression.
+
+SUITE_SIZES = [1000, 10000, 100000]
+SUITE_DISTRIBUTIONS = ['uniform', 'zipf', 'sorted', 'adversarial']
+# Largest size run for the cases whose operations take time linear in the
+# size of the structure
+SUITE_LINEAR_LIMIT = 10000
+# Most hits, misses and deletes timed in a case, and in a case with linear
+# time operations
+SUITE_QUERIES = 100000
+SUITE_LINEAR_QUERIES = 1000
+# Hits timed one at a time for the latency percentiles
+SUITE_LATENCY_SAMPLES = 10000
+SUITE_PERCENTILES = [('p50', 50.0), ('p99', 99.0), ('p999', 99.9)]
+# Latency changes smaller than this many microseconds are timer noise and
+# never count as a regression
+SUITE_LATENCY_NOISE_US = 1.0
+# A case is run more than 'repeat' times, up to SUITE_MAX_RUNS, until every
+# throughput has been timed for SUITE_MIN_SECONDS in all; the best run is
+# kept. A throughput whose best run took less than SUITE_NOISE_SECONDS is
+# too fast to time and never counts as a regression.
+SUITE_MIN_SECONDS = 0.2
+SUITE_MAX_RUNS = 100
+SUITE_NOISE_SECONDS = 0.002
+# Times a case found worse than the baseline is run again in a new process
+# before it counts as a regression, keeping the best result of every run
+SUITE_CONFIRM_RUNS = 2
+# Results where a larger value is better, for the others smaller is better
+SUITE_THROUGHPUTS = ['insert_ops', 'hit_ops', 'miss_ops', 'delete_ops']
+SUITE_METRICS = SUITE_THROUGHPUTS + ['hit_' + name + '_us' for name, percentile in SUITE_PERCENTILES] + \
+    ['peak_memory_bytes']
+
+
+# The structures of the suite as (name, factory, linear). In the
+# 'adversarial' distribution the hash tables hash every key to one bin, and
+# linear(distribution) tells if the operations then take linear time.
+def suite_structures():
+    def hashfunc(distribution):
+        if distribution == 'adversarial':
+            return terrible_hash(10)
+        return hash
+    return [
+        ('dict', lambda distribution: dict(), lambda distribution: False),
+        ('SinglyLinkedList', lambda distribution: SinglyLinkedList(verbose=False), lambda distribution: True),
+        ('ChainedHashDict', lambda distribution: ChainedHashDict(hashfunc=hashfunc(distribution), verbose=False),
+         lambda distribution: distribution == 'adversarial'),
+        ('FlatChainedHashDict',
+         lambda distribution: FlatChainedHashDict(hashfunc=hashfunc(distribution), verbose=False),
+         lambda distribution: distribution == 'adversarial'),
+        ('OpenAddressHashDict',
+         lambda distribution: OpenAddressHashDict(hashfunc=hashfunc(distribution), verbose=False),
+         lambda distribution: distribution == 'adversarial'),
+        ('CuckooHashDict', lambda distribution: CuckooHashDict(hashfunc=hashfunc(distribution), verbose=False,
+                                                               seed=0),
+         lambda distribution: False),
+        ('BinarySearchTreeDict', lambda distribution: BinarySearchTreeDict(verbose=False),
+         lambda distribution: distribution in ('sorted', 'adversarial')),
+    ]
+
+
+# Gives the keys of a case: the n keys inserted, and the keys hit, missed
+# and deleted. 'uniform' inserts and queries in random order, 'zipf' looks
+# key i up with a probability proportional to 1 / (i + 1), 'sorted' and
+# 'adversarial' insert and query in ascending order.
+def suite_keys(n, distribution, seed, queries=SUITE_QUERIES):
+    rng = random.Random(seed)
+    keys = rng.sample(xrange(2 ** 40), 2 * n)
+    inserted, missing = keys[:n], keys[n:]
+    queries = min(n, queries)
+    step = max(1, n // queries)
+    if distribution in ('sorted', 'adversarial'):
+        inserted.sort()
+        missing.sort()
+        hits = deletes = inserted[::step][:queries]
+    elif distribution == 'zipf':
+        hits = [inserted[int(n ** rng.random()) - 1] for i in xrange(queries)]
+        deletes = rng.sample(inserted, queries)
+    else:
+        hits = rng.sample(inserted, queries)
+        deletes = rng.sample(inserted, queries)
+    return inserted, hits, missing[::step][:queries], deletes
+
+
+# Gives (insert, takes_value, contains, delete) for 'container'
+def suite_operations(container):
+    if isinstance(container, SinglyLinkedList):
+        return container.prepend, False, container.__contains__, container.remove
+    return container.__setitem__, True, container.__contains__, container.__delitem__
+
+
+# Gives the seconds taken by calling 'operation' on every key, with the
+# garbage collector off like timeit
+def suite_time(operation, keys, takes_value=False):
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = timeit.default_timer()
+        if takes_value:
+            for key in keys:
+                operation(key, key)
+        else:
+            for key in keys:
+                operation(key)
+        return timeit.default_timer() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+# Gives a clock in seconds fine enough to time a single call. Python 2 has
+# no perf_counter and time.time() only resolves about a microsecond, so
+# clock_gettime(CLOCK_MONOTONIC) is called through ctypes where it exists.
+def fine_timer():
+    class Timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+    try:
+        clock_gettime = ctypes.CDLL(ctypes.util.find_library('rt') or 'librt.so.1').clock_gettime
+    except (OSError, AttributeError):
+        return timeit.default_timer
+    now = Timespec()
+    now_pointer = ctypes.byref(now)
+
+    def timer():
+        clock_gettime(1, now_pointer)
+        return now.tv_sec + now.tv_nsec * 1e-9
+    return timer
+
+
+# Gives the sorted microseconds taken by each call of 'operation', less the
+# median cost of reading the timer
+def suite_latencies(operation, keys):
+    timer = fine_timer()
+    overheads = []
+    for i in xrange(1000):
+        start = timer()
+        overheads.append(timer() - start)
+    overhead = sorted(overheads)[len(overheads) // 2]
+    latencies = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for key in keys:
+            start = timer()
+            operation(key)
+            latencies.append(max(0.0, timer() - start - overhead) * 1e6)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    latencies.sort()
+    return latencies
+
+
+# Nearest rank percentile of sorted 'values'
+def percentile(values, percent):
+    """
+    >>> percentile(range(1, 101), 99.0), percentile(range(1, 101), 50.0)
+    (99, 50)
+    """
+    rank = max(1, int(-(-len(values) * percent // 100)))
+    return values[min(rank, len(values)) - 1]
+
+
+# Gives a field of /proc/self/status in bytes, or None off Linux
+def process_memory(field):
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except IOError:
+        pass
+    return None
+
+
+# Resets the peak resident size of the process so VmHWM measures from now
+def reset_peak_memory():
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except IOError:
+        return False
+
+
+# Runs one case and gives its results
+def suite_case(name, distribution, n, repeat, seed):
+    factory, linear = [(factory, linear) for structure, factory, linear in suite_structures()
+                       if structure == name][0]
+    result = {'structure': name, 'distribution': distribution, 'size': n}
+    if linear(distribution) and n > SUITE_LINEAR_LIMIT:
+        result['skipped'] = 'linear time operations above ' + str(SUITE_LINEAR_LIMIT) + ' keys'
+        return result
+    queries = SUITE_QUERIES
+    if linear(distribution):
+        queries = SUITE_LINEAR_QUERIES
+    inserted, hits, misses, deletes = suite_keys(n, distribution, seed, queries)
+    gc.collect()
+    start_memory = process_memory('VmRSS')
+    peak_reset = reset_peak_memory()
+    times = dict((metric, []) for metric in SUITE_THROUGHPUTS)
+    for run in xrange(SUITE_MAX_RUNS):
+        # The throughputs still to time; the inserts are always run to fill
+        # the container
+        wanted = [metric for metric in SUITE_THROUGHPUTS
+                  if run < repeat or sum(times[metric]) < SUITE_MIN_SECONDS]
+        if not wanted:
+            break
+        container = factory(distribution)
+        insert, takes_value, contains, delete = suite_operations(container)
+        times['insert_ops'].append(suite_time(insert, inserted, takes_value))
+        if run == 0:
+            peak_memory = process_memory('VmHWM')
+            if peak_memory is not None and start_memory is not None and peak_reset:
+                result['peak_memory_bytes'] = max(0, peak_memory - start_memory)
+            latencies = suite_latencies(contains, hits[:SUITE_LATENCY_SAMPLES])
+            for label, percent in SUITE_PERCENTILES:
+                result['hit_' + label + '_us'] = round(percentile(latencies, percent), 3)
+        if 'hit_ops' in wanted:
+            times['hit_ops'].append(suite_time(contains, hits))
+        if 'miss_ops' in wanted:
+            times['miss_ops'].append(suite_time(contains, misses))
+        if 'delete_ops' in wanted:
+            times['delete_ops'].append(suite_time(delete, deletes))
+        container = insert = contains = delete = None
+    for metric, keys in [('insert_ops', inserted), ('hit_ops', hits), ('miss_ops', misses),
+                         ('delete_ops', deletes)]:
+        best = min(times[metric])
+        result[metric] = int(len(keys) / max(best, 1e-9))
+        result[suite_seconds_key(metric)] = best
+    return result
+
+
+def suite_worker(connection, arguments):
+    try:
+        connection.send(suite_case(*arguments))
+    except Exception as error:
+        connection.send({'error': repr(error)})
+    connection.close()
+
+
+# Runs one case in a new process, so the memory and the garbage of one case
+# do not reach the next, and gives its results. A worker that dies without
+# results gives an error result.
+def run_suite_case(name, distribution, n, repeat, seed):
+    connection, worker_connection = multiprocessing.Pipe()
+    worker = multiprocessing.Process(target=suite_worker,
+                                     args=(worker_connection, (name, distribution, n, repeat, seed)))
+    worker.start()
+    worker_connection.close()
+    try:
+        result = connection.recv()
+    except EOFError:
+        result = None
+    worker.join()
+    if result is None:
+        result = {'error': 'worker exited with code ' + str(worker.exitcode)}
+    result.update({'structure': name, 'distribution': distribution, 'size': n})
+    return result
+
+
+# Runs every case and gives the report
+def run_suite(sizes=SUITE_SIZES, structures=None, distributions=SUITE_DISTRIBUTIONS, repeat=3, seed=0,
+              log=sys.stderr):
+    if structures is None:
+        structures = [name for name, factory, linear in suite_structures()]
+    results = []
+    for n in sizes:
+        for name in structures:
+            for distribution in distributions:
+                result = run_suite_case(name, distribution, n, repeat, seed)
+                results.append(result)
+                if log is not None:
+                    log.write(name + " " + distribution + " " + str(n) + ": " +
+                              str(result.get('skipped') or result.get('error') or
+                                  str(result['insert_ops']) + " inserts/s") + "\n")
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'seed': seed,
+        'results': results,
+    }
+
+
+# The name of the case of 'result' in a regression
+def suite_case_name(result):
+    return " ".join(str(result[part]) for part in ('structure', 'distribution', 'size'))
+
+
+# The result holding the seconds of the best run of a throughput
+def suite_seconds_key(metric):
+    return metric[:-len('_ops')] + '_seconds'
+
+
+# Keeps in 'result' the better value of every metric of it and 'other', two
+# runs of the same case
+def suite_merge_best(result, other):
+    """
+    >>> result = {'hit_ops': 900, 'hit_seconds': 0.2, 'hit_p99_us': 2.0}
+    >>> suite_merge_best(result, {'hit_ops': 1000, 'hit_seconds': 0.18, 'hit_p99_us': 2.5})
+    >>> sorted(result.items())
+    [('hit_ops', 1000), ('hit_p99_us', 2.0), ('hit_seconds', 0.18)]
+    """
+    for metric in SUITE_METRICS:
+        if metric not in result or metric not in other:
+            continue
+        if metric in SUITE_THROUGHPUTS:
+            if other[metric] > result[metric]:
+                result[metric] = other[metric]
+                result[suite_seconds_key(metric)] = other[suite_seconds_key(metric)]
+        else:
+            result[metric] = min(result[metric], other[metric])
+
+
+# Gives the results of 'current' that are more than 'threshold' (a fraction)
+# worse than the same case of 'baseline', as (case, metric, before, after)
+def suite_regressions(baseline, current, threshold):
+    """
+    >>> before = {'results': [{'structure': 'dict', 'distribution': 'uniform', 'size': 1000,
+    ...                        'hit_ops': 1000, 'hit_p99_us': 1.0}]}
+    >>> after = {'results': [{'structure': 'dict', 'distribution': 'uniform', 'size': 1000,
+    ...                       'hit_ops': 850, 'hit_p99_us': 1.5}]}
+    >>> suite_regressions(before, after, 0.1)
+    [('dict uniform 1000', 'hit_ops', 1000, 850)]
+    >>> after['results'][0]['hit_seconds'] = 0.0005
+    >>> suite_regressions(before, after, 0.1)
+    []
+    >>> after['results'][0]['error'] = "KeyError(57,)"
+    >>> suite_regressions(before, after, 0.1)
+    [('dict uniform 1000', 'error', None, 'KeyError(57,)')]
+    >>> suite_regressions(before, {'results': []}, 0.1)
+    [('dict uniform 1000', 'missing', None, None)]
+    """
+    cases = {}
+    for result in baseline['results']:
+        cases[(result['structure'], result['distribution'], result['size'])] = result
+    regressions = []
+    measured = set()
+    for result in current['results']:
+        case = (result['structure'], result['distribution'], result['size'])
+        measured.add(case)
+        if 'error' in result:
+            regressions.append((suite_case_name(result), 'error', None, result['error']))
+            continue
+        old = cases.get(case)
+        if old is None:
+            continue
+        for metric in SUITE_METRICS:
+            before, after = old.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = float(after - before) / before
+            if metric in SUITE_THROUGHPUTS:
+                change = -change
+                seconds = suite_seconds_key(metric)
+                if min(old.get(seconds, 1.0), result.get(seconds, 1.0)) < SUITE_NOISE_SECONDS:
+                    continue
+            elif metric.endswith('_us') and after - before < SUITE_LATENCY_NOISE_US:
+                continue
+            if change > threshold:
+                regressions.append((suite_case_name(result), metric, before, after))
+    for case, result in sorted(cases.iteritems()):
+        if case not in measured:
+            regressions.append((suite_case_name(result), 'missing', None, None))
+    return regressions
+
+
+# The line of a regression in the output of suite_main
+def suite_regression_text(regression):
+    """
+    >>> suite_regression_text(('dict uniform 1000', 'hit_ops', 1000, 850))
+    'Regression: dict uniform 1000 hit_ops 1000 -> 850'
+    >>> suite_regression_text(('dict uniform 1000', 'missing', None, None))
+    'Regression: dict uniform 1000 missing from the report'
+    """
+    case, metric, before, after = regression
+    if metric == 'error':
+        return "Regression: " + case + " failed with " + after
+    if metric == 'missing':
+        return "Regression: " + case + " missing from the report"
+    return "Regression: " + case + " " + metric + " " + str(before) + " -> " + str(after)
+
+
+def suite_main(argv):
+    parser = argparse.ArgumentParser(prog='DataStructures_benchmark.py suite',
+                                     description='Runs the benchmark suite and writes a JSON report.')
+    parser.add_argument('--sizes', default=','.join(str(n) for n in SUITE_SIZES),
+                        help='comma separated sizes, such as 1e3,1e5,1e7')
+    parser.add_argument('--structures', default=','.join(name for name, factory, linear in suite_structures()))
+    parser.add_argument('--distributions', default=','.join(SUITE_DISTRIBUTIONS))
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the best one is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file for the report, standard output by default')
+    parser.add_argument('--baseline', help='report to compare with, exits with status 1 on a regression')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fraction a result may be worse than the baseline, 0.1 by default')
+    args = parser.parse_args(argv)
+    report = run_suite([int(float(n)) for n in args.sizes.split(',')], args.structures.split(','),
+                       args.distributions.split(','), args.repeat, args.seed)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            baseline = json.load(baseline)
+        regressions = suite_regressions(baseline, report, args.threshold)
+        for confirm in xrange(SUITE_CONFIRM_RUNS):
+            if not regressions:
+                break
+            # Failed and missing cases are not timing noise and are not run again
+            cases = set(case for case, metric, before, after in regressions if metric in SUITE_METRICS)
+            for result in report['results']:
+                if suite_case_name(result) in cases:
+                    sys.stderr.write("Confirming " + suite_case_name(result) + "\n")
+                    suite_merge_best(result, run_suite_case(result['structure'], result['distribution'],
+                                                            result['size'], args.repeat, args.seed))
+            regressions = suite_regressions(baseline, report, args.threshold)
+    text = json.dumps(report, indent=2, sort_keys=True, separators=(',', ': ')) + "\n"
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(text)
+    else:
+        sys.stdout.write(text)
+    if args.baseline:
+        for regression in regressions:
+            sys.stderr.write(suite_regression_text(regression) + "\n")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['suite']:
+        sys.exit(suite_main(sys.argv[2:]))
+    main()